@@ -6,38 +6,40 @@ verlte() {
 
 function dr-update-env {
 
-  if [[ -f "$DIR/system.env" ]]; then
-    LINES=$(grep -v '^#' $DIR/system.env)
-    for l in $LINES; do
-      env_var=$(echo $l | cut -f1 -d\=)
-      env_val=$(echo $l | cut -f2 -d\=)
-      eval "export $env_var=$env_val"
-    done
-  else
+  if [[ ! -f "$DIR/system.env" ]]; then
     echo "File system.env does not exist."
     return 1
   fi
 
-  if [[ -f "$DR_CONFIG" ]]; then
-    LINES=$(grep -v '^#' $DR_CONFIG)
-    for l in $LINES; do
-      env_var=$(echo $l | cut -f1 -d\=)
-      env_val=$(echo $l | cut -f2 -d\=)
-      eval "export $env_var=$env_val"
-    done
-  else
+  if [[ ! -f "$DR_CONFIG" ]]; then
     echo "File run.env does not exist."
     return 1
   fi
 
+  # Both files are compiled into one sourceable file of exports, rebuilt
+  # only when one of them, a worker-N.env or the parser is newer than it.
+  local ENV_CACHE="$DIR/tmp/env-cache/${DR_CONFIG//\//_}.sh"
+  local ENV_STALE=""
+  local f
+  for f in "$DIR/system.env" "$DR_CONFIG" "$DIR"/worker-*.env "$DIR/lib/drfc/envfile.py"; do
+    if [[ -f "$f" && ! "$f" -ot "$ENV_CACHE" ]]; then
+      ENV_STALE="yes"
+      break
+    fi
+  done
+  if [[ -n "$ENV_STALE" || ! -f "$ENV_CACHE" ]]; then
+    python3 $DIR/bin/compile-env.py "$ENV_CACHE" "$DIR/system.env" "$DR_CONFIG" || return 1
+  fi
+  source "$ENV_CACHE"
+
   if [[ -z "${DR_RUN_ID}" ]]; then
     export DR_RUN_ID=0
   fi
 
   if [[ "${DR_DOCKER_STYLE,,}" == "swarm" ]]; then
-    export DR_ROBOMAKER_TRAIN_PORT=$(expr 8080 + $DR_RUN_ID)
-    export DR_ROBOMAKER_EVAL_PORT=$(expr 8180 + $DR_RUN_ID)
-    export DR_ROBOMAKER_GUI_PORT=$(expr 5900 + $DR_RUN_ID)
+    export DR_ROBOMAKER_TRAIN_PORT=$((8080 + DR_RUN_ID))
+    export DR_ROBOMAKER_EVAL_PORT=$((8180 + DR_RUN_ID))
+    export DR_ROBOMAKER_GUI_PORT=$((5900 + DR_RUN_ID))
   else
     export DR_ROBOMAKER_TRAIN_PORT="8080-8089"
     export DR_ROBOMAKER_EVAL_PORT="8080-8089"
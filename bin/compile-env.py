@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Compile system.env and run.env into the cache sourced by dr-update-env.
+
+Usage: compile-env.py CACHE SYSTEM_ENV RUN_ENV
+worker-N.env files next to system.env are validated as well.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+from drfc import envfile
+
+
+def main():
+    if len(sys.argv) != 4:
+        print(__doc__.strip().splitlines()[2], file=sys.stderr)
+        sys.exit(2)
+    cache_path, system_env, run_env = sys.argv[1:]
+    _, problems = envfile.compile_cache([system_env, run_env], cache_path,
+                                        checked=envfile.worker_files(os.path.dirname(system_env)))
+    for problem in problems:
+        print('WARNING: {}'.format(problem), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
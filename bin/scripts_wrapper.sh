@@ -1,6 +1,35 @@
 #!/bin/bash
 
 function dr-upload-custom-files {
+  local OPTIND OPT_FORCE
+  OPT_FORCE=""
+
+  while getopts ":f" opt; do
+    case $opt in
+    f)
+      OPT_FORCE="True"
+      ;;
+    \?)
+      echo "Invalid option -$OPTARG" >&2
+      ;;
+    esac
+  done
+
+  if [[ -z "$OPT_FORCE" && -f "$DR_DIR/custom_files/reward_function.py" ]]; then
+    python3 $DR_DIR/scripts/upload/check-reward.py $DR_DIR/custom_files/reward_function.py
+    case $? in
+    0) ;;
+    1)
+      echo "Reward function is too slow; not uploading. Use -f to upload anyway."
+      return 1
+      ;;
+    *)
+      echo "Reward function cannot be loaded; not uploading. Use -f to upload anyway."
+      return 1
+      ;;
+    esac
+  fi
+
   eval CUSTOM_TARGET=$(echo s3://$DR_LOCAL_S3_BUCKET/$DR_LOCAL_S3_CUSTOM_FILES_PREFIX/)
   echo "Uploading files to $CUSTOM_TARGET"
   aws $DR_LOCAL_PROFILE_ENDPOINT_URL s3 sync $DR_DIR/custom_files/ $CUSTOM_TARGET
@@ -45,6 +74,31 @@ function dr-increment-training {
   dr-update-env && ${DR_DIR}/scripts/training/increment.sh "$@" && dr-update-env
 }
 
+function dr-gc-checkpoints {
+  python3 $DR_DIR/scripts/training/gc-checkpoints.py "$@"
+}
+
+function dr-replay-reward {
+  python3 $DR_DIR/scripts/training/replay-reward.py "$@"
+}
+
+function dr-watch-metrics {
+  python3 $DR_DIR/scripts/training/watch-metrics.py "$@"
+}
+
+function dr-autotune-workers {
+  dr-update-env
+  python3 $DR_DIR/scripts/training/autotune-workers.py "$@" && dr-update-env
+}
+
+function dr-plan-placement {
+  python3 $DR_DIR/scripts/training/placement.py plan "$@"
+}
+
+function dr-benchmark-start {
+  $DR_DIR/scripts/training/benchmark-start.sh "$@"
+}
+
 function dr-stop-training {
   bash -c "cd $DR_DIR/scripts/training && ./stop.sh"
 }
@@ -66,6 +120,14 @@ function dr-start-loganalysis {
   bash -c "cd $DR_DIR/scripts/log-analysis && ./start.sh"
 }
 
+function dr-tail-simtrace {
+  python3 $DR_DIR/scripts/log-analysis/tail-simtrace.py "$@"
+}
+
+function dr-compact-simtrace {
+  python3 $DR_DIR/scripts/log-analysis/compact-simtrace.py "$@"
+}
+
 function dr-stop-loganalysis {
   eval LOG_ANALYSIS_ID=$(docker ps | awk ' /deepracer-analysis/ { print $1 }')
   if [ -n "$LOG_ANALYSIS_ID" ]; then
@@ -280,6 +342,18 @@ function dr-get-robomaker-stats {
   fi
 }
 
+function dr-logs-all {
+  python3 $DR_DIR/scripts/logs/multiplex.py "$@"
+}
+
+function dr-watch-robomaker-stats {
+  python3 $DR_DIR/scripts/metrics/robomaker-stats.py "$@"
+}
+
+function dr-watch-sagemaker-metrics {
+  python3 $DR_DIR/scripts/metrics/sagemaker-metrics.py "$@"
+}
+
 function dr-logs-loganalysis {
   eval LOG_ANALYSIS_ID=$(docker ps | awk ' /deepracer-analysis/ { print $1 }')
   if [ -n "$LOG_ANALYSIS_ID" ]; then
@@ -0,0 +1,76 @@
+#!/usr/bin/env bash
+#
+# Phase timing for the start scripts. With DR_TIMING=True every phase is
+# appended as one JSON line to $DR_TIMING_TRACE (default
+# $DR_DIR/tmp/timing/<name>-<timestamp>.jsonl) and a summary is printed on
+# stderr when the script exits. Python scripts started in between add their
+# own phases to the same trace (see lib/drfc/timing.py).
+#
+# "processes" is the number of PIDs handed out during the phase, taken from
+# /proc/loadavg; it counts every fork on the machine, so it is only exact on
+# an otherwise idle system. Nothing here forks, so the timing adds none.
+
+timing_init() {
+  TIMING_ENABLED=""
+  [[ "${DR_TIMING,,}" =~ ^(yes|true|t|1)$ ]] || return 0
+  TIMING_ENABLED="yes"
+  TIMING_NAME=$1
+  if [[ -z "$DR_TIMING_TRACE" ]]; then
+    mkdir -p $DR_DIR/tmp/timing
+    printf -v DR_TIMING_TRACE '%s/tmp/timing/%s-%(%Y%m%d%H%M%S)T.jsonl' "$DR_DIR" "$TIMING_NAME" -1
+  fi
+  export DR_TIMING_TRACE
+  TIMING_PID_MAX=32768
+  [[ -r /proc/sys/kernel/pid_max ]] && read -r TIMING_PID_MAX </proc/sys/kernel/pid_max
+  TIMING_PHASE=""
+  TIMING_SUMMARY=()
+  _timing_now
+  TIMING_START_US=$TIMING_NOW_US
+  TIMING_START_PID=$TIMING_NOW_PID
+  trap timing_done EXIT
+}
+
+_timing_now() {
+  local a b c d
+  if [[ -n "$EPOCHREALTIME" ]]; then
+    TIMING_NOW_US=${EPOCHREALTIME/[.,]/}
+  else
+    TIMING_NOW_US=$((SECONDS * 1000000))
+  fi
+  TIMING_NOW_PID=0
+  [[ -r /proc/loadavg ]] && read -r a b c d TIMING_NOW_PID </proc/loadavg
+}
+
+_timing_record() {
+  # _timing_record NAME START_US START_PID
+  local us=$((TIMING_NOW_US - $2))
+  local processes=$(((TIMING_NOW_PID - $3 + TIMING_PID_MAX) % TIMING_PID_MAX))
+  local ms line
+  printf -v ms '%d.%03d' $((us / 1000)) $((us % 1000))
+  printf '{"script": "%s", "phase": "%s", "start_ms": %d, "ms": %s, "processes": %d}\n' \
+    "$TIMING_NAME" "$1" $((($2 - TIMING_START_US) / 1000)) "$ms" "$processes" >>"$DR_TIMING_TRACE"
+  printf -v line '%s: %-24s %10s ms %5d processes' "$TIMING_NAME" "$1" "$ms" "$processes"
+  TIMING_SUMMARY+=("$line")
+}
+
+timing_phase() {
+  # timing_phase NAME -- ends the running phase, if any, and starts NAME.
+  [[ -n "$TIMING_ENABLED" ]] || return 0
+  _timing_now
+  if [[ -n "$TIMING_PHASE" ]]; then
+    _timing_record "$TIMING_PHASE" "$TIMING_PHASE_US" "$TIMING_PHASE_PID"
+  fi
+  TIMING_PHASE=$1
+  export DR_TIMING_PHASE=$1
+  TIMING_PHASE_US=$TIMING_NOW_US
+  TIMING_PHASE_PID=$TIMING_NOW_PID
+}
+
+timing_done() {
+  [[ -n "$TIMING_ENABLED" ]] || return 0
+  timing_phase ""
+  _timing_record "total" "$TIMING_START_US" "$TIMING_START_PID"
+  TIMING_ENABLED=""
+  printf '%s\n' "${TIMING_SUMMARY[@]}" >&2
+  echo "$TIMING_NAME: trace written to $DR_TIMING_TRACE" >&2
+}
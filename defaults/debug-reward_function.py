@@ -1,56 +1,126 @@
-import math
-import numpy
-import rospy
+import os
+import socket
 import time
 
+import rospy
+
 class Reward:
 
     '''
     Debugging reward function to be used to track performance of local training.
-    Will print out the Real-Time-Factor (RTF), as well as how many 
-    steps-per-second (sim-time) that the system is able to deliver.
+    Measures the Real-Time-Factor (RTF), how many steps-per-second (sim-time)
+    the system is able to deliver, and the time spent in the reward function.
+
+    Timings are kept in a fixed ring buffer. If TELEGRAF_HOST is set (see
+    DR_TELEGRAF_HOST) an aggregate is sent every `interval` seconds as an
+    InfluxDB line protocol UDP datagram, tagged with run id, model and
+    worker, and nothing is printed. Without telegraf the same aggregate is
+    printed, once per interval rather than every step.
     '''
 
-    def __init__(self, verbose=False, track_time=False):
+    def __init__(self, verbose=False, track_time=False, interval=10.0, window=256):
         self.verbose = verbose
         self.track_time = track_time
+        self.interval = interval
 
         if track_time:
-            TIME_WINDOW=10
-            self.time = numpy.zeros([TIME_WINDOW, 2])
+            self.window = window
+            self.wall_time = [0.0] * window
+            self.sim_time = [0.0] * window
+            self.self_time = [0.0] * window
+            self.count = 0
+            self.last_emit = time.time()
+            self.socket = None
+            self.address = None
+
+            host = os.environ.get('TELEGRAF_HOST')
+            if host:
+                try:
+                    self.address = (socket.gethostbyname(host), int(os.environ.get('TELEGRAF_PORT') or 8092))
+                    self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    self.socket.setblocking(False)
+                except (OSError, ValueError):
+                    self.socket = None
+
+            worker = os.environ.get('DOCKER_REPLICA_SLOT') or os.environ.get('ROLLOUT_IDX') or socket.gethostname()
+            self.tags = ',run_id={},model={},worker={}'.format(
+                self.escape(os.environ.get('RUN_ID', '0')),
+                self.escape(os.environ.get('SAGEMAKER_SHARED_S3_PREFIX') or os.environ.get('MODEL_S3_PREFIX', '')),
+                self.escape(worker))
 
         if verbose:
             print("Initializing Reward Class")
 
+    @staticmethod
+    def escape(value):
+        value = str(value) or 'none'
+        return value.replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+    def record_time(self, self_time):
+
+        index = self.count % self.window
+        self.wall_time[index] = time.time()
+        self.sim_time[index] = rospy.get_time()
+        self.self_time[index] = self_time
+        self.count += 1
+
     def get_time(self):
 
-        wall_time_incr = numpy.max(self.time[:,0]) - numpy.min(self.time[:,0])
-        sim_time_incr = numpy.max(self.time[:,1]) - numpy.min(self.time[:,1])
-        
-        rtf = sim_time_incr / wall_time_incr
-        fps = (self.time.shape[0] - 1) / sim_time_incr
+        size = min(self.count, self.window)
+        newest = (self.count - 1) % self.window
+        oldest = (self.count - size) % self.window
 
-        return rtf, fps
-    
-    def record_time(self, steps):
+        wall_time_incr = self.wall_time[newest] - self.wall_time[oldest]
+        sim_time_incr = self.sim_time[newest] - self.sim_time[oldest]
+        if wall_time_incr <= 0 or sim_time_incr <= 0:
+            return None
 
-        index = int(steps) % self.time.shape[0]
-        self.time[index,0] = time.time()
-        self.time[index,1] = rospy.get_time()
+        rtf = sim_time_incr / wall_time_incr
+        fps = (size - 1) / sim_time_incr
+        step_ms = wall_time_incr / (size - 1) * 1000
+        samples = self.self_time if size == self.window else self.self_time[:size]
+        reward_us = sum(samples) / size * 1e6
+        reward_max_us = max(samples) * 1e6
+
+        return rtf, fps, step_ms, reward_us, reward_max_us
+
+    def emit(self, steps):
+
+        stats = self.get_time()
+        if stats is None:
+            return
+        rtf, fps, step_ms, reward_us, reward_max_us = stats
+
+        if self.socket is not None:
+            line = 'deepracer_sim{} rtf={:.4f},fps={:.3f},step_time_ms={:.3f},reward_time_us={:.2f},' \
+                   'reward_time_max_us={:.2f},steps={}i\n'.format(
+                       self.tags, rtf, fps, step_ms, reward_us, reward_max_us, int(steps))
+            try:
+                self.socket.sendto(line.encode('utf-8'), self.address)
+            except OSError:
+                # Never hold up the simulation for metrics.
+                pass
+        else:
+            print("TIME: s: {}, rtf: {}, fps:{}, reward: {} us".format(
+                int(steps), round(rtf, 2), round(fps, 2), round(reward_us, 1)))
 
     def reward_function(self, params):
 
-        # Read input parameters
-        steps = params["steps"]
+        start = time.perf_counter()
+        reward = self.compute_reward(params)
 
         if self.track_time:
-            self.record_time(steps)
+            self.record_time(time.perf_counter() - start)
+            now = self.wall_time[(self.count - 1) % self.window]
+            if self.count >= 2 and now - self.last_emit >= self.interval:
+                self.last_emit = now
+                self.emit(params["steps"])
 
-        if self.track_time:
-            if steps >= self.time.shape[0]:
-                rtf, fps = self.get_time()
-                print("TIME: s: {}, rtf: {}, fps:{}".format(int(steps), round(rtf, 2), round(fps, 2) ))
+        return reward
+
+    def compute_reward(self, params):
 
+        # Replace with the reward to be debugged; its time is reported as reward_time_us.
         return 1.0
 
 
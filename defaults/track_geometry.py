@@ -0,0 +1,186 @@
+"""
+Precomputed track geometry for reward functions.
+
+Per-step reward code often walks params['waypoints'] to find segment
+headings, curvature or the nearest point of a racing line. TrackGeometry
+does that work once per track and answers lookups in constant time.
+
+The simapp only downloads reward_function.py, so this module cannot be
+imported from there: paste everything below this docstring into
+custom_files/reward_function.py, above reward_function, and use it as
+
+    def reward_function(params):
+        track = geometry_for(params)
+        i = params['closest_waypoints'][1]
+        direction_diff = track.heading_diff(params['heading'], i)
+        curve_ahead = track.curvature(track.lookahead(i, 1.5))
+        ...
+
+Geometries are memoized per track, keyed by WORLD_NAME and a sample of the
+waypoints, so only the first call on a track pays for the build.
+
+Run `python3 track_geometry.py` for a per-step cost comparison.
+"""
+
+import bisect
+import math
+import os
+
+_cache = {}
+
+
+class TrackGeometry:
+
+    def __init__(self, waypoints):
+        points = [(float(p[0]), float(p[1])) for p in waypoints]
+        # Closed tracks repeat the first waypoint at the end; drop it.
+        if len(points) > 1 and points[0] == points[-1]:
+            points = points[:-1]
+        n = len(points)
+        self.points = points
+        self.count = n
+
+        self.vectors = []
+        self.lengths = []
+        self.headings = []
+        for i in range(n):
+            x0, y0 = points[i]
+            x1, y1 = points[(i + 1) % n]
+            dx, dy = x1 - x0, y1 - y0
+            self.vectors.append((dx, dy))
+            self.lengths.append(math.hypot(dx, dy))
+            self.headings.append(math.degrees(math.atan2(dy, dx)))
+
+        self.cumulative = [0.0]
+        for length in self.lengths:
+            self.cumulative.append(self.cumulative[-1] + length)
+        self.length = self.cumulative[-1]
+
+        # Signed turn per metre at each waypoint, positive when turning left.
+        self.curvatures = []
+        for i in range(n):
+            turn = _angle_diff(self.headings[i], self.headings[i - 1])
+            span = (self.lengths[i] + self.lengths[i - 1]) / 2 or 1.0
+            self.curvatures.append(math.radians(turn) / span)
+
+        # Uniform grid over the waypoints for nearest-point queries.
+        self.cell = max(self.length / n * 2, 1e-6) if n else 1.0
+        self.grid = {}
+        for i, (x, y) in enumerate(points):
+            self.grid.setdefault(self._cell_of(x, y), []).append(i)
+
+    def _cell_of(self, x, y):
+        return int(math.floor(x / self.cell)), int(math.floor(y / self.cell))
+
+    def heading(self, i):
+        """Direction in degrees of the segment from waypoint i to i + 1."""
+        return self.headings[i % self.count]
+
+    def heading_diff(self, heading, i):
+        """Absolute difference in degrees between a car heading and the track direction at waypoint i."""
+        return abs(_angle_diff(heading, self.headings[i % self.count]))
+
+    def curvature(self, i):
+        return self.curvatures[i % self.count]
+
+    def distance_along(self, i):
+        """Distance in metres from waypoint 0 to waypoint i."""
+        return self.cumulative[i % self.count]
+
+    def lookahead(self, i, distance):
+        """Index of the waypoint `distance` metres ahead of waypoint i."""
+        target = (self.cumulative[i % self.count] + distance) % self.length
+        return bisect.bisect_right(self.cumulative, target) - 1
+
+    def nearest(self, x, y):
+        """Index of the waypoint nearest to (x, y), searching grid rings outwards."""
+        cx, cy = self._cell_of(x, y)
+        best, best_d = None, float('inf')
+        ring = 0
+        while True:
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in range(cy - ring, cy + ring + 1):
+                    if max(abs(gx - cx), abs(gy - cy)) != ring:
+                        continue
+                    for i in self.grid.get((gx, gy), ()):
+                        px, py = self.points[i]
+                        d = (px - x) ** 2 + (py - y) ** 2
+                        if d < best_d:
+                            best, best_d = i, d
+            # Anything in a further ring is at least `ring` cells away.
+            if best is not None and math.sqrt(best_d) <= ring * self.cell:
+                return best
+            ring += 1
+            if ring > len(self.grid) + 2 and best is not None:
+                return best
+
+    def distance_to_segment(self, x, y, i):
+        """Distance from (x, y) to the segment from waypoint i to i + 1."""
+        i %= self.count
+        x0, y0 = self.points[i]
+        dx, dy = self.vectors[i]
+        length_sq = dx * dx + dy * dy or 1e-12
+        t = max(0.0, min(1.0, ((x - x0) * dx + (y - y0) * dy) / length_sq))
+        return math.hypot(x - (x0 + t * dx), y - (y0 + t * dy))
+
+
+def _angle_diff(a, b):
+    return (a - b + 180.0) % 360.0 - 180.0
+
+
+def geometry_for(params, waypoints_key='waypoints'):
+    """Memoized TrackGeometry for the track in params (or another waypoint list in params)."""
+    waypoints = params[waypoints_key]
+    n = len(waypoints)
+    key = (os.environ.get('WORLD_NAME', ''), waypoints_key, n, tuple(waypoints[0]), tuple(waypoints[n // 2]),
+           tuple(waypoints[-1]))
+    geometry = _cache.get(key)
+    if geometry is None:
+        geometry = _cache[key] = TrackGeometry(waypoints)
+    return geometry
+
+
+def _benchmark(steps=20000):
+    import random
+    import time
+
+    count = 180
+    waypoints = [(8 * math.cos(2 * math.pi * i / count), 4 * math.sin(2 * math.pi * i / count)) for i in range(count)]
+    rng = random.Random(0)
+    samples = []
+    for _ in range(1000):
+        i = rng.randrange(count)
+        samples.append({'waypoints': waypoints, 'closest_waypoints': [i, (i + 1) % count],
+                        'x': waypoints[i][0] + rng.uniform(-0.3, 0.3), 'y': waypoints[i][1] + rng.uniform(-0.3, 0.3),
+                        'heading': rng.uniform(-180, 180)})
+
+    def naive(params):
+        wps = params['waypoints']
+        nxt = params['closest_waypoints'][1]
+        prev = wps[nxt - 1]
+        direction = math.degrees(math.atan2(wps[nxt][1] - prev[1], wps[nxt][0] - prev[0]))
+        diff = abs((params['heading'] - direction + 180) % 360 - 180)
+        # Nearest waypoint and the turn 1.5 m ahead by scanning the list.
+        nearest = min(range(len(wps)), key=lambda j: (wps[j][0] - params['x']) ** 2 + (wps[j][1] - params['y']) ** 2)
+        travelled, j = 0.0, nxt
+        while travelled < 1.5:
+            a, b = wps[j % len(wps)], wps[(j + 1) % len(wps)]
+            travelled += math.hypot(b[0] - a[0], b[1] - a[1])
+            j += 1
+        return diff, nearest, j
+
+    def helper(params):
+        track = geometry_for(params)
+        nxt = params['closest_waypoints'][1]
+        return (track.heading_diff(params['heading'], nxt - 1), track.nearest(params['x'], params['y']),
+                track.curvature(track.lookahead(nxt, 1.5)))
+
+    for name, fn in (('naive', naive), ('track_geometry', helper)):
+        start = time.perf_counter()
+        for s in range(steps):
+            fn(samples[s % len(samples)])
+        print('{:<15} {:8.1f} us/step'.format(name, (time.perf_counter() - start) / steps * 1e6))
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,5 @@
+"""Shared helpers for the DeepRacer-for-Cloud scripts.
+
+The entry points under scripts/ and utils/ put this directory on sys.path and
+import from here, so the modules must stay free of heavy imports at load time.
+"""
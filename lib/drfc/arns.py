@@ -0,0 +1,131 @@
+"""Name to ARN cache for AWS DeepRacer models and leaderboards.
+
+Resolving a model name means paging through list_models, which is slow and
+eats API quota when done from cron every few minutes. Resolved ARNs are
+kept in $DR_DIR/tmp/arn-cache-<profile>.json for TTL seconds; a miss, an
+expired entry or an explicit invalidate() falls back to the listing, which
+refreshes every name it pages past.
+"""
+
+import json
+import os
+import threading
+import time
+
+TTL = 7 * 24 * 3600
+
+MODELS = 'models'
+LEADERBOARDS = 'leaderboards'
+
+NOT_FOUND_CODES = ('NotFoundException', 'ResourceNotFoundException')
+
+
+def cache_path(profile=None, env=os.environ):
+    """Cache file for an AWS profile, or None (memory only) if DR_DIR is not set."""
+    if not env.get('DR_DIR'):
+        return None
+    return os.path.join(env['DR_DIR'], 'tmp', 'arn-cache-{}.json'.format(profile or 'default'))
+
+
+class ArnCache:
+    """Thread-safe, so the submission daemon's workers can share one instance."""
+
+    def __init__(self, path, ttl=TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {MODELS: {}, LEADERBOARDS: {}}
+        self.dirty = False
+        if path and os.path.isfile(path):
+            try:
+                with open(path, 'r') as fh:
+                    self.entries.update(json.load(fh))
+            except (ValueError, OSError):
+                pass
+
+    def get(self, kind, name):
+        entry = self.entries[kind].get(name)
+        if entry is None or time.time() - entry['time'] > self.ttl:
+            return None
+        return entry['arn']
+
+    def put(self, kind, name, arn):
+        with self.lock:
+            self.entries[kind][name] = {'arn': arn, 'time': time.time()}
+            self.dirty = True
+
+    def invalidate(self, kind, name):
+        with self.lock:
+            if self.entries[kind].pop(name, None) is not None:
+                self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.path or not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = '{}.{}'.format(self.path, os.getpid())
+            with open(tmp_path, 'w') as fh:
+                json.dump(self.entries, fh, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+
+def _pages(call, key, **kwargs):
+    response = call(MaxResults=50, **kwargs)
+    yield response[key]
+    while 'NextToken' in response:
+        response = call(MaxResults=50, NextToken=response['NextToken'], **kwargs)
+        yield response[key]
+
+
+def _model_exists(dr, arn):
+    from botocore.exceptions import ClientError
+
+    try:
+        dr.get_model(ModelArn=arn)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in NOT_FOUND_CODES:
+            return False
+        raise
+    return True
+
+
+def find_model(dr, model_name, cache, verify=False):
+    """ARN of the RL model called model_name, or None if the account has no such model.
+
+    With verify a cached ARN is confirmed with one get_model call, and
+    dropped if the model was deleted since it was cached.
+    """
+    arn = cache.get(MODELS, model_name)
+    if arn is not None and (not verify or _model_exists(dr, arn)):
+        return arn
+    cache.invalidate(MODELS, model_name)
+    found = None
+    for models in _pages(dr.list_models, 'Models', ModelType='REINFORCEMENT_LEARNING'):
+        for model in models:
+            cache.put(MODELS, model['ModelName'], model['ModelArn'])
+            if model['ModelName'] == model_name:
+                found = model['ModelArn']
+        if found is not None:
+            break
+    cache.save()
+    return found
+
+
+def find_leaderboard(dr, leaderboard_guid, cache):
+    """ARN of the leaderboard with this GUID, or None if it is not listed."""
+    arn = cache.get(LEADERBOARDS, leaderboard_guid)
+    if arn is not None:
+        return arn
+    leaderboard_arn = 'arn:aws:deepracer:::leaderboard/{}'.format(leaderboard_guid)
+    found = None
+    for leaderboards in _pages(dr.list_leaderboards, 'Leaderboards'):
+        for leaderboard in leaderboards:
+            cache.put(LEADERBOARDS, leaderboard['Arn'].rsplit('/', 1)[-1], leaderboard['Arn'])
+            if leaderboard['Arn'] == leaderboard_arn:
+                found = leaderboard_arn
+        if found is not None:
+            break
+    cache.save()
+    return found
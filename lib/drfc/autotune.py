@@ -0,0 +1,138 @@
+"""Search for the DR_WORKERS that maximises simulation throughput.
+
+Throughput is the summed sim/real ratio of all workers, i.e. simulated
+seconds per wall second; at the simapp's 15 steps per simulated second that
+is STEPS_PER_SIM_SECOND times as many environment steps. Adding workers
+raises it until the host saturates, after which every further worker slows
+all the others down. WorkerSearch only decides which count to measure next
+and what to recommend, so it can be driven by a simulated curve as well as
+by calibration runs.
+"""
+
+import hashlib
+import json
+import os
+
+STEPS_PER_SIM_SECOND = 15
+
+
+class WorkerSearch:
+    """Measures counts min_workers, min_workers + step, ... until throughput falls.
+
+    The search stops after `patience` counts more than `tolerance` below
+    the best, after more than `patience` counts that gained less than
+    `tolerance` over a smaller one, once the host reports CPU saturation, when
+    the memory another `step` workers would need is not available, or at
+    max_workers. The recommendation is the smallest count within
+    `tolerance` of the best throughput: equal throughput with fewer workers
+    leaves more episodes per worker and more headroom for the trainer.
+    """
+
+    def __init__(self, max_workers, min_workers=1, step=1, tolerance=0.03, patience=1, cpu_limit=0.95,
+                 memory_reserve_mb=2048):
+        self.max_workers = max_workers
+        self.min_workers = min_workers
+        self.step = step
+        self.tolerance = tolerance
+        self.patience = patience
+        self.cpu_limit = cpu_limit
+        self.memory_reserve_mb = memory_reserve_mb
+        self.results = {}
+        self.reason = None
+        self._next = min_workers
+
+    def next_count(self):
+        """Worker count to measure next, or None when the search is over."""
+        if self.reason is None and self._next > self.max_workers:
+            self.reason = 'reached the maximum of {} workers'.format(self.max_workers)
+        return None if self.reason is not None else self._next
+
+    def record(self, workers, throughput, cpu=None, memory_available_mb=None, memory_per_worker_mb=None):
+        """Result of a calibration run; cpu is the busy fraction of the host during the run."""
+        self.results[workers] = {'throughput': throughput, 'cpu': cpu, 'memory_available_mb': memory_available_mb}
+        self._next = workers + self.step
+        best_workers, best = self.best
+        below = [n for n in sorted(self.results) if n > best_workers and self._falls_short(n, best)]
+        if len(below) >= self.patience:
+            self.reason = 'throughput fell below {:.3f} (best at {} workers)'.format(best, best_workers)
+        elif len([n for n in self.results if n > self.recommendation()]) > self.patience:
+            self.reason = 'throughput stopped rising at {} workers'.format(self.recommendation())
+        elif cpu is not None and cpu >= self.cpu_limit:
+            self.reason = 'host CPU saturated ({:.0%}) at {} workers'.format(cpu, workers)
+        elif memory_available_mb is not None and memory_per_worker_mb is not None and \
+                memory_available_mb - self.step * memory_per_worker_mb < self.memory_reserve_mb:
+            self.reason = 'not enough memory for {} more workers ({:.0f} MB available)'.format(
+                self.step, memory_available_mb)
+
+    def _falls_short(self, workers, best):
+        return self.results[workers]['throughput'] < best * (1 - self.tolerance)
+
+    @property
+    def best(self):
+        """(workers, throughput) of the highest throughput measured, (None, 0.0) before any."""
+        if not self.results:
+            return None, 0.0
+        workers = max(self.results, key=lambda n: (self.results[n]['throughput'], -n))
+        return workers, self.results[workers]['throughput']
+
+    def recommendation(self):
+        _, best = self.best
+        within = [n for n in sorted(self.results) if not self._falls_short(n, best)]
+        return within[0] if within else None
+
+
+def simulated_throughput(workers, capacity, contention=0.02):
+    """Throughput of a host that runs `capacity` workers at real time.
+
+    Beyond capacity the workers share the CPU, and every worker costs all
+    others `contention` of their speed, so the curve has a single peak.
+    """
+    rtf = min(1.0, capacity / workers) * max(0.0, 1 - contention * (workers - 1))
+    return workers * rtf
+
+
+def run_search(search, measure):
+    """Drive search with measure(workers) -> dict of WorkerSearch.record arguments; returns the search."""
+    workers = search.next_count()
+    while workers is not None:
+        search.record(workers, **measure(workers))
+        workers = search.next_count()
+    return search
+
+
+def config_key(model_metadata, env):
+    """Key of the configuration a recommendation is valid for: track, race type, sensors and host size."""
+    try:
+        with open(model_metadata, 'r') as fh:
+            metadata = json.load(fh)
+    except (OSError, ValueError):
+        metadata = {}
+    parts = {
+        'world': env.get('DR_WORLD_NAME'),
+        'race_type': env.get('DR_RACE_TYPE'),
+        'sensor': sorted(metadata.get('sensor', [])),
+        'neural_network': metadata.get('neural_network'),
+        'cpus': os.cpu_count(),
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()[:12], parts
+
+
+def cpu_times():
+    """(busy, total) jiffies of all CPUs from /proc/stat."""
+    with open('/proc/stat', 'r') as fh:
+        values = [int(v) for v in fh.readline().split()[1:]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)
+    return sum(values) - idle, sum(values)
+
+
+def cpu_busy(start, end):
+    busy, total = end[0] - start[0], end[1] - start[1]
+    return busy / total if total > 0 else None
+
+
+def memory_available_mb():
+    with open('/proc/meminfo', 'r') as fh:
+        for line in fh:
+            if line.startswith('MemAvailable:'):
+                return int(line.split()[1]) / 1024
+    return None
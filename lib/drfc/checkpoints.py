@@ -0,0 +1,108 @@
+"""Helpers for the checkpoint files in a model's model/ folder.
+
+A checkpoint N consists of N_Step-<step>.ckpt.{index,meta,data-*} and
+model_N.pb; deepracer_checkpoints.json names the best and last ones.
+"""
+
+import json
+import re
+import time
+
+CHECKPOINT_INDEX = 'deepracer_checkpoints.json'
+
+CKPT_RE = re.compile(r'^(\d+)_Step-(\d+)\.ckpt')
+MODEL_PB_RE = re.compile(r'^model_(\d+)\.pb$')
+
+
+def basename(key):
+    return key.rsplit('/', 1)[-1]
+
+
+def checkpoint_number(name):
+    """Checkpoint number a model/ file belongs to, or None for non-checkpoint files."""
+    name = basename(name)
+    match = CKPT_RE.match(name) or MODEL_PB_RE.match(name)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def number_of(checkpoint_name):
+    """Number from a checkpoint name such as '12_Step-3456.ckpt'."""
+    return int(checkpoint_name.split('_', 1)[0])
+
+
+def parse_index(data):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def find_by_number(names, number):
+    """Checkpoint name for a number, from a listing of model/ file names."""
+    for name in names:
+        match = CKPT_RE.match(basename(name))
+        if match and int(match.group(1)) == number and basename(name).endswith('.ckpt.index'):
+            return basename(name)[:-len('.index')]
+    return None
+
+
+def select(index, mode='last', names=None, number=None):
+    """Pick a checkpoint and return (checkpoint_name, index_for_target).
+
+    mode is 'last' or 'best'; with `number` the checkpoint is looked up in
+    `names` instead and given a synthetic index entry, as upload-model -c did.
+    The returned index points both best and last at the selected checkpoint.
+    """
+    if number is not None:
+        name = find_by_number(names or [], number)
+        if name is None:
+            return None, None
+        entry = {'name': name, 'time_stamp': int(time.time()), 'avg_comp_pct': 50.0}
+    else:
+        entry = index.get('{}_checkpoint'.format(mode))
+        if not entry or not entry.get('name'):
+            return None, None
+        name = entry['name']
+    return name, {'last_checkpoint': entry, 'best_checkpoint': entry}
+
+
+def referenced_numbers(index):
+    numbers = set()
+    for field in ('best_checkpoint', 'last_checkpoint'):
+        entry = index.get(field) or {}
+        if entry.get('name'):
+            numbers.add(number_of(entry['name']))
+    return numbers
+
+
+def group_by_number(objects):
+    """{number: {key: obj}} for the checkpoint files in a model/ listing; other files are left out."""
+    groups = {}
+    for key, obj in objects.items():
+        number = checkpoint_number(key)
+        if number is not None:
+            groups.setdefault(number, {})[key] = obj
+    return groups
+
+
+def retained(numbers, index, keep_last=0, keep_every=0):
+    """Checkpoint numbers to keep under a retention policy.
+
+    Best and last from the index are always kept, as is anything newer than
+    the indexed last checkpoint, which the trainer may still be writing or
+    evaluating. On top of that the `keep_last` highest numbers and every
+    `keep_every`-th number are kept.
+    """
+    numbers = sorted(numbers)
+    keep = referenced_numbers(index)
+    last = (index.get('last_checkpoint') or {}).get('name')
+    if last:
+        keep.update(n for n in numbers if n > number_of(last))
+    else:
+        keep.update(numbers)
+    if keep_last > 0:
+        keep.update(numbers[-keep_last:])
+    if keep_every > 0:
+        keep.update(n for n in numbers if n % keep_every == 0)
+    return keep
@@ -0,0 +1,147 @@
+"""Incremental parsing of the rl_coach training lines in the Sagemaker log.
+
+Coach's ScreenLogger writes one line per epoch of a policy update, plain as
+"Policy training> Surrogate loss=-0.02, KL divergence=0.004, Entropy=1.07,
+training epoch=0, learning_rate=0.0003" or coloured with "name: value"
+pairs, followed by a "Checkpoint> Saving in path=[...]" line once the
+updated policy is saved; "Training>" lines carry episode and step counts.
+
+An epoch line is written when that epoch has finished, so the duration of
+an update is estimated as its number of epochs times the mean spacing of
+its epoch lines. The rest of the time between two updates is spent waiting
+for the Robomaker workers to deliver the next batch of episodes.
+"""
+
+import collections
+import re
+
+ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+PHASE_RE = re.compile(r'^\s*(Policy training|Training|Checkpoint)\s*(?:>|-)\s*(.*)$')
+PAIR_RE = re.compile(r'([A-Za-z][A-Za-z_ ]*?)\s*[=:]\s*([^,\s]+)')
+
+# Fields of the epoch lines that are averaged over an update.
+LOSSES = ('surrogate_loss', 'kl_divergence', 'entropy')
+
+Record = collections.namedtuple('Record', ['kind', 'time', 'fields'])
+Epoch = collections.namedtuple('Epoch', ['time', 'epoch', 'values'])
+
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_line(text):
+    """(phase, {field: value}) of a coach screen log line, or None for other lines.
+
+    Field names are lower case with underscores; values that are numbers
+    are floats, others are left out.
+    """
+    match = PHASE_RE.match(ANSI_RE.sub('', text))
+    if not match:
+        return None
+    values = {}
+    for name, value in PAIR_RE.findall(match.group(2)):
+        number = _number(value)
+        if number is not None:
+            values[name.strip().lower().replace(' ', '_')] = number
+    return match.group(1), values
+
+
+class TrainerLog:
+    """Turns timestamped Sagemaker log lines into per-epoch and per-update records.
+
+    feed() returns the records a line completes: an 'epoch' record for every
+    epoch line and an 'iteration' record once an update is over, which is
+    known at its checkpoint line or at the first epoch of the next update.
+    """
+
+    def __init__(self):
+        self.epochs = []
+        self.iteration = 0
+        self.last_end = None
+        self.episode = None
+        self.steps = None
+
+    def feed(self, timestamp, text):
+        parsed = parse_line(text)
+        if parsed is None:
+            return []
+        phase, values = parsed
+        records = []
+        if phase == 'Policy training':
+            epoch = int(values.get('training_epoch', len(self.epochs)))
+            if self.epochs and epoch <= self.epochs[-1].epoch:
+                records += self.flush()
+            self.epochs.append(Epoch(timestamp, epoch, values))
+            records.append(Record('epoch', timestamp, dict(
+                {k: values[k] for k in LOSSES + ('learning_rate',) if k in values},
+                iteration=self.iteration, epoch=epoch)))
+        elif phase == 'Checkpoint':
+            records += self.flush()
+        else:
+            self.episode = values.get('episode', self.episode)
+            self.steps = values.get('steps', self.steps)
+        return records
+
+    def flush(self):
+        """The iteration record of the update in progress, if there is one."""
+        if not self.epochs:
+            return []
+        first, last = self.epochs[0].time, self.epochs[-1].time
+        count = len(self.epochs)
+        fields = {'iteration': self.iteration, 'epochs': count}
+        if count > 1:
+            fields['epoch_s'] = (last - first) / (count - 1)
+            fields['update_s'] = fields['epoch_s'] * count
+        for key in LOSSES:
+            values = [e.values[key] for e in self.epochs if key in e.values]
+            if values:
+                fields[key] = sum(values) / len(values)
+                fields[key + '_last'] = values[-1]
+        if 'learning_rate' in self.epochs[-1].values:
+            fields['learning_rate'] = self.epochs[-1].values['learning_rate']
+        if self.last_end is not None and last > self.last_end:
+            fields['iteration_s'] = last - self.last_end
+            if 'update_s' in fields:
+                fields['wait_s'] = max(0.0, fields['iteration_s'] - fields['update_s'])
+                fields['update_fraction'] = min(1.0, fields['update_s'] / fields['iteration_s'])
+        if self.episode is not None:
+            fields['episode'] = int(self.episode)
+        if self.steps is not None:
+            fields['steps'] = int(self.steps)
+        self.last_end = last
+        self.iteration += 1
+        self.epochs = []
+        return [Record('iteration', last, fields)]
+
+
+class Summary:
+    """Means over the iteration records seen, for the closing report."""
+
+    def __init__(self):
+        self.count = 0
+        self.sums = collections.defaultdict(float)
+        self.counts = collections.defaultdict(int)
+        self.busy = 0.0
+        self.span = 0.0
+
+    def add(self, fields):
+        self.count += 1
+        for key in ('update_s', 'wait_s', 'iteration_s', 'epoch_s'):
+            if fields.get(key) is not None:
+                self.sums[key] += fields[key]
+                self.counts[key] += 1
+        if fields.get('update_s') is not None and fields.get('iteration_s') is not None:
+            self.busy += fields['update_s']
+            self.span += fields['iteration_s']
+
+    def mean(self, key):
+        return self.sums[key] / self.counts[key] if self.counts[key] else None
+
+    @property
+    def update_fraction(self):
+        """Share of the time between updates that the trainer was busy updating."""
+        return min(1.0, self.busy / self.span) if self.span else None
@@ -0,0 +1,147 @@
+"""Parquet storage for simtrace steps.
+
+Files are zstd-compressed Parquet with one row group per written batch,
+which pandas, pyarrow.dataset and the log-analysis notebooks can open
+directly. pyarrow is only needed by the tools that write them.
+"""
+
+import os
+import re
+import sys
+
+from drfc import simtrace
+
+# Field order of a SIM_TRACE_LOG line, which matches the simtrace CSV header.
+LOG_KINDS = simtrace.COLUMNS + [('pause_duration', float)]
+LOG_FIELDS = [name for name, _ in LOG_KINDS]
+BOOL_FIELDS = ('done', 'all_wheels_on_track')
+# Numbers as Arrow's string to double cast accepts them.
+NUMBER_RE = re.compile(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?|[+-]?(nan|inf|infinity)', re.IGNORECASE)
+
+
+def require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("You need to install pyarrow to use this utility (pip install pyarrow).")
+        sys.exit(1)
+
+
+def schema():
+    import pyarrow as pa
+
+    types = {int: pa.int64(), float: pa.float64(), str: pa.string()}
+    fields = []
+    for name, kind in simtrace.COLUMNS:
+        fields.append(pa.field(name, pa.bool_() if name in BOOL_FIELDS else types[kind]))
+    fields.append(pa.field('pause_duration', pa.float64()))
+    return pa.schema(fields)
+
+
+def _parses(row):
+    """Whether the numeric fields of a row cast like the bulk kernels in table_from_rows do."""
+    for value, (name, kind) in zip(row, LOG_KINDS):
+        if kind is str:
+            continue
+        if not NUMBER_RE.fullmatch(value) or (kind is int and not float(value).is_integer()):
+            return False
+    return True
+
+
+def table_from_rows(rows):
+    """Arrow table from rows of string fields in LOG_FIELDS order; missing trailing fields are null.
+
+    Columns are built as strings and cast in bulk by Arrow compute kernels.
+    Rows with too few or too many fields, or with a field that does not
+    parse, e.g. a truncated line or a list-valued action, are left out;
+    the caller can count them from the number of rows returned.
+    """
+    import pyarrow as pa
+
+    width = len(LOG_FIELDS)
+    rows = [row for row in rows if len(simtrace.COLUMNS) <= len(row) <= width]
+    try:
+        return _cast_rows(rows)
+    except pa.ArrowInvalid:
+        pass
+    # Only a bad batch pays for checking its rows one by one.
+    try:
+        return _cast_rows([row for row in rows if _parses(row)])
+    except pa.ArrowInvalid:
+        return _cast_rows([])
+
+
+def _cast_rows(rows):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    target = schema()
+    width = len(target)
+    padded = [list(row) + [None] * (width - len(row)) for row in rows]
+    columns = list(zip(*padded)) if padded else [()] * width
+    arrays = []
+    for values, field in zip(columns, target):
+        strings = pa.array(values, type=pa.string())
+        if field.type == pa.string():
+            arrays.append(strings)
+        elif field.type == pa.bool_():
+            arrays.append(pc.equal(pc.utf8_lower(pc.utf8_trim_whitespace(strings)), 'true'))
+        elif field.type == pa.int64():
+            arrays.append(pc.cast(pc.cast(strings, pa.float64()), pa.int64()))
+        else:
+            arrays.append(pc.cast(strings, field.type))
+    return pa.Table.from_arrays(arrays, schema=target)
+
+
+def table_from_csv(data):
+    """Arrow table in schema() layout from the bytes of a simtrace CSV; absent columns are null.
+
+    Rows with the wrong number of fields are skipped. An empty file gives an
+    empty table; other unparseable data raises pyarrow.ArrowInvalid.
+    """
+    import io
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    target = schema()
+    if not data.strip():
+        return target.empty_table()
+    options = pv.ConvertOptions(column_types={field.name: field.type for field in target},
+                                true_values=['True', 'true'], false_values=['False', 'false'])
+    table = pv.read_csv(io.BytesIO(data), parse_options=pv.ParseOptions(invalid_row_handler=lambda row: 'skip'),
+                        convert_options=options)
+    arrays = [table.column(field.name) if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+              for field in target]
+    return pa.Table.from_arrays(arrays, schema=target)
+
+
+def episode_index(table, keys):
+    """One row per episode with its row range and summary.
+
+    `keys` are the columns identifying an episode next to 'episode', e.g.
+    ['object', 'iteration']. Rows of an episode must be consecutive.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    with_row = table.select(keys + ['episode', 'steps', 'progress', 'reward', 'tstamp']).append_column(
+        'row', pa.array(range(table.num_rows), type=pa.int64()))
+    grouped = with_row.group_by(keys + ['episode'], use_threads=False).aggregate([
+        ('row', 'min'), ('row', 'count'), ('steps', 'max'), ('progress', 'max'), ('reward', 'sum'),
+        ('tstamp', 'min'), ('tstamp', 'max')])
+    names = {'row_min': 'first_row', 'row_count': 'rows', 'steps_max': 'steps', 'progress_max': 'progress',
+             'reward_sum': 'reward', 'tstamp_min': 'start_time', 'tstamp_max': 'end_time'}
+    grouped = grouped.rename_columns([names.get(name, name) for name in grouped.column_names])
+    last_rows = pc.subtract(pc.add(grouped.column('first_row'), grouped.column('rows')), 1)
+    status = table.column('episode_status').take(last_rows)
+    return grouped.append_column('episode_status', status).sort_by('first_row')
+
+
+def write(table, path, row_group_size=None):
+    """Write a table atomically as zstd Parquet."""
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    pq.write_table(table, tmp_path, compression='zstd', row_group_size=row_group_size or max(table.num_rows, 1))
+    os.replace(tmp_path, path)
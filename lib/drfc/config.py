@@ -0,0 +1,464 @@
+"""Builds the robomaker configuration documents from the DR_* environment.
+
+The training and evaluation prepare-config scripts and upload-model.py all
+render their YAML through this module. Values that depend on the start time
+are kept as tokens in the generated template, which lets the template be
+cached on disk and reused for as long as the environment and this module
+are unchanged.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+CACHE_VERSION = 1
+
+TIMESTAMP_TOKEN = '@TIMESTAMP@'
+EPOCH_TOKEN = '@EPOCH@'
+
+# Variables that change on every run without affecting the configuration, left out of the cache key.
+VOLATILE_PREFIXES = ('DR_TIMING',)
+
+# (config key, environment variables in order of precedence, default)
+TRAINING_KEYS = [
+    ('AWS_REGION', ('DR_AWS_APP_REGION',), 'us-east-1'),
+    ('KINESIS_VIDEO_STREAM_NAME', ('DR_KINESIS_STREAM_NAME',), ''),
+    ('METRICS_S3_BUCKET', ('DR_LOCAL_S3_BUCKET',), 'bucket'),
+    ('MODEL_METADATA_FILE_S3_KEY', ('DR_LOCAL_S3_MODEL_METADATA_KEY',), 'custom_files/model_metadata.json'),
+    ('REWARD_FILE_S3_KEY', ('DR_LOCAL_S3_REWARD_KEY',), 'custom_files/reward_function.py'),
+    ('NUM_WORKERS', ('DR_WORKERS',), 1),
+    ('SAGEMAKER_SHARED_S3_BUCKET', ('DR_LOCAL_S3_BUCKET',), 'bucket'),
+    ('SAGEMAKER_SHARED_S3_PREFIX', ('DR_LOCAL_S3_MODEL_PREFIX',), 'rl-deepracer-sagemaker'),
+    ('SIMTRACE_S3_BUCKET', ('DR_LOCAL_S3_BUCKET',), 'bucket'),
+    ('SIMTRACE_S3_PREFIX', ('DR_LOCAL_S3_MODEL_PREFIX',), 'rl-deepracer-sagemaker'),
+    # Car and training
+    ('BODY_SHELL_TYPE', ('DR_CAR_BODY_SHELL_TYPE',), 'deepracer'),
+    ('CAR_COLOR', ('DR_CAR_COLOR',), 'Red'),
+    ('CAR_NAME', ('DR_CAR_NAME',), 'MyCar'),
+    ('RACE_TYPE', ('DR_RACE_TYPE',), 'TIME_TRIAL'),
+    ('WORLD_NAME', ('DR_WORLD_NAME',), 'LGSWide'),
+    ('DISPLAY_NAME', ('DR_DISPLAY_NAME',), 'racer1'),
+    ('RACER_NAME', ('DR_RACER_NAME',), 'racer1'),
+    ('REVERSE_DIR', ('DR_TRAIN_REVERSE_DIRECTION',), False),
+    ('ALTERNATE_DRIVING_DIRECTION', ('DR_TRAIN_ALTERNATE_DRIVING_DIRECTION', 'DR_ALTERNATE_DRIVING_DIRECTION'), 'false'),
+    ('CHANGE_START_POSITION', ('DR_TRAIN_CHANGE_START_POSITION', 'DR_CHANGE_START_POSITION'), 'true'),
+    ('ROUND_ROBIN_ADVANCE_DIST', ('DR_TRAIN_ROUND_ROBIN_ADVANCE_DIST',), '0.05'),
+    ('START_POSITION_OFFSET', ('DR_TRAIN_START_POSITION_OFFSET',), '0.00'),
+    ('ENABLE_DOMAIN_RANDOMIZATION', ('DR_ENABLE_DOMAIN_RANDOMIZATION',), 'false'),
+    ('MIN_EVAL_TRIALS', ('DR_TRAIN_MIN_EVAL_TRIALS',), '5'),
+    ('CAMERA_MAIN_ENABLE', ('DR_CAMERA_MAIN_ENABLE',), 'True'),
+    ('CAMERA_SUB_ENABLE', ('DR_CAMERA_SUB_ENABLE',), 'True'),
+    ('BEST_MODEL_METRIC', ('DR_TRAIN_BEST_MODEL_METRIC',), 'progress'),
+    ('ENABLE_EXTRA_KVS_OVERLAY', ('DR_ENABLE_EXTRA_KVS_OVERLAY',), 'False'),
+]
+
+EVALUATION_KEYS = [
+    ('AWS_REGION', ('DR_AWS_APP_REGION',), 'us-east-1'),
+    ('KINESIS_VIDEO_STREAM_NAME', ('DR_KINESIS_STREAM_NAME',), ''),
+    ('EVAL_CHECKPOINT', ('DR_EVAL_CHECKPOINT',), 'last'),
+    ('RACE_TYPE', ('DR_RACE_TYPE',), 'TIME_TRIAL'),
+    ('WORLD_NAME', ('DR_WORLD_NAME',), 'LGSWide'),
+    ('NUMBER_OF_TRIALS', ('DR_EVAL_NUMBER_OF_TRIALS',), '5'),
+    ('ENABLE_DOMAIN_RANDOMIZATION', ('DR_ENABLE_DOMAIN_RANDOMIZATION',), 'false'),
+    ('RESET_BEHIND_DIST', ('DR_EVAL_RESET_BEHIND_DIST',), '1.0'),
+    ('IS_CONTINUOUS', ('DR_EVAL_IS_CONTINUOUS',), 'True'),
+    ('NUMBER_OF_RESETS', ('DR_EVAL_MAX_RESETS',), '0'),
+    ('OFF_TRACK_PENALTY', ('DR_EVAL_OFF_TRACK_PENALTY',), '5.0'),
+    ('COLLISION_PENALTY', ('DR_COLLISION_PENALTY',), '5.0'),
+    ('CAMERA_MAIN_ENABLE', ('DR_CAMERA_MAIN_ENABLE',), 'True'),
+    ('CAMERA_SUB_ENABLE', ('DR_CAMERA_SUB_ENABLE',), 'True'),
+    ('REVERSE_DIR', ('DR_EVAL_REVERSE_DIRECTION',), False),
+    ('ENABLE_EXTRA_KVS_OVERLAY', ('DR_ENABLE_EXTRA_KVS_OVERLAY',), 'False'),
+]
+
+# Evaluation lists hold one entry per racer; the second entry is only added
+# for HEAD_TO_MODEL.
+EVALUATION_RACER_KEYS = [
+    ('BODY_SHELL_TYPE', ('DR_CAR_BODY_SHELL_TYPE',), 'deepracer'),
+    ('CAR_COLOR', ('DR_CAR_COLOR',), 'Red'),
+    ('DISPLAY_NAME', ('DR_DISPLAY_NAME',), 'racer1'),
+    ('RACER_NAME', ('DR_RACER_NAME',), 'racer1'),
+]
+
+UPLOAD_KEYS = [
+    ('AWS_REGION', ('DR_AWS_APP_REGION',), 'us-east-1'),
+    ('METRICS_S3_BUCKET', ('TARGET_S3_BUCKET',), 'bucket'),
+    ('SAGEMAKER_SHARED_S3_BUCKET', ('TARGET_S3_BUCKET',), 'bucket'),
+    ('SAGEMAKER_SHARED_S3_PREFIX', ('TARGET_S3_PREFIX',), 'rl-deepracer-sagemaker'),
+    # Car and training
+    ('BODY_SHELL_TYPE', ('DR_CAR_BODY_SHELL_TYPE',), 'deepracer'),
+    ('CAR_NAME', ('DR_CAR_NAME',), 'MyCar'),
+    ('RACE_TYPE', ('DR_RACE_TYPE',), 'TIME_TRIAL'),
+    ('WORLD_NAME', ('DR_WORLD_NAME',), 'LGSWide'),
+    ('DISPLAY_NAME', ('DR_DISPLAY_NAME',), 'racer1'),
+    ('RACER_NAME', ('DR_RACER_NAME',), 'racer1'),
+    ('ALTERNATE_DRIVING_DIRECTION', ('DR_TRAIN_ALTERNATE_DRIVING_DIRECTION', 'DR_ALTERNATE_DRIVING_DIRECTION'), 'false'),
+    ('CHANGE_START_POSITION', ('DR_TRAIN_CHANGE_START_POSITION', 'DR_CHANGE_START_POSITION'), 'true'),
+    ('ROUND_ROBIN_ADVANCE_DIST', ('DR_TRAIN_ROUND_ROBIN_ADVANCE_DIST',), '0.05'),
+    ('START_POSITION_OFFSET', ('DR_TRAIN_START_POSITION_OFFSET',), '0.00'),
+    ('ENABLE_DOMAIN_RANDOMIZATION', ('DR_ENABLE_DOMAIN_RANDOMIZATION',), 'false'),
+    ('MIN_EVAL_TRIALS', ('DR_TRAIN_MIN_EVAL_TRIALS',), '5'),
+]
+
+RACE_TYPE_SECTIONS = {
+    'OBJECT_AVOIDANCE': [
+        ('NUMBER_OF_OBSTACLES', ('DR_OA_NUMBER_OF_OBSTACLES',), '6'),
+        ('MIN_DISTANCE_BETWEEN_OBSTACLES', ('DR_OA_MIN_DISTANCE_BETWEEN_OBSTACLES',), '2.0'),
+        ('RANDOMIZE_OBSTACLE_LOCATIONS', ('DR_OA_RANDOMIZE_OBSTACLE_LOCATIONS',), 'True'),
+        ('IS_OBSTACLE_BOT_CAR', ('DR_OA_IS_OBSTACLE_BOT_CAR',), 'false'),
+        ('OBSTACLE_TYPE', ('DR_OA_OBSTACLE_TYPE',), 'box_obstacle'),
+    ],
+    'HEAD_TO_BOT': [
+        ('IS_LANE_CHANGE', ('DR_H2B_IS_LANE_CHANGE',), 'False'),
+        ('LOWER_LANE_CHANGE_TIME', ('DR_H2B_LOWER_LANE_CHANGE_TIME',), '3.0'),
+        ('UPPER_LANE_CHANGE_TIME', ('DR_H2B_UPPER_LANE_CHANGE_TIME',), '5.0'),
+        ('LANE_CHANGE_DISTANCE', ('DR_H2B_LANE_CHANGE_DISTANCE',), '1.0'),
+        ('NUMBER_OF_BOT_CARS', ('DR_H2B_NUMBER_OF_BOT_CARS',), '0'),
+        ('MIN_DISTANCE_BETWEEN_BOT_CARS', ('DR_H2B_MIN_DISTANCE_BETWEEN_BOT_CARS',), '2.0'),
+        ('RANDOMIZE_BOT_CAR_LOCATIONS', ('DR_H2B_RANDOMIZE_BOT_CAR_LOCATIONS',), 'False'),
+        ('BOT_CAR_SPEED', ('DR_H2B_BOT_CAR_SPEED',), '0.2'),
+        ('PENALTY_SECONDS', ('DR_H2B_BOT_CAR_PENALTY',), '2.0'),
+    ],
+}
+
+# Keys a multi-config worker overrides from its worker-N.env. Unlike the
+# base configuration these have no defaults; a missing variable becomes None.
+WORKER_KEYS = [
+    ('WORLD_NAME', 'DR_WORLD_NAME', None),
+    ('RACE_TYPE', 'DR_RACE_TYPE', None),
+    ('CAR_COLOR', 'DR_CAR_COLOR', None),
+    ('BODY_SHELL_TYPE', 'DR_CAR_BODY_SHELL_TYPE', None),
+    ('ALTERNATE_DRIVING_DIRECTION', 'DR_TRAIN_ALTERNATE_DRIVING_DIRECTION', None),
+    ('CHANGE_START_POSITION', 'DR_TRAIN_CHANGE_START_POSITION', None),
+    ('ROUND_ROBIN_ADVANCE_DIST', 'DR_TRAIN_ROUND_ROBIN_ADVANCE_DIST', None),
+    ('ENABLE_DOMAIN_RANDOMIZATION', 'DR_ENABLE_DOMAIN_RANDOMIZATION', None),
+    ('START_POSITION_OFFSET', 'DR_TRAIN_START_POSITION_OFFSET', '0.00'),
+    ('REVERSE_DIR', 'DR_TRAIN_REVERSE_DIRECTION', False),
+    ('CAMERA_MAIN_ENABLE', 'DR_CAMERA_MAIN_ENABLE', 'True'),
+    ('CAMERA_SUB_ENABLE', 'DR_CAMERA_SUB_ENABLE', 'True'),
+    ('ENABLE_EXTRA_KVS_OVERLAY', 'DR_ENABLE_EXTRA_KVS_OVERLAY', 'False'),
+]
+
+WORKER_RACE_TYPE_SECTIONS = {
+    'OBJECT_AVOIDANCE': [
+        ('NUMBER_OF_OBSTACLES', 'DR_OA_NUMBER_OF_OBSTACLES', None),
+        ('MIN_DISTANCE_BETWEEN_OBSTACLES', 'DR_OA_MIN_DISTANCE_BETWEEN_OBSTACLES', None),
+        ('RANDOMIZE_OBSTACLE_LOCATIONS', 'DR_OA_RANDOMIZE_OBSTACLE_LOCATIONS', None),
+        ('IS_OBSTACLE_BOT_CAR', 'DR_OA_IS_OBSTACLE_BOT_CAR', None),
+        ('OBSTACLE_TYPE', 'DR_OA_OBSTACLE_TYPE', 'box_obstacle'),
+    ],
+    'HEAD_TO_BOT': [
+        ('IS_LANE_CHANGE', 'DR_H2B_IS_LANE_CHANGE', None),
+        ('LOWER_LANE_CHANGE_TIME', 'DR_H2B_LOWER_LANE_CHANGE_TIME', None),
+        ('UPPER_LANE_CHANGE_TIME', 'DR_H2B_UPPER_LANE_CHANGE_TIME', None),
+        ('LANE_CHANGE_DISTANCE', 'DR_H2B_LANE_CHANGE_DISTANCE', None),
+        ('NUMBER_OF_BOT_CARS', 'DR_H2B_NUMBER_OF_BOT_CARS', None),
+        ('MIN_DISTANCE_BETWEEN_BOT_CARS', 'DR_H2B_MIN_DISTANCE_BETWEEN_BOT_CARS', None),
+        ('RANDOMIZE_BOT_CAR_LOCATIONS', 'DR_H2B_RANDOMIZE_BOT_CAR_LOCATIONS', None),
+        ('BOT_CAR_SPEED', 'DR_H2B_BOT_CAR_SPEED', None),
+        ('PENALTY_SECONDS', 'DR_H2B_BOT_CAR_PENALTY', None),
+    ],
+}
+
+# Keys removed from a worker configuration when its race type does not use
+# them. PENALTY_SECONDS and OBSTACLE_TYPE are deliberately kept, as before.
+WORKER_STALE_KEYS = {
+    'OBJECT_AVOIDANCE': ['NUMBER_OF_OBSTACLES', 'MIN_DISTANCE_BETWEEN_OBSTACLES', 'RANDOMIZE_OBSTACLE_LOCATIONS',
+                         'IS_OBSTACLE_BOT_CAR', 'OBJECT_POSITIONS'],
+    'HEAD_TO_BOT': ['IS_LANE_CHANGE', 'LOWER_LANE_CHANGE_TIME', 'UPPER_LANE_CHANGE_TIME', 'LANE_CHANGE_DISTANCE',
+                    'NUMBER_OF_BOT_CARS', 'MIN_DISTANCE_BETWEEN_BOT_CARS', 'RANDOMIZE_BOT_CAR_LOCATIONS',
+                    'BOT_CAR_SPEED'],
+}
+
+
+def str2bool(v):
+    return v.lower() in ("yes", "true", "t", "1")
+
+
+def lookup(env, names, default):
+    for name in names:
+        if name in env:
+            return env[name]
+    return default
+
+
+def apply_keys(config, keys, env, exclude=()):
+    for key, names, default in keys:
+        if key not in exclude:
+            config[key] = lookup(env, names, default)
+
+
+def object_positions(env, strip_quotes=False):
+    positions = env.get('DR_OA_OBJECT_POSITIONS', "")
+    if strip_quotes:
+        positions = positions.replace('"', '')
+    if positions == "":
+        return None
+    return positions.split(";")
+
+
+def apply_race_type(config, env, exclude=()):
+    section = RACE_TYPE_SECTIONS.get(config['RACE_TYPE'])
+    if section is None:
+        return
+    apply_keys(config, section, env, exclude)
+
+    if config['RACE_TYPE'] == 'OBJECT_AVOIDANCE':
+        positions = object_positions(env)
+        if positions is not None:
+            config['OBJECT_POSITIONS'] = positions
+            config['NUMBER_OF_OBSTACLES'] = str(len(positions))
+
+
+def build_training_config(env=os.environ):
+    config = {}
+    apply_keys(config, TRAINING_KEYS, env)
+    config['JOB_TYPE'] = 'TRAINING'
+    config['ROBOMAKER_SIMULATION_JOB_ACCOUNT_ID'] = 'Dummy'
+    config['TRAINING_JOB_ARN'] = 'arn:Dummy'
+
+    metrics_prefix = env.get('DR_LOCAL_S3_METRICS_PREFIX', None)
+    if metrics_prefix is not None:
+        config['METRICS_S3_OBJECT_KEY'] = '{}/TrainingMetrics.json'.format(metrics_prefix)
+    else:
+        config['METRICS_S3_OBJECT_KEY'] = 'DeepRacer-Metrics/TrainingMetrics-{}.json'.format(TIMESTAMP_TOKEN)
+
+    apply_race_type(config, env)
+    return config
+
+
+def build_worker_config(config, env):
+    """Overlay the settings of one multi-config worker onto `config` in place."""
+    for key, name, default in WORKER_KEYS:
+        config[key] = env.get(name, default)
+
+    race_type = config['RACE_TYPE']
+    for section_type, section in WORKER_RACE_TYPE_SECTIONS.items():
+        if race_type == section_type:
+            for key, name, default in section:
+                config[key] = env.get(name, default)
+        else:
+            for key in WORKER_STALE_KEYS[section_type]:
+                config.pop(key, None)
+
+    if race_type == 'OBJECT_AVOIDANCE':
+        positions = object_positions(env, strip_quotes=True)
+        if positions is not None:
+            config['OBJECT_POSITIONS'] = positions
+            config['NUMBER_OF_OBSTACLES'] = str(len(positions))
+        else:
+            config.pop('OBJECT_POSITIONS', None)
+
+    return config
+
+
+def build_evaluation_config(env=os.environ):
+    config = {}
+    for key, _, _ in EVALUATION_RACER_KEYS:
+        config[key] = []
+    for key in ['MODEL_S3_PREFIX', 'MODEL_S3_BUCKET', 'SIMTRACE_S3_PREFIX', 'SIMTRACE_S3_BUCKET',
+                'METRICS_S3_BUCKET', 'METRICS_S3_OBJECT_KEY', 'MP4_S3_BUCKET', 'MP4_S3_OBJECT_PREFIX']:
+        config[key] = []
+
+    apply_keys(config, EVALUATION_KEYS, env)
+    config['JOB_TYPE'] = 'EVALUATION'
+    config['ROBOMAKER_SIMULATION_JOB_ACCOUNT_ID'] = 'Dummy'
+
+    bucket = env.get('DR_LOCAL_S3_BUCKET', 'bucket')
+    model_prefix = env.get('DR_LOCAL_S3_MODEL_PREFIX', 'rl-deepracer-sagemaker')
+    config['MODEL_S3_PREFIX'].append(model_prefix)
+    config['MODEL_S3_BUCKET'].append(bucket)
+    config['SIMTRACE_S3_BUCKET'].append(bucket)
+    config['SIMTRACE_S3_PREFIX'].append('{}/evaluation-{}'.format(model_prefix, TIMESTAMP_TOKEN))
+
+    # Metrics
+    config['METRICS_S3_BUCKET'].append(bucket)
+    metrics_prefix = env.get('DR_LOCAL_S3_METRICS_PREFIX', None)
+    if metrics_prefix is not None:
+        config['METRICS_S3_OBJECT_KEY'].append('{}/evaluation/evaluation-{}.json'.format(metrics_prefix, TIMESTAMP_TOKEN))
+    else:
+        config['METRICS_S3_OBJECT_KEY'].append('DeepRacer-Metrics/EvaluationMetrics-{}.json'.format(TIMESTAMP_TOKEN))
+
+    # MP4 configuration
+    save_mp4 = str2bool(env.get("DR_EVAL_SAVE_MP4", "False"))
+    if save_mp4:
+        config['MP4_S3_BUCKET'].append(bucket)
+        config['MP4_S3_OBJECT_PREFIX'].append('{}/{}'.format(env.get('DR_LOCAL_S3_MODEL_PREFIX', 'bucket'), 'mp4'))
+
+    for key, names, default in EVALUATION_RACER_KEYS:
+        config[key].append(lookup(env, names, default))
+
+    apply_race_type(config, env)
+
+    # Head to Model
+    if config['RACE_TYPE'] == 'HEAD_TO_MODEL':
+        opp_prefix = env.get('DR_EVAL_OPP_S3_MODEL_PREFIX', 'rl-deepracer-sagemaker')
+        config['MODEL_S3_PREFIX'].append(opp_prefix)
+        config['MODEL_S3_BUCKET'].append(bucket)
+        config['SIMTRACE_S3_BUCKET'].append(bucket)
+        config['SIMTRACE_S3_PREFIX'].append(opp_prefix)
+
+        config['METRICS_S3_BUCKET'].append(bucket)
+        opp_metrics_prefix = env.get('DR_EVAL_OPP_S3_METRICS_PREFIX', '{}/{}'.format(opp_prefix, 'metrics'))
+        config['METRICS_S3_OBJECT_KEY'].append('{}/EvaluationMetrics-{}.json'.format(opp_metrics_prefix, EPOCH_TOKEN))
+
+        if save_mp4:
+            config['MP4_S3_BUCKET'].append(bucket)
+            config['MP4_S3_OBJECT_PREFIX'].append('{}/{}'.format(env.get('DR_EVAL_OPP_MODEL_PREFIX', 'bucket'), 'mp4'))
+
+        config['DISPLAY_NAME'].append(env.get('DR_EVAL_OPP_DISPLAY_NAME', 'racer1'))
+        config['RACER_NAME'].append(env.get('DR_EVAL_OPP_RACER_NAME', 'racer1'))
+        config['BODY_SHELL_TYPE'].append(env.get('DR_EVAL_OPP_CAR_BODY_SHELL_TYPE', 'deepracer'))
+        config['VIDEO_JOB_TYPE'] = 'EVALUATION'
+        config['CAR_COLOR'] = ['Purple', 'Orange']
+        config['MODEL_NAME'] = config['DISPLAY_NAME']
+
+    return config
+
+
+def build_upload_config(env=os.environ):
+    config = {}
+    apply_keys(config, UPLOAD_KEYS, env)
+    target_prefix = env.get('TARGET_S3_PREFIX', 'bucket')
+    config['JOB_TYPE'] = 'TRAINING'
+    config['METRICS_S3_OBJECT_KEY'] = "{}/TrainingMetrics.json".format(target_prefix)
+    config['MODEL_METADATA_FILE_S3_KEY'] = "{}/model/model_metadata.json".format(target_prefix)
+    config['REWARD_FILE_S3_KEY'] = "{}/reward_function.py".format(target_prefix)
+    if config['BODY_SHELL_TYPE'] == 'deepracer':
+        config['CAR_COLOR'] = env.get('DR_CAR_COLOR', 'Red')
+
+    apply_race_type(config, env, exclude=('OBSTACLE_TYPE', 'PENALTY_SECONDS'))
+    return config
+
+
+BUILDERS = {
+    'training': build_training_config,
+    'evaluation': build_evaluation_config,
+    'upload': build_upload_config,
+}
+
+
+def to_yaml(config):
+    import yaml
+    return yaml.dump(config, default_flow_style=False, default_style='\'', explicit_start=True)
+
+
+def render(text, timestamp=None, epoch=None):
+    """Substitute the start-time tokens in a YAML template."""
+    if timestamp is not None:
+        text = text.replace(TIMESTAMP_TOKEN, timestamp)
+    if epoch is not None:
+        text = text.replace(EPOCH_TOKEN, str(epoch))
+    return text
+
+
+def render_config(config, timestamp=None, epoch=None):
+    """Substitute the start-time tokens in a configuration dict."""
+    if isinstance(config, dict):
+        return {k: render_config(v, timestamp, epoch) for k, v in config.items()}
+    if isinstance(config, list):
+        return [render_config(v, timestamp, epoch) for v in config]
+    if isinstance(config, str):
+        return render(config, timestamp, epoch)
+    return config
+
+
+def env_hash(kind, env):
+    """Cache key of a template: the relevant environment and this module's source."""
+    relevant = sorted((k, v) for k, v in env.items()
+                      if (k.startswith('DR_') or k.startswith('TARGET_')) and not k.startswith(VOLATILE_PREFIXES))
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, kind, relevant]).encode('utf-8'))
+    # Key tables and defaults live here, so a changed builder invalidates the cache as well.
+    with open(os.path.abspath(__file__), 'rb') as fh:
+        digest.update(fh.read())
+    return digest.hexdigest()
+
+
+def cache_dir(env=os.environ):
+    dr_dir = env.get('DR_DIR', None)
+    if dr_dir is None:
+        return None
+    return os.path.join(dr_dir, 'tmp', 'config-cache')
+
+
+def load_template(kind, env=os.environ, use_cache=True):
+    """Return (config, yaml_text) for `kind`, with start-time tokens unrendered.
+
+    The result is cached in $DR_DIR/tmp/config-cache/<kind>.json and reused
+    while the hash of the DR_* / TARGET_* environment and of this module stays
+    the same.
+    """
+    key = env_hash(kind, env)
+    directory = cache_dir(env) if use_cache else None
+    path = os.path.join(directory, '{}.json'.format(kind)) if directory else None
+
+    if path is not None and os.path.isfile(path):
+        try:
+            with open(path, 'r') as fh:
+                cached = json.load(fh)
+            if cached.get('key') == key:
+                return cached['config'], cached['yaml']
+        except (ValueError, KeyError, OSError):
+            pass
+
+    config = BUILDERS[kind](env)
+    text = to_yaml(config)
+
+    if path is not None:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = '{}.{}'.format(path, os.getpid())
+            with open(tmp_path, 'w') as fh:
+                json.dump({'key': key, 'config': config, 'yaml': text}, fh)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    return config, text
+
+
+def benchmark(kind, iterations, env=os.environ):
+    import tempfile
+
+    results = {}
+    start = time.perf_counter()
+    for _ in range(iterations):
+        to_yaml(BUILDERS[kind](env))
+    results['uncached_ms'] = (time.perf_counter() - start) * 1000 / iterations
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bench_env = dict(env)
+        bench_env['DR_DIR'] = tmp_dir
+        load_template(kind, bench_env)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            load_template(kind, bench_env)
+        results['cached_ms'] = (time.perf_counter() - start) * 1000 / iterations
+
+    return results
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Render or benchmark a robomaker configuration document.')
+    parser.add_argument('kind', choices=sorted(BUILDERS.keys()))
+    parser.add_argument('-n', '--iterations', type=int, default=0,
+                        help='Benchmark config generation over N iterations instead of printing it.')
+    args = parser.parse_args(argv)
+
+    if args.iterations > 0:
+        results = benchmark(args.kind, args.iterations)
+        print(json.dumps({'kind': args.kind, 'iterations': args.iterations,
+                          'uncached_ms': round(results['uncached_ms'], 3),
+                          'cached_ms': round(results['cached_ms'], 3)}))
+    else:
+        _, text = load_template(args.kind, use_cache=False)
+        sys.stdout.write(text)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
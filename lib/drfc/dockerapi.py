@@ -0,0 +1,164 @@
+"""Minimal asyncio client for the Docker Engine API on its unix socket.
+
+Only what following logs needs: GET requests, JSON responses and the log
+stream. Log streams of containers without a TTY are multiplexed in frames
+of an 8-byte header (stream type, 3 zero bytes, big-endian payload size)
+followed by the payload; TTY containers send raw bytes.
+"""
+
+import asyncio
+import calendar
+import json
+import os
+import re
+import struct
+import time
+from urllib.parse import quote, urlencode
+
+API_VERSION = 'v1.41'
+DEFAULT_SOCKET = '/var/run/docker.sock'
+
+STDOUT = 1
+STDERR = 2
+
+# RFC 3339 with nanoseconds in UTC, as prefixed to log lines requested with timestamps.
+TIMESTAMP_RE = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?Z$')
+
+
+class DockerAPIError(Exception):
+    pass
+
+
+def socket_path(env=os.environ):
+    """The unix socket of DOCKER_HOST when that is a unix:// URL, else the default socket."""
+    host = env.get('DOCKER_HOST', '')
+    if host.startswith('unix://'):
+        return host[len('unix://'):]
+    return DEFAULT_SOCKET
+
+
+async def _request(socket, path, params=None):
+    reader, writer = await asyncio.open_unix_connection(socket)
+    target = '/{}{}'.format(API_VERSION, path)
+    if params:
+        target += '?' + urlencode(params)
+    writer.write('GET {} HTTP/1.1\r\nHost: docker\r\nConnection: close\r\n\r\n'.format(target).encode('ascii'))
+    await writer.drain()
+    status_line = await reader.readline()
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        writer.close()
+        raise DockerAPIError('invalid response to GET {}: {!r}'.format(path, status_line))
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return status, headers, reader, writer
+
+
+async def _body(reader, headers):
+    """The response body in chunks as they arrive, undoing chunked transfer encoding."""
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size_line = await reader.readline()
+            if not size_line:
+                return
+            size = int(size_line.split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                return
+            yield await reader.readexactly(size)
+            await reader.readline()
+    elif 'content-length' in headers:
+        yield await reader.readexactly(int(headers['content-length']))
+    else:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            yield data
+
+
+async def get_json(socket, path, params=None):
+    status, headers, reader, writer = await _request(socket, path, params)
+    try:
+        body = b''.join([chunk async for chunk in _body(reader, headers)])
+    finally:
+        writer.close()
+    if status >= 400:
+        raise DockerAPIError('GET {} returned {}: {}'.format(path, status, body[:200].decode('utf-8', 'replace')))
+    return json.loads(body.decode('utf-8'))
+
+
+async def containers(socket, filters=None):
+    params = {'filters': json.dumps(filters)} if filters else None
+    return await get_json(socket, '/containers/json', params)
+
+
+async def inspect(socket, container_id):
+    return await get_json(socket, '/containers/{}/json'.format(quote(container_id)))
+
+
+def env_value(details, name):
+    """Value of the environment variable `name` in a container's inspect output, or None."""
+    prefix = name + '='
+    for entry in details.get('Config', {}).get('Env') or []:
+        if entry.startswith(prefix):
+            return entry[len(prefix):]
+    return None
+
+
+async def log_lines(socket, container_id, tty=False, follow=True, tail='all', since=None, timestamps=False):
+    """(stream, line) for every complete log line of a container; stream is STDOUT or STDERR.
+
+    With timestamps each line starts with the time Docker received it; see
+    split_timestamp.
+    """
+    params = {'follow': int(follow), 'stdout': 1, 'stderr': 1, 'tail': tail}
+    if since is not None:
+        params['since'] = since
+    if timestamps:
+        params['timestamps'] = 1
+    status, headers, reader, writer = await _request(socket, '/containers/{}/logs'.format(quote(container_id)),
+                                                     params)
+    pending = {STDOUT: b'', STDERR: b''}
+    frames = b''
+    try:
+        if status >= 400:
+            raise DockerAPIError('logs of {} returned {}'.format(container_id, status))
+        async for chunk in _body(reader, headers):
+            if tty:
+                parts = [(STDOUT, chunk)]
+            else:
+                frames += chunk
+                parts = []
+                while len(frames) >= 8:
+                    stream, size = struct.unpack('>BxxxL', frames[:8])
+                    if len(frames) < 8 + size:
+                        break
+                    parts.append((STDERR if stream == STDERR else STDOUT, frames[8:8 + size]))
+                    frames = frames[8 + size:]
+            for stream, data in parts:
+                lines = (pending[stream] + data).split(b'\n')
+                pending[stream] = lines.pop()
+                for line in lines:
+                    yield stream, line.rstrip(b'\r').decode('utf-8', 'replace')
+        for stream, rest in pending.items():
+            if rest:
+                yield stream, rest.rstrip(b'\r').decode('utf-8', 'replace')
+    finally:
+        writer.close()
+
+
+def split_timestamp(line):
+    """(seconds since the epoch, rest of the line) for a log line read with timestamps; (None, line) without one."""
+    stamp, separator, rest = line.partition(' ')
+    match = TIMESTAMP_RE.match(stamp)
+    if not separator or not match:
+        return None, line
+    # Python parses at most microseconds; the fraction is taken separately.
+    seconds = calendar.timegm(time.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S'))
+    return seconds + float('0.' + (match.group(2) or '0')), rest
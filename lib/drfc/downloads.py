@@ -0,0 +1,100 @@
+"""Parallel HTTP downloads of leaderboard assets (log tarballs, videos).
+
+Files are streamed to <name>.part and renamed into place only once the
+byte count matches Content-Length, so an existing final file is always
+complete. An interrupted .part file is resumed with a Range request.
+urllib3 is used for connection pooling; it is always installed along
+with botocore.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _total_size(response, offset):
+    """Full object size from Content-Range (206) or Content-Length (200), or None if unknown."""
+    content_range = response.headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total != '*' else None
+    length = response.headers.get('Content-Length')
+    if length is None:
+        return None
+    return int(length) + (offset if response.status == 206 else 0)
+
+
+def download(http, url, path):
+    """Download url to path through the urllib3 pool `http`; returns the number of bytes fetched.
+
+    Does nothing if path already exists.
+    """
+    if os.path.isfile(path):
+        return 0
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    part_path = path + '.part'
+    offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+
+    headers = {'Range': 'bytes={}-'.format(offset)} if offset > 0 else {}
+    response = http.request('GET', url, headers=headers, preload_content=False)
+    try:
+        if response.status == 416 and offset > 0:
+            # The part file may already hold everything; check against the real size.
+            total = _total_size(response, 0)
+            if total == offset:
+                os.replace(part_path, path)
+                return 0
+            os.remove(part_path)
+            raise DownloadError('{}: stale partial download discarded'.format(url))
+        if response.status not in (200, 206):
+            raise DownloadError('{}: HTTP {}'.format(url, response.status))
+        if response.status == 200:
+            # Server ignored the Range header; start over.
+            offset = 0
+        total = _total_size(response, offset)
+
+        fetched = 0
+        with open(part_path, 'ab' if offset > 0 else 'wb') as fh:
+            for chunk in response.stream(CHUNK_SIZE):
+                fh.write(chunk)
+                fetched += len(chunk)
+    finally:
+        response.release_conn()
+
+    if total is not None and offset + fetched != total:
+        raise DownloadError('{}: got {} of {} bytes; will resume next time'.format(url, offset + fetched, total))
+    os.replace(part_path, path)
+    return fetched
+
+
+class AssetDownloader:
+    """Thread pool with a shared connection pool for asset downloads.
+
+    `url` may be a callable, which is resolved on the worker thread; use it
+    for presigned URLs that have to be requested (and may expire) first.
+    """
+
+    def __init__(self, threads=4):
+        import urllib3
+
+        self.http = urllib3.PoolManager(maxsize=threads, retries=urllib3.Retry(total=3, backoff_factor=1))
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def submit(self, url, path):
+        if os.path.isfile(path):
+            return None
+        return self.executor.submit(self._run, url, path)
+
+    def _run(self, url, path):
+        if callable(url):
+            url = url()
+        print("Downloading {}".format(os.path.basename(path)))
+        return download(self.http, url, path)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,162 @@
+"""Parsing of system.env, run.env and worker-N.env.
+
+The files hold KEY=VALUE lines where values may refer to variables set
+earlier ($DR_LOCAL_S3_MODEL_PREFIX/metrics). activate.sh sources a compiled
+cache of `export KEY=VALUE` lines so the shell still does that expansion;
+Python callers get it from expand().
+"""
+
+import hashlib
+import os
+import re
+
+KEY_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+VAR_RE = re.compile(r'\$(?:\{([A-Za-z_][A-Za-z0-9_]*)\}|([A-Za-z_][A-Za-z0-9_]*))')
+
+
+def parse(path):
+    """(entries, problems) for an env file: entries are (key, raw value, line number) in file order.
+
+    Blank lines and # comments are skipped. Values may be quoted to contain
+    spaces; an unquoted value ends at the first whitespace, as it did when
+    activate.sh word-split the files. Invalid lines are reported, not fatal.
+    """
+    entries = []
+    problems = []
+    with open(path, 'r') as fh:
+        for number, line in enumerate(fh, 1):
+            text = line.strip()
+            if not text or text.startswith('#'):
+                continue
+            if text.startswith('export '):
+                text = text[len('export '):].lstrip()
+            key, sep, value = text.partition('=')
+            key = key.strip()
+            if not sep:
+                problems.append('{}:{}: no "=" in line'.format(path, number))
+                continue
+            if not KEY_RE.match(key):
+                problems.append('{}:{}: invalid variable name "{}"'.format(path, number, key))
+                continue
+            value = value.strip()
+            quote = value[:1]
+            if quote in ('"', "'") and value.find(quote, 1) > 0:
+                end = value.find(quote, 1)
+                rest = value[end + 1:].strip()
+                if rest and not rest.startswith('#'):
+                    problems.append('{}:{}: text after closing quote in value of {}'.format(path, number, key))
+                value = value[:end + 1]
+            else:
+                value = re.split(r'\s+#', value, 1)[0]
+                if re.search(r'\s', value):
+                    problems.append('{}:{}: unquoted whitespace in value of {}'.format(path, number, key))
+                    value = re.split(r'\s', value, 1)[0]
+            entries.append((key, value, number))
+    return entries, problems
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+        return value[1:-1], value[0] == "'"
+    return value, False
+
+
+def expand(value, env):
+    """Value as the shell would export it: quotes removed, $VAR and ${VAR} replaced from env."""
+    value, literal = _unquote(value)
+    if literal:
+        return value
+    return VAR_RE.sub(lambda m: env.get(m.group(1) or m.group(2), ''), value)
+
+
+def shell_value(value):
+    """Double-quoted shell word for a raw value; only $VAR and ${VAR} references stay live.
+
+    Every line of the compiled cache is then valid shell on its own, so one
+    bad value cannot break sourcing the rest.
+    """
+    value, literal = _unquote(value)
+    out = []
+    pos = 0
+    while pos < len(value):
+        char = value[pos]
+        match = VAR_RE.match(value, pos) if char == '$' and not literal else None
+        if match:
+            out.append(match.group(0))
+            pos = match.end()
+            continue
+        out.append('\\' + char if char in '"\\`$' else char)
+        pos += 1
+    return '"{}"'.format(''.join(out))
+
+
+def load(path, env=None):
+    """{key: expanded value} of an env file, expanding against env updated as lines are read."""
+    entries, _ = parse(path)
+    scope = dict(os.environ if env is None else env)
+    values = {}
+    for key, value, _ in entries:
+        values[key] = scope[key] = expand(value, scope)
+    return values
+
+
+def file_hash(path):
+    with open(path, 'rb') as fh:
+        return hashlib.sha1(fh.read()).hexdigest()
+
+
+def worker_files(dr_dir):
+    """worker-N.env files next to run.env, in worker order."""
+    found = []
+    for name in os.listdir(dr_dir):
+        match = re.match(r'^worker-(\d+)\.env$', name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(dr_dir, name)))
+    return [path for _, path in sorted(found)]
+
+
+def read_sources(header):
+    """{path: sha1} recorded in the header of a compiled cache."""
+    sources = {}
+    for line in header:
+        if not line.startswith('# source '):
+            break
+        _, _, digest, path = line.rstrip('\n').split(' ', 3)
+        sources[path] = digest
+    return sources
+
+
+def compile_cache(sources, cache_path, checked=()):
+    """Write the sourceable cache exporting the entries of `sources`.
+
+    Files in `checked` (worker-N.env) are only validated, but recorded so
+    that editing them also refreshes the cache. If no file's content
+    changed, only the cache mtime is refreshed. Returns (written, problems).
+    """
+    files = list(sources) + list(checked)
+    # The parser itself is recorded too, so a changed parser recompiles.
+    digests = [(path, file_hash(path)) for path in files + [os.path.abspath(__file__)]]
+    problems = []
+    entries = []
+    for path in files:
+        parsed, found = parse(path)
+        problems.extend(found)
+        if path in sources:
+            entries.extend(parsed)
+
+    if os.path.isfile(cache_path):
+        with open(cache_path, 'r') as fh:
+            recorded = read_sources(fh)
+        if list(recorded.items()) == digests:
+            os.utime(cache_path)
+            return False, problems
+
+    lines = ['# source {} {}\n'.format(digest, path) for path, digest in digests]
+    lines.append('# Compiled by bin/compile-env.py; regenerated when the files above change.\n')
+    lines.extend('export {}={}\n'.format(key, shell_value(value)) for key, value, _ in entries)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = '{}.{}'.format(cache_path, os.getpid())
+    with open(tmp_path, 'w') as fh:
+        fh.writelines(lines)
+    os.replace(tmp_path, cache_path)
+    return True, problems
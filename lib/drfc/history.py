@@ -0,0 +1,181 @@
+"""Append-only history of leaderboard submissions.
+
+Each leaderboard directory holds history.jsonl, one submission record per
+line, and summary.json with an index of what has been recorded and
+running aggregates over the successful submissions. A poll only appends
+a line when a submission is new or has changed status, and updates the
+aggregates incrementally; nothing is rewritten.
+
+Writers take an exclusive flock on history.lock. A line cut short by a
+crash is dropped on read and truncated before the next append.
+summary.json is replaced atomically and can always be rebuilt from the
+JSONL file.
+"""
+
+import fcntl
+import json
+import os
+import pickle
+
+HISTORY_FILE = 'history.jsonl'
+SUMMARY_FILE = 'summary.json'
+LOCK_FILE = 'history.lock'
+LEGACY_PICKLE = 'summary.pkl'
+
+
+def submission_key(submission):
+    return str(submission['SubmissionTime'])
+
+
+def job_id(submission):
+    return submission['ActivityArn'].split('/', 1)[1]
+
+
+def empty_summary():
+    return {'index': {}, 'jobs': {}, 'count': 0, 'best_lap': None, 'total_lap_sum': 0,
+            'reset_sum': 0, 'collision_sum': 0, 'off_track_sum': 0}
+
+
+def add_to_summary(summary, submission):
+    """Fold one record into the summary; aggregates only count a submission's first SUCCESS."""
+    key = submission_key(submission)
+    status = submission.get('LeaderboardSubmissionStatusType')
+    previous = summary['index'].get(key)
+    summary['index'][key] = status
+    summary['jobs'][job_id(submission)] = key
+    if status != 'SUCCESS' or previous == 'SUCCESS':
+        return
+    summary['count'] += 1
+    best = submission.get('BestLapTime')
+    if best and (summary['best_lap'] is None or best < summary['best_lap']):
+        summary['best_lap'] = best
+    summary['total_lap_sum'] += submission.get('TotalLapTime') or 0
+    summary['reset_sum'] += submission.get('ResetCount') or 0
+    summary['collision_sum'] += submission.get('CollisionCount') or 0
+    summary['off_track_sum'] += submission.get('OffTrackCount') or 0
+
+
+def averages(summary):
+    count = summary['count']
+    if count == 0:
+        return {}
+    return {'TotalLapTime': summary['total_lap_sum'] / count, 'ResetCount': summary['reset_sum'] / count,
+            'CollisionCount': summary['collision_sum'] / count, 'OffTrackCount': summary['off_track_sum'] / count}
+
+
+class SubmissionHistory:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.history_path = os.path.join(directory, HISTORY_FILE)
+        self.summary_path = os.path.join(directory, SUMMARY_FILE)
+        os.makedirs(directory, exist_ok=True)
+
+    def _lock(self):
+        fh = open(os.path.join(self.directory, LOCK_FILE), 'a')
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        return fh
+
+    def records(self):
+        """All complete records in append order."""
+        if not os.path.isfile(self.history_path):
+            return []
+        records = []
+        with open(self.history_path, 'r') as fh:
+            for line in fh:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    def latest(self):
+        """Latest record per submission, ordered by SubmissionTime."""
+        latest = {}
+        for record in self.records():
+            latest[submission_key(record)] = record
+        return [latest[k] for k in sorted(latest, key=lambda k: (len(k), k))]
+
+    def summary(self):
+        try:
+            with open(self.summary_path, 'r') as fh:
+                return json.load(fh)
+        except (ValueError, OSError):
+            return self.rebuild_summary()
+
+    def rebuild_summary(self):
+        summary = empty_summary()
+        for record in self.records():
+            add_to_summary(summary, record)
+        self._save_summary(summary)
+        return summary
+
+    def _save_summary(self, summary):
+        tmp_path = '{}.{}'.format(self.summary_path, os.getpid())
+        with open(tmp_path, 'w') as fh:
+            json.dump(summary, fh)
+        os.replace(tmp_path, self.summary_path)
+
+    def _truncate_partial_line(self):
+        if not os.path.isfile(self.history_path):
+            return
+        with open(self.history_path, 'rb+') as fh:
+            fh.seek(0, os.SEEK_END)
+            size = fh.tell()
+            if size == 0:
+                return
+            fh.seek(-1, os.SEEK_END)
+            if fh.read(1) == b'\n':
+                return
+            # Scan back to the last complete line.
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                fh.seek(position - step)
+                chunk = fh.read(step)
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    fh.truncate(position - step + newline + 1)
+                    return
+                position -= step
+            fh.truncate(0)
+
+    def append(self, submissions):
+        """Record submissions that are new or changed status. Returns how many lines were appended."""
+        lock = self._lock()
+        try:
+            self._truncate_partial_line()
+            summary = self.summary()
+            lines = []
+            for submission in submissions:
+                if not submission:
+                    continue
+                key = submission_key(submission)
+                if summary['index'].get(key, '') == submission.get('LeaderboardSubmissionStatusType'):
+                    continue
+                lines.append(json.dumps(submission, default=str, sort_keys=True) + '\n')
+                add_to_summary(summary, submission)
+            if lines:
+                with open(self.history_path, 'a') as fh:
+                    fh.write(''.join(lines))
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                self._save_summary(summary)
+            return len(lines)
+        finally:
+            lock.close()
+
+    def migrate(self):
+        """One-time import of a summary.pkl written by older versions. Returns records imported or None."""
+        pkl_f = os.path.join(self.directory, LEGACY_PICKLE)
+        if not os.path.isfile(pkl_f):
+            return None
+        with open(pkl_f, 'rb') as fh:
+            submissions = pickle.load(fh).get('LeaderboardSubmissions', [])
+        submissions = [s for s in submissions if s and 'SubmissionTime' in s]
+        submissions.sort(key=lambda s: s['SubmissionTime'])
+        count = self.append(submissions)
+        os.replace(pkl_f, pkl_f + '.migrated')
+        return count
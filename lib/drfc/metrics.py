@@ -0,0 +1,196 @@
+"""Incremental reading and aggregation of simapp metrics JSON files.
+
+The simapp rewrites TrainingMetrics.json after every episode as
+{"metrics": [entry, ...], "version": ..., "best_model_metric": ...}, only
+ever appending entries. MetricsTail remembers the ETag and the byte offset
+after the last parsed entry, so an unchanged file costs one 304 response
+and a changed one a ranged GET of the new tail.
+"""
+
+import json
+
+# Bytes before the saved offset that are fetched again to check that the
+# document was appended to rather than replaced.
+OVERLAP = 64
+
+LAP_COMPLETE = 'Lap complete'
+UNCHANGED = 'unchanged'
+
+_decoder = json.JSONDecoder()
+
+
+def _error_code(error):
+    return str(error.response.get('Error', {}).get('Code'))
+
+
+def scan_entries(text, pos):
+    """Parse metric entries from text starting inside the metrics array.
+
+    Returns (entries, end) where end is the position after the last complete
+    entry; end is None when the text is not a continuation of the array.
+    """
+    entries = []
+    end = pos
+    length = len(text)
+    while True:
+        while pos < length and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= length or text[pos] == ']':
+            return entries, end
+        if text[pos] != '{':
+            return [], None
+        try:
+            entry, pos = _decoder.raw_decode(text, pos)
+        except ValueError:
+            # Truncated entry, e.g. a short ranged read; stop before it.
+            return entries, end
+        entries.append(entry)
+        end = pos
+
+
+def conditional_get(s3_client, bucket, key, etag=None, **kwargs):
+    """(body, etag) of an object unless it still has `etag`.
+
+    Returns 'unchanged' on a 304, None if the object does not exist and
+    False if a requested range is past its end.
+    """
+    from botocore.exceptions import ClientError
+
+    if etag is not None:
+        kwargs['IfNoneMatch'] = etag
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key, **kwargs)
+    except ClientError as e:
+        code = _error_code(e)
+        if code in ('304', 'NotModified'):
+            return UNCHANGED
+        if code in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        if code in ('416', 'InvalidRange'):
+            return False
+        raise
+    return response['Body'].read(), response['ETag']
+
+
+class MetricsTail:
+
+    def __init__(self, s3_client, bucket, key):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.etag = None
+        self.offset = None
+        self.overlap = b''
+        self.count = 0
+
+    def _get(self, **kwargs):
+        result = conditional_get(self.s3_client, self.bucket, self.key, self.etag, **kwargs)
+        if result is None:
+            self.etag = None
+        return result
+
+    def poll(self):
+        """New entries since the last poll, and whether the file was replaced (all entries returned)."""
+        if self.offset is not None:
+            start = max(self.offset - OVERLAP, 0)
+            result = self._get(Range='bytes={}-'.format(start))
+            if result == UNCHANGED or result is None:
+                return [], False
+            if result is not False:
+                body, etag = result
+                overlap = body[:self.offset - start]
+                if overlap == self.overlap:
+                    text = body[self.offset - start:].decode('utf-8')
+                    entries, end = scan_entries(text, 0)
+                    if end is not None:
+                        self._advance(etag, self.offset + len(text[:end].encode('utf-8')), body, start)
+                        self.count += len(entries)
+                        return entries, False
+            # Shrunk or rewritten: read it again from the start.
+            self.etag = None
+        result = self._get()
+        if result == UNCHANGED or not result:
+            return [], False
+        body, etag = result
+        text = body.decode('utf-8')
+        marker = text.find('"metrics"')
+        bracket = text.find('[', marker) if marker >= 0 else -1
+        if bracket < 0:
+            return [], False
+        entries, end = scan_entries(text, bracket + 1)
+        if end is None:
+            end = bracket + 1
+        self._advance(etag, len(text[:end].encode('utf-8')), body, 0)
+        replaced = self.count > 0
+        self.count = len(entries)
+        return entries, replaced
+
+    def _advance(self, etag, offset, body, body_start):
+        self.etag = etag
+        self.offset = offset
+        self.overlap = body[max(offset - OVERLAP, 0) - body_start:offset - body_start]
+
+
+class TrialStats:
+    __slots__ = ('episodes', 'progress', 'reward', 'completed', 'lap_time', 'best_lap')
+
+    def __init__(self):
+        self.episodes = 0
+        self.progress = 0.0
+        self.reward = 0.0
+        self.completed = 0
+        self.lap_time = 0.0
+        self.best_lap = None
+
+    def add(self, entry):
+        self.episodes += 1
+        self.progress += float(entry.get('completion_percentage', 0) or 0)
+        self.reward += float(entry.get('reward_score', 0) or 0)
+        if entry.get('episode_status') == LAP_COMPLETE:
+            self.completed += 1
+            lap = float(entry.get('elapsed_time_in_milliseconds', 0) or 0) / 1000
+            self.lap_time += lap
+            if self.best_lap is None or lap < self.best_lap:
+                self.best_lap = lap
+
+    def fields(self):
+        return {
+            'episodes': self.episodes,
+            'progress_mean': self.progress / self.episodes,
+            'reward_mean': self.reward / self.episodes,
+            'completion_rate': self.completed / self.episodes,
+            'lap_time_mean': self.lap_time / self.completed if self.completed else None,
+            'best_lap_time': self.best_lap,
+        }
+
+
+class Aggregates:
+    """Per (phase, trial) statistics and the best evaluation by BEST_MODEL_METRIC ('progress' or 'reward')."""
+
+    def __init__(self, best_metric='progress'):
+        self.best_metric = best_metric
+        self.trials = {}
+        self.best = None
+
+    def add(self, entries):
+        """Add entries; returns the (phase, trial) keys they touched, in order."""
+        touched = []
+        for entry in entries:
+            key = (entry.get('phase', 'training'), int(entry.get('trial', 0) or 0))
+            self.trials.setdefault(key, TrialStats()).add(entry)
+            if key not in touched:
+                touched.append(key)
+        if any(phase == 'evaluation' for phase, _ in touched):
+            # Means move as episodes arrive, so the best is taken over the current means of all evaluations.
+            self.best = None
+            for (phase, trial), stats in self.trials.items():
+                if phase == 'evaluation':
+                    value = self.evaluation_score(stats)
+                    if self.best is None or value > self.best[1]:
+                        self.best = (trial, value)
+        return touched
+
+    def evaluation_score(self, stats):
+        if self.best_metric == 'reward':
+            return stats.reward / stats.episodes
+        return stats.progress / stats.episodes
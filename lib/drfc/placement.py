@@ -0,0 +1,279 @@
+"""CPU and memory placement of Robomaker and Sagemaker containers.
+
+A Topology lists the physical cores (as tuples of their hyperthread CPUs)
+and memory of every NUMA node. Placements are handed out in whole cores
+from a single node where possible, so a Gazebo instance keeps its threads
+on cores sharing a cache and its memory local. Plans of the runs already
+active are kept as they are and only the remaining cores are handed out,
+so starting another DR_RUN_ID never moves the containers of a running one.
+"""
+
+import collections
+import glob
+import math
+import os
+import re
+
+Node = collections.namedtuple('Node', ['id', 'cores', 'memory_mb'])
+Assignment = collections.namedtuple('Assignment', ['run_id', 'role', 'replica', 'cpus', 'mems', 'memory_mb'])
+
+
+# How memory_mb is applied: as a reservation the kernel reclaims down to under
+# pressure, as a hard limit (OOM kill beyond it), or not at all.
+MEMORY_MODES = ('soft', 'hard', 'none')
+
+
+class PlacementError(Exception):
+    pass
+
+
+def parse_cpulist(text):
+    """[0, 1, 2, 3, 8] for the kernel's cpulist format '0-3,8'."""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def format_cpulist(cpus):
+    """'0-3,8' for [0, 1, 2, 3, 8]; the format of docker's --cpuset-cpus."""
+    parts = []
+    for cpu in sorted(set(cpus)):
+        if parts and parts[-1][1] == cpu - 1:
+            parts[-1][1] = cpu
+        else:
+            parts.append([cpu, cpu])
+    return ','.join(str(a) if a == b else '{}-{}'.format(a, b) for a, b in parts)
+
+
+class Topology:
+
+    def __init__(self, nodes):
+        self.nodes = sorted(nodes, key=lambda n: n.id)
+
+    @property
+    def cpus(self):
+        return sum(len(core) for node in self.nodes for core in node.cores)
+
+    def describe(self):
+        threads = max((len(core) for node in self.nodes for core in node.cores), default=1)
+        return '{} NUMA node(s), {} cores, {} CPUs ({} per core), {:.1f} GB'.format(
+            len(self.nodes), sum(len(n.cores) for n in self.nodes), self.cpus, threads,
+            sum(n.memory_mb for n in self.nodes) / 1024)
+
+
+def _read(path):
+    with open(path, 'r') as fh:
+        return fh.read()
+
+
+def read_topology(sysfs='/sys/devices/system'):
+    """Topology of this host from sysfs; a single node of os.cpu_count() cores where that is not available."""
+    nodes = []
+    for path in sorted(glob.glob(os.path.join(sysfs, 'node', 'node[0-9]*'))):
+        node_id = int(re.search(r'(\d+)$', path).group(1))
+        try:
+            cpus = parse_cpulist(_read(os.path.join(path, 'cpulist')))
+            memory = re.search(r'MemTotal:\s+(\d+)', _read(os.path.join(path, 'meminfo')))
+        except OSError:
+            continue
+        if not cpus:
+            # Memory-only nodes (e.g. CXL) have nothing to run containers on.
+            continue
+        nodes.append(Node(node_id, _cores(sysfs, cpus), int(memory.group(1)) // 1024 if memory else 0))
+    if nodes:
+        return Topology(nodes)
+
+    cpus = list(range(os.cpu_count() or 1))
+    memory_mb = 0
+    try:
+        memory = re.search(r'MemTotal:\s+(\d+)', _read('/proc/meminfo'))
+        memory_mb = int(memory.group(1)) // 1024 if memory else 0
+    except OSError:
+        pass
+    return Topology([Node(0, _cores(sysfs, cpus), memory_mb)])
+
+
+def _cores(sysfs, cpus):
+    cores = []
+    seen = set()
+    for cpu in cpus:
+        if cpu in seen:
+            continue
+        try:
+            siblings = parse_cpulist(_read(os.path.join(sysfs, 'cpu', 'cpu{}'.format(cpu), 'topology',
+                                                        'thread_siblings_list')))
+        except OSError:
+            siblings = [cpu]
+        core = tuple(c for c in siblings if c in cpus) or (cpu,)
+        seen.update(core)
+        cores.append(core)
+    return cores
+
+
+def synthetic_topology(spec):
+    """Topology for 'NODESxCORESxTHREADS[:MEMORY_GB]', e.g. '2x16x2:256'; CPUs are numbered like Linux does."""
+    match = re.match(r'^(\d+)x(\d+)(?:x(\d+))?(?::(\d+(?:\.\d+)?))?$', spec.strip())
+    if not match:
+        raise ValueError('topology must look like 2x16x2:256, not {}'.format(spec))
+    count, per_node, threads = int(match.group(1)), int(match.group(2)), int(match.group(3) or 1)
+    memory_mb = int(float(match.group(4) or 16 * count) * 1024) // count
+    total = count * per_node
+    nodes = []
+    for node in range(count):
+        # Linux numbers the first thread of every core first, then the siblings.
+        cores = [tuple(core + thread * total for thread in range(threads))
+                 for core in range(node * per_node, (node + 1) * per_node)]
+        nodes.append(Node(node, cores, memory_mb))
+    return Topology(nodes)
+
+
+class Planner:
+    """Hands out whole cores of a Topology, skipping those of `existing` assignments.
+
+    Memory limits are the node's memory, less `memory_reserve` for the host,
+    in proportion to the cores handed out.
+    """
+
+    def __init__(self, topology, existing=(), reserved_cores=1, memory_reserve=0.1):
+        self.nodes = {node.id: node for node in topology.nodes}
+        self.memory_reserve = memory_reserve
+        used = set(cpu for a in existing for cpu in a.cpus)
+        self.free = {}
+        for index, node in enumerate(topology.nodes):
+            cores = [core for core in node.cores if not used.intersection(core)]
+            if index == 0:
+                # The first cores of node 0 take interrupts and the host's own work.
+                cores = [core for core in cores if core not in node.cores[:reserved_cores]]
+            self.free[node.id] = cores
+
+    def _cores_for(self, node_id, cpus):
+        cores = self.free[node_id]
+        return math.ceil(cpus / (len(cores[0]) if cores else 1))
+
+    def take(self, run_id, role, replica, cpus, prefer=None):
+        """Assignment of `cpus` CPUs, rounded up to whole cores, for one container."""
+        fitting = [n for n in self.free if self.free[n] and len(self.free[n]) >= self._cores_for(n, cpus)]
+        if fitting:
+            # Stay on the node the run already uses if it fits, else take the emptiest node.
+            node_ids = [prefer] if prefer in fitting else [max(fitting, key=lambda n: (len(self.free[n]), -n))]
+        else:
+            node_ids = sorted((n for n in self.free if self.free[n]), key=lambda n: (-len(self.free[n]), n))
+        picked = {}
+        remaining = cpus
+        for node_id in node_ids:
+            if remaining <= 0:
+                break
+            needed = self._cores_for(node_id, remaining)
+            picked[node_id], self.free[node_id] = self.free[node_id][:needed], self.free[node_id][needed:]
+            remaining -= sum(len(core) for core in picked[node_id])
+        if remaining > 0:
+            raise PlacementError('not enough free cores for {} of run {} ({} CPUs)'.format(
+                role if replica is None else '{} {}'.format(role, replica), run_id, cpus))
+        memory_mb = sum(self.nodes[n].memory_mb * (1 - self.memory_reserve) * len(cores) / len(self.nodes[n].cores)
+                        for n, cores in picked.items())
+        return Assignment(run_id, role, replica, sorted(cpu for cores in picked.values() for core in cores
+                                                        for cpu in core), sorted(picked), int(memory_mb))
+
+
+def plan_run(planner, run_id, workers, robomaker_cpus=2, sagemaker_cpus=4):
+    """Assignments for the Sagemaker and the Robomaker replicas 1..workers of one run."""
+    sagemaker = planner.take(run_id, 'sagemaker', None, sagemaker_cpus)
+    assignments = [sagemaker]
+    prefer = sagemaker.mems[0]
+    for replica in range(1, workers + 1):
+        assignment = planner.take(run_id, 'robomaker', replica, robomaker_cpus, prefer=prefer)
+        prefer = assignment.mems[0]
+        assignments.append(assignment)
+    return assignments
+
+
+def to_dict(assignment):
+    return dict(assignment._asdict(), cpus=format_cpulist(assignment.cpus))
+
+
+def from_dict(data):
+    return Assignment(data['run_id'], data['role'], data.get('replica'), parse_cpulist(data['cpus']),
+                      list(data['mems']), data.get('memory_mb'))
+
+
+def union(assignments):
+    """(cpus, mems, memory_mb) covering all given assignments, e.g. for a compose service with replicas."""
+    cpus = sorted(set(cpu for a in assignments for cpu in a.cpus))
+    mems = sorted(set(node for a in assignments for node in a.mems))
+    return cpus, mems, sum(a.memory_mb or 0 for a in assignments)
+
+
+def compose_override(assignments, memory='soft'):
+    """Compose override text pinning the Robomaker service of one run.
+
+    The replicas of a compose service share one definition, so it gets the
+    union of their cpusets and the largest of their memory shares; the
+    per-replica cpusets are applied with docker update once they run.
+    """
+    robomakers = [a for a in assignments if a.role == 'robomaker']
+    if not robomakers:
+        return None
+    cpus, _, _ = union(robomakers)
+    lines = ["version: '3.7'", '', 'services:', '  robomaker:', '    cpuset: "{}"'.format(format_cpulist(cpus))]
+    memory_mb = max(a.memory_mb or 0 for a in robomakers)
+    if memory_mb and memory != 'none':
+        lines.append('    {}: {}m'.format('mem_limit' if memory == 'hard' else 'mem_reservation', memory_mb))
+    return '\n'.join(lines) + '\n'
+
+
+def swarm_override(cpus, memory_mb, max_replicas_per_node=None, excluded_nodes=(), memory='soft'):
+    """Compose override text reserving CPU and memory per Robomaker replica.
+
+    Swarm services cannot be pinned to cpusets; with reservations the
+    scheduler only places a replica on a node with that much unreserved.
+    The replicas of one service cannot be assigned to nodes individually:
+    max_replicas_per_node is only a cap per node, and excluded_nodes
+    (those given no replicas) are kept out by hostname constraints. CPUs
+    are also limited; memory only with memory='hard'.
+    """
+    lines = ["version: '3.8'", '', 'services:', '  robomaker:', '    deploy:']
+    if max_replicas_per_node or excluded_nodes:
+        lines += ['      placement:']
+    if excluded_nodes:
+        # Appended to the Robomaker label constraint of the base file.
+        lines += ['        constraints:']
+        lines += ['          - node.hostname != {}'.format(host) for host in sorted(excluded_nodes)]
+    if max_replicas_per_node:
+        lines += ['        max_replicas_per_node: {}'.format(max_replicas_per_node)]
+    lines += ['      resources:']
+    for kind in ('reservations', 'limits'):
+        lines += ['        {}:'.format(kind), "          cpus: '{}'".format(cpus)]
+        if memory_mb and (memory == 'hard' or (memory == 'soft' and kind == 'reservations')):
+            lines += ['          memory: {}M'.format(memory_mb)]
+    return '\n'.join(lines) + '\n'
+
+
+def spread_replicas(capacities, workers):
+    """{node: replicas}, each replica going to the node with the largest share of its capacity left.
+
+    capacities is {node: replicas the node can still take}; larger nodes get
+    proportionally more replicas rather than all of them.
+    """
+    spread = {node: 0 for node in capacities}
+    for _ in range(workers):
+        open_nodes = [n for n in capacities if capacities[n] - spread[n] > 0]
+        if not open_nodes:
+            raise PlacementError('the labelled nodes have room for {} of {} Robomaker replicas'.format(
+                sum(spread.values()), workers))
+        node = max(open_nodes, key=lambda n: ((capacities[n] - spread[n]) / capacities[n], capacities[n]))
+        spread[node] += 1
+    return spread
+
+
+def docker_update_args(assignment, memory='soft'):
+    args = ['--cpuset-cpus', format_cpulist(assignment.cpus), '--cpuset-mems', format_cpulist(assignment.mems)]
+    if assignment.memory_mb and memory == 'soft':
+        args += ['--memory-reservation', '{}m'.format(assignment.memory_mb)]
+    elif assignment.memory_mb and memory == 'hard':
+        # memory-swap must be raised along with memory, or docker refuses the update.
+        args += ['--memory', '{}m'.format(assignment.memory_mb), '--memory-swap', '{}m'.format(assignment.memory_mb)]
+    return args
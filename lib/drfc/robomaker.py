@@ -0,0 +1,200 @@
+"""Robomaker containers and the output of `gz stats` inside them.
+
+Containers are recognised by name the way dr-find-robomaker does it:
+deepracer-<run>_robomaker.<replica>.<task> for swarm and
+deepracer-<run>-robomaker-<replica> for compose, with deepracer-eval-<run>
+for evaluation stacks.
+"""
+
+import collections
+import re
+import subprocess
+import threading
+import time
+
+NAME_RE = re.compile(r'^deepracer(-eval)?-(\d+)(?:_robomaker\.(\d+)\.|-robomaker-(\d+)$)')
+
+# gz stats prints e.g. "Factor[0.98] SimTime[12.34] RealTime[12.59] Paused[F]".
+STATS_RE = re.compile(r'Factor\[([-0-9.eE+]+)\]\s*SimTime\[([-0-9.eE+]+)\]\s*RealTime\[([-0-9.eE+]+)\]'
+                      r'(?:\s*Paused\[([TF])\])?')
+
+# A gz stats stream that ended while its container still runs (Gazebo not
+# up yet) is restarted after this many seconds.
+RESTART_DELAY = 10
+
+Container = collections.namedtuple('Container', ['id', 'name', 'stack', 'run_id', 'replica'])
+Sample = collections.namedtuple('Sample', ['time', 'factor', 'sim_time', 'real_time', 'paused'])
+
+
+def parse_container(container_id, name):
+    """Container for a robomaker container name, or None for any other container."""
+    match = NAME_RE.match(name)
+    if not match:
+        return None
+    stack = 'evaluation' if match.group(1) else 'training'
+    return Container(container_id, name, stack, int(match.group(2)), int(match.group(3) or match.group(4)))
+
+
+def parse_stats(line, now):
+    """Sample for a line of gz stats output, or None for headers and noise."""
+    match = STATS_RE.search(line)
+    if not match:
+        return None
+    try:
+        factor, sim_time, real_time = (float(v) for v in match.group(1, 2, 3))
+    except ValueError:
+        return None
+    return Sample(now, factor, sim_time, real_time, match.group(4) == 'T')
+
+
+class RollingStats:
+    """Samples of one container over the last `window` seconds."""
+
+    def __init__(self, window=60.0):
+        self.window = window
+        self.samples = collections.deque()
+        self.count = 0
+
+    def clear(self):
+        self.samples.clear()
+
+    def add(self, sample):
+        self.samples.append(sample)
+        self.count += 1
+        self._expire(sample.time)
+
+    def _expire(self, now):
+        while self.samples and self.samples[0].time < now - self.window:
+            self.samples.popleft()
+
+    @property
+    def last(self):
+        return self.samples[-1] if self.samples else None
+
+    def fields(self, now):
+        """Aggregates for the window ending at now; None once no sample arrived within it."""
+        self._expire(now)
+        if not self.samples:
+            return None
+        factors = sorted(s.factor for s in self.samples)
+        first, last = self.samples[0], self.samples[-1]
+        real = last.real_time - first.real_time
+        sim = last.sim_time - first.sim_time
+        return {
+            'rtf': last.factor,
+            'rtf_mean': sum(factors) / len(factors),
+            'rtf_min': factors[0],
+            'rtf_p10': factors[int(0.1 * (len(factors) - 1))],
+            'rtf_max': factors[-1],
+            # Measured over the window, so unaffected by how gz stats smooths its factor.
+            'sim_real_ratio': sim / real if real > 0 and sim >= 0 else None,
+            'sim_time': last.sim_time,
+            'real_time': last.real_time,
+            'paused': last.paused,
+            'samples': len(self.samples),
+        }
+
+
+class DockerStream:
+
+    def __init__(self, container):
+        # -t without -i: a pseudo-tty keeps gz stats line-buffered, nothing is read from us.
+        self.process = subprocess.Popen(['docker', 'exec', '-t', container.id, 'bash', '-c', 'gz stats'],
+                                        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, universal_newlines=True)
+
+    def lines(self):
+        return iter(self.process.stdout.readline, '')
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class DockerBackend:
+    """Running Robomaker containers and their stats streams; other backends provide the same two methods."""
+
+    def containers(self):
+        result = subprocess.run(['docker', 'ps', '--format', '{{.ID}}\t{{.Names}}'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        found = []
+        for line in result.stdout.splitlines():
+            container_id, _, name = line.partition('\t')
+            container = parse_container(container_id, name)
+            if container is not None:
+                found.append(container)
+        return found
+
+    def stream(self, container):
+        return DockerStream(container)
+
+
+class Reader(threading.Thread):
+    """Follows the stats stream of one container into its RollingStats."""
+
+    def __init__(self, backend, container, stats, lock):
+        super().__init__(daemon=True)
+        self.container = container
+        self.stats = stats
+        self.lock = lock
+        self.stream = backend.stream(container)
+        self.started_at = time.time()
+
+    def run(self):
+        try:
+            for line in self.stream.lines():
+                sample = parse_stats(line, time.time())
+                if sample is not None:
+                    with self.lock:
+                        self.stats.add(sample)
+        finally:
+            self.stream.close()
+
+
+class Sampler:
+    """A Reader per container, started for new containers and restarted for ended streams."""
+
+    def __init__(self, backend, window):
+        self.backend = backend
+        self.window = window
+        self.lock = threading.Lock()
+        self.readers = {}
+
+    def update(self, containers, now=None):
+        now = time.time() if now is None else now
+        running = {c.id: c for c in containers}
+        for container_id in list(self.readers):
+            if container_id not in running:
+                self.readers.pop(container_id).stream.close()
+        for container_id, container in running.items():
+            reader = self.readers.get(container_id)
+            if reader is None:
+                reader = Reader(self.backend, container, RollingStats(self.window), self.lock)
+            elif not reader.is_alive() and now - reader.started_at > RESTART_DELAY:
+                # Keeps the samples collected so far.
+                reader = Reader(self.backend, container, reader.stats, self.lock)
+            else:
+                continue
+            self.readers[container_id] = reader
+            reader.start()
+
+    def clear(self):
+        """Drops the samples collected so far, e.g. those of a warm-up."""
+        with self.lock:
+            for reader in self.readers.values():
+                reader.stats.clear()
+
+    def rows(self, now=None):
+        """(container, fields) per container in run, stack and replica order; fields is None without samples."""
+        now = time.time() if now is None else now
+        with self.lock:
+            rows = [(r.container, r.stats.fields(now)) for r in self.readers.values()]
+        return sorted(rows, key=lambda row: (row[0].run_id, row[0].stack, row[0].replica))
+
+    def close(self):
+        for reader in self.readers.values():
+            reader.stream.close()
@@ -0,0 +1,57 @@
+"""S3 client construction shared by the scripts.
+
+boto3 is imported on first use so that callers which never touch S3 (cache
+hits, dry runs) do not pay for it.
+"""
+
+import hashlib
+import io
+import os
+
+
+def local_session(env=os.environ):
+    import boto3
+
+    if env.get('DR_LOCAL_S3_AUTH_MODE', 'profile') == 'profile':
+        profile = env.get('DR_LOCAL_S3_PROFILE', 'default')
+    else:  # mode is 'role'
+        profile = None
+    return boto3.session.Session(profile_name=profile)
+
+
+def pool_config(max_pool_connections):
+    if max_pool_connections is None:
+        return None
+    from botocore.config import Config
+    return Config(max_pool_connections=max_pool_connections, retries={'max_attempts': 5, 'mode': 'standard'})
+
+
+def local_client(env=os.environ, session=None, max_pool_connections=None):
+    """Client for the local bucket; size the pool to the number of threads sharing it."""
+    if session is None:
+        session = local_session(env)
+    return session.client('s3', region_name=env.get('DR_AWS_APP_REGION', 'us-east-1'),
+                          endpoint_url=env.get('DR_LOCAL_S3_ENDPOINT_URL', None),
+                          config=pool_config(max_pool_connections))
+
+
+def upload_client(env=os.environ, max_pool_connections=None):
+    """Client for the AWS DeepRacer upload bucket (DR_UPLOAD_S3_PROFILE, no custom endpoint)."""
+    import boto3
+
+    if env.get('DR_LOCAL_S3_AUTH_MODE', 'profile') == 'profile' and env.get('DR_UPLOAD_S3_PROFILE'):
+        session = boto3.session.Session(profile_name=env['DR_UPLOAD_S3_PROFILE'])
+    else:
+        session = boto3.session.Session()
+    return session.client('s3', region_name=env.get('DR_AWS_APP_REGION', 'us-east-1'),
+                          config=pool_config(max_pool_connections))
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.md5(data).hexdigest()
+
+
+def upload_text(s3_client, bucket, key, text):
+    s3_client.upload_fileobj(io.BytesIO(text.encode('utf-8')), bucket, key)
@@ -0,0 +1,210 @@
+"""Loading simtrace CSVs and rebuilding reward function params from them.
+
+A simtrace row is one simulation step as logged by the simapp. Tables are
+kept as {column: numpy array} so that the params for millions of steps can
+be derived with array operations; per-step dicts are only built when a
+reward function has no batched entry point.
+"""
+
+import csv
+import io
+import os
+import re
+
+# Simtrace header columns and the dtype they are parsed as.
+COLUMNS = [
+    ('episode', int), ('steps', float), ('X', float), ('Y', float), ('yaw', float), ('steer', float),
+    ('throttle', float), ('action', str), ('reward', float), ('done', str), ('all_wheels_on_track', str),
+    ('progress', float), ('closest_waypoint', int), ('track_len', float), ('tstamp', float),
+    ('episode_status', str),
+]
+
+ITERATION_RE = re.compile(r'(\d+)-iteration\.csv$')
+
+
+def _bool(value):
+    return value.strip().lower() == 'true'
+
+
+def parse_csv(data, iteration=0):
+    """Columns of one simtrace CSV; unknown trailing columns are ignored."""
+    import numpy as np
+
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    reader = csv.reader(io.StringIO(data))
+    header = next(reader, None)
+    if header is None:
+        return None
+    positions = {name: i for i, name in enumerate(header)}
+    wanted = [(name, kind, positions[name]) for name, kind in COLUMNS if name in positions]
+    values = {name: [] for name, _, _ in wanted}
+    for row in reader:
+        if len(row) < len(header):
+            continue
+        for name, _, i in wanted:
+            values[name].append(row[i])
+
+    table = {}
+    for name, kind, _ in wanted:
+        if name in ('done', 'all_wheels_on_track'):
+            table[name] = np.array([_bool(v) for v in values[name]], dtype=bool)
+        elif kind is str:
+            table[name] = np.array(values[name], dtype=object)
+        else:
+            table[name] = np.array(values[name], dtype=float).astype(kind)
+    table['iteration'] = np.full(len(table['episode']), iteration, dtype=int)
+    return table
+
+
+def concat(tables):
+    import numpy as np
+
+    tables = [t for t in tables if t is not None and len(t['episode']) > 0]
+    if not tables:
+        return None
+    return {name: np.concatenate([t[name] for t in tables]) for name in tables[0]}
+
+
+def iteration_of(key):
+    match = ITERATION_RE.search(key)
+    return int(match.group(1)) if match else 0
+
+
+def load_files(paths):
+    tables = []
+    for path in paths:
+        with open(path, 'r') as fh:
+            tables.append(parse_csv(fh.read(), iteration_of(path)))
+    return concat(tables)
+
+
+def load_s3(s3_client, bucket, prefix, threads=16):
+    """All simtrace CSVs below prefix, fetched concurrently, in iteration order."""
+    from concurrent.futures import ThreadPoolExecutor
+    from drfc import transfer
+
+    keys = sorted((k for k in transfer.list_objects(s3_client, bucket, prefix) if k.endswith('.csv')),
+                  key=lambda k: (iteration_of(k), k))
+
+    def fetch(key):
+        return parse_csv(transfer.read_object(s3_client, bucket, key), iteration_of(key))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return concat(list(executor.map(fetch, keys)))
+
+
+def load_track(path):
+    """Track route .npy as {'center', 'inner', 'outer'} arrays of shape (n, 2)."""
+    import numpy as np
+
+    route = np.load(path)
+    return {'center': route[:, 0:2], 'inner': route[:, 2:4], 'outer': route[:, 4:6]}
+
+
+# Params build_params can only provide when given the track.
+TRACK_PARAMS = ('waypoints', 'closest_waypoints', 'distance_from_center', 'track_width', 'is_left_of_center')
+
+
+def build_params(table, track=None, is_reversed=False):
+    """Reward function params for every step, as {param: array}.
+
+    Geometry-dependent params (TRACK_PARAMS) need the track.
+    """
+    import numpy as np
+
+    n = len(table['episode'])
+    x = table['X']
+    y = table['Y']
+    status = table.get('episode_status', np.full(n, '', dtype=object))
+    params = {
+        'x': x,
+        'y': y,
+        'heading': table['yaw'],
+        'steering_angle': table['steer'],
+        'speed': table['throttle'],
+        'steps': table['steps'],
+        'progress': table['progress'],
+        'track_length': table['track_len'],
+        'all_wheels_on_track': table['all_wheels_on_track'],
+        'is_crashed': status == 'crashed',
+        'is_offtrack': status == 'off_track',
+        'is_reversed': np.full(n, is_reversed, dtype=bool),
+    }
+    if track is None:
+        return params
+
+    center = track['center']
+    count = len(center)
+    closest = table['closest_waypoint'] % count
+    # The pair of waypoints around the car: closest and the next one if the car is past it, else the previous.
+    ahead = center[(closest + 1) % count] - center[closest]
+    offset = np.stack([x, y], axis=1) - center[closest]
+    past = np.einsum('ij,ij->i', offset, ahead) >= 0
+    prev_wp = np.where(past, closest, (closest - 1) % count)
+    next_wp = (prev_wp + 1) % count
+
+    start = center[prev_wp]
+    segment = center[next_wp] - start
+    rel = np.stack([x, y], axis=1) - start
+    length_sq = np.maximum(np.einsum('ij,ij->i', segment, segment), 1e-12)
+    t = np.clip(np.einsum('ij,ij->i', rel, segment) / length_sq, 0.0, 1.0)
+    nearest = start + segment * t[:, None]
+    cross = segment[:, 0] * rel[:, 1] - segment[:, 1] * rel[:, 0]
+
+    params['waypoints'] = center
+    params['closest_waypoints'] = np.stack([prev_wp, next_wp], axis=1)
+    params['distance_from_center'] = np.linalg.norm(np.stack([x, y], axis=1) - nearest, axis=1)
+    params['track_width'] = np.linalg.norm(track['outer'][closest] - track['inner'][closest], axis=1)
+    params['is_left_of_center'] = cross > 0
+    if is_reversed:
+        params['is_left_of_center'] = ~params['is_left_of_center']
+    return params
+
+
+def step_params(params, i, waypoints=None):
+    """Plain-Python params dict for step i, as a reward function receives it."""
+    step = {}
+    for name, values in params.items():
+        if name == 'waypoints':
+            continue
+        value = values[i]
+        if name == 'closest_waypoints':
+            step[name] = [int(value[0]), int(value[1])]
+        elif values.dtype == bool:
+            step[name] = bool(value)
+        else:
+            step[name] = float(value)
+    if waypoints is not None:
+        step['waypoints'] = waypoints
+    step['objects_location'] = []
+    step['objects_left_of_center'] = []
+    step['objects_speed'] = []
+    step['objects_heading'] = []
+    step['objects_distance'] = []
+    step['closest_objects'] = [0, 0]
+    return step
+
+
+def episode_slices(table):
+    """(iteration, episode) -> slice of consecutive rows; tables are in log order."""
+    import numpy as np
+
+    keys = table['iteration'].astype(np.int64) * 1000000 + table['episode']
+    boundaries = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(keys)]])
+    return [((int(table['iteration'][s]), int(table['episode'][s])), slice(s, e)) for s, e in zip(starts, ends)]
+
+
+def load_reward_module(path):
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location('replayed_reward_{}'.format(abs(hash(path))), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def default_reward_file(env=os.environ):
+    return os.path.join(env.get('DR_DIR', '.'), 'custom_files', 'reward_function.py')
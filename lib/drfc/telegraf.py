@@ -0,0 +1,82 @@
+"""InfluxDB line protocol over UDP to the telegraf of the metrics stack.
+
+The stack publishes telegraf's UDP listener on 127.0.0.1:8092, so host-side
+tools send there; DR_TELEGRAF_HOST names the container as seen from the
+sagemaker-local network and is only used when it resolves.
+"""
+
+import os
+import socket
+import time
+
+
+def escape(value):
+    value = str(value) or 'none'
+    return value.replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+
+def _field(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return '{}i'.format(value)
+    if isinstance(value, float):
+        return repr(value)
+    return '"{}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def line(measurement, tags, fields, timestamp=None):
+    """One line; fields that are None are left out. timestamp is in seconds."""
+    tag_part = ''.join(',{}={}'.format(escape(k), escape(v)) for k, v in sorted(tags.items()) if v is not None)
+    field_part = ','.join('{}={}'.format(escape(k), _field(v)) for k, v in fields.items() if v is not None)
+    if not field_part:
+        return None
+    ns = int((time.time() if timestamp is None else timestamp) * 1e9)
+    return '{}{} {} {}'.format(escape(measurement), tag_part, field_part, ns)
+
+
+class Sender:
+    """Fire-and-forget UDP sender; lines are packed into datagrams of at most `payload` bytes."""
+
+    def __init__(self, host=None, port=None, payload=1400, env=os.environ):
+        self.address = None
+        self.payload = payload
+        self.socket = None
+        port = int(port or env.get('DR_TELEGRAF_PORT') or 8092)
+        for candidate in ([host] if host else [env.get('DR_TELEGRAF_HOST'), '127.0.0.1']):
+            if not candidate:
+                continue
+            try:
+                self.address = (socket.gethostbyname(candidate), port)
+                break
+            except OSError:
+                continue
+        if self.address is not None:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.setblocking(False)
+
+    @property
+    def enabled(self):
+        return self.socket is not None
+
+    def send(self, lines):
+        if self.socket is None:
+            return
+        batch = b''
+        for text in lines:
+            if text is None:
+                continue
+            data = text.encode('utf-8') + b'\n'
+            if batch and len(batch) + len(data) > self.payload:
+                self._send(batch)
+                batch = b''
+            batch += data
+        if batch:
+            self._send(batch)
+
+    def _send(self, data):
+        try:
+            self.socket.sendto(data, self.address)
+        except OSError:
+            # Metrics must never hold up the caller.
+            pass
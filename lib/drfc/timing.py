@@ -0,0 +1,63 @@
+"""Wall-clock timing of named phases in a script.
+
+Set DR_TIMING=True to get a per-phase report on stderr; stdout is left alone
+because the shell scripts capture it. When started from a script using
+bin/timing.sh, the phases are also appended to its JSON trace
+($DR_TIMING_TRACE).
+"""
+
+import contextlib
+import json
+import os
+import sys
+import time
+
+
+def last_pid():
+    """Most recently assigned PID on the machine, or None where /proc/loadavg is not available."""
+    try:
+        with open('/proc/loadavg', 'r') as fh:
+            return int(fh.read().split()[4])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PhaseTimer:
+
+    def __init__(self, name, enabled=None):
+        self.name = name
+        if enabled is None:
+            enabled = os.environ.get('DR_TIMING', 'False').lower() in ('yes', 'true', 't', '1')
+        self.enabled = enabled
+        self.phases = []
+        self.start = time.perf_counter()
+        self.trace = os.environ.get('DR_TIMING_TRACE') if enabled else None
+        # The phase of the calling shell script this one runs in.
+        self.parent = os.environ.get('DR_TIMING_PHASE')
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        pid = last_pid() if self.trace else None
+        try:
+            yield
+        finally:
+            end_pid = last_pid() if pid is not None else None
+            processes = end_pid - pid if end_pid is not None and end_pid >= pid else None
+            self.phases.append((name, time.perf_counter() - start, start - self.start, processes))
+
+    def report(self, stream=sys.stderr):
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.start
+        for name, elapsed, _, _ in self.phases:
+            stream.write('{}: {:<24} {:8.1f} ms\n'.format(self.name, name, elapsed * 1000))
+        stream.write('{}: {:<24} {:8.1f} ms\n'.format(self.name, 'total', total * 1000))
+        if self.trace:
+            records = [{'script': self.name, 'phase': name, 'start_ms': round(offset * 1000),
+                        'ms': round(elapsed * 1000, 3), 'processes': processes, 'parent': self.parent}
+                       for name, elapsed, offset, processes in self.phases]
+            records.append({'script': self.name, 'phase': 'total', 'start_ms': 0, 'ms': round(total * 1000, 3),
+                            'parent': self.parent})
+            with open(self.trace, 'a') as fh:
+                fh.writelines(json.dumps(record) + '\n' for record in records)
@@ -0,0 +1,227 @@
+"""Object transfer primitives shared by the upload, download and clone tools.
+
+Everything works on boto3 clients passed in by the caller so the same code
+serves local MinIO, AWS and cross-endpoint transfers.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+# Objects at or above this size are copied with multipart UploadPartCopy.
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+
+
+def list_objects(s3_client, bucket, prefix):
+    """All objects below prefix as {key: {'ETag', 'Size', 'LastModified'}} from one paginated listing."""
+    objects = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            objects[obj['Key']] = {'ETag': obj['ETag'].strip('"'), 'Size': obj['Size'],
+                                   'LastModified': obj.get('LastModified')}
+    return objects
+
+
+def read_object(s3_client, bucket, key):
+    """Object body as bytes, or None if it does not exist."""
+    from botocore.exceptions import ClientError
+
+    try:
+        return s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def put_bytes(s3_client, bucket, key, data):
+    """Upload small in-memory content and return the resulting ETag."""
+    response = s3_client.put_object(Bucket=bucket, Key=key, Body=data)
+    return response['ETag'].strip('"')
+
+
+def stream_copy(source_client, source_bucket, source_key, target_client, target_bucket, target_key):
+    """Copy between endpoints by piping the GET body into a managed upload, without touching disk."""
+    body = source_client.get_object(Bucket=source_bucket, Key=source_key)['Body']
+    try:
+        target_client.upload_fileobj(body, target_bucket, target_key)
+    finally:
+        body.close()
+
+
+def server_copy(s3_client, source_bucket, source_key, target_bucket, target_key, size=None):
+    """Server-side copy; objects above MULTIPART_THRESHOLD use parallel UploadPartCopy."""
+    from boto3.s3.transfer import TransferConfig
+
+    source = {'Bucket': source_bucket, 'Key': source_key}
+    if size is not None and size < MULTIPART_THRESHOLD:
+        s3_client.copy_object(CopySource=source, Bucket=target_bucket, Key=target_key)
+    else:
+        s3_client.copy(source, target_bucket, target_key,
+                       Config=TransferConfig(multipart_threshold=MULTIPART_THRESHOLD,
+                                             multipart_chunksize=MULTIPART_THRESHOLD // 4))
+
+
+def delete_keys(s3_client, bucket, keys):
+    """Delete keys with batched DeleteObjects calls of up to 1000 keys. Returns the errors reported."""
+    errors = []
+    keys = list(keys)
+    for i in range(0, len(keys), 1000):
+        batch = [{'Key': k} for k in keys[i:i + 1000]]
+        response = s3_client.delete_objects(Bucket=bucket, Delete={'Objects': batch, 'Quiet': True})
+        errors.extend(response.get('Errors', []))
+    return errors
+
+
+class Manifest:
+    """Record of what was last written to a target prefix.
+
+    Maps target key to the hash of its source and the ETag the target got.
+    An object is unchanged when both still match, which also works when
+    source and target ETags are not comparable (different endpoints or
+    multipart part sizes).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.isfile(path):
+            try:
+                with open(path, 'r') as fh:
+                    self.entries = json.load(fh)
+            except (ValueError, OSError):
+                self.entries = {}
+
+    def unchanged(self, key, source_hash, target_objects):
+        entry = self.entries.get(key)
+        target = target_objects.get(key)
+        return (entry is not None and target is not None and entry.get('source') == source_hash
+                and entry.get('target') == target['ETag'])
+
+    def record(self, key, source_hash, target_etag):
+        self.entries[key] = {'source': source_hash, 'target': target_etag}
+
+    def forget(self, key):
+        self.entries.pop(key, None)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = '{}.{}'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as fh:
+            json.dump(self.entries, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def manifest_path(dr_dir, bucket, prefix):
+    name = '{}-{}.json'.format(bucket, prefix.strip('/').replace('/', '_'))
+    return os.path.join(dr_dir, 'tmp', 'upload-manifests', name)
+
+
+def multipart_etag(path, part_size):
+    digests = []
+    with open(path, 'rb') as fh:
+        while True:
+            chunk = fh.read(part_size)
+            if not chunk:
+                break
+            digests.append(hashlib.md5(chunk).digest())
+    if len(digests) == 1:
+        return hashlib.md5(digests[0]).hexdigest() + '-1'
+    return '{}-{}'.format(hashlib.md5(b''.join(digests)).hexdigest(), len(digests))
+
+
+def verify_etag(path, etag, size):
+    """Check a downloaded file against its S3 ETag.
+
+    Returns True when the MD5 (or multipart MD5 for a plausible part size)
+    matches, None when the part size of a multipart ETag cannot be
+    determined and only the size could be checked, False on mismatch.
+    """
+    if os.path.getsize(path) != size:
+        return False
+    if '-' not in etag:
+        digest = hashlib.md5()
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest() == etag
+
+    parts = int(etag.split('-', 1)[1])
+    mib = 1024 * 1024
+    candidates = {((size + parts - 1) // parts + mib - 1) // mib * mib, 8 * mib, 16 * mib, 5 * mib}
+    for part_size in sorted(candidates):
+        if (size + part_size - 1) // part_size == parts and multipart_etag(path, part_size) == etag:
+            return True
+    return None
+
+
+class DownloadJournal:
+    """Resume state for ranged downloads, persisted as JSON after every finished part.
+
+    entries: {key: {'etag', 'size', 'parts': [done part numbers], 'verified'}}
+    generated: {key: etag} of the files written locally instead of downloaded
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.generated = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r') as fh:
+                    data = json.load(fh)
+                if data.get('source') == source:
+                    self.entries = data.get('entries', {})
+                    self.generated = data.get('generated', {})
+            except (ValueError, OSError):
+                pass
+        self.source = source
+
+    def entry(self, key, etag, size):
+        """Journal entry for key; reset when the object changed since it was journaled."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry['etag'] != etag or entry['size'] != size:
+                entry = {'etag': etag, 'size': size, 'parts': [], 'verified': False}
+                self.entries[key] = entry
+            return entry
+
+    def part_done(self, key, part):
+        with self.lock:
+            self.entries[key]['parts'].append(part)
+            self._save()
+
+    def set_verified(self, key, verified):
+        with self.lock:
+            if verified:
+                self.entries[key]['verified'] = True
+            else:
+                self.entries.pop(key, None)
+            self._save()
+
+    def set_generated(self, generated):
+        with self.lock:
+            self.generated = dict(generated)
+            self._save()
+
+    def _save(self):
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as fh:
+            json.dump({'source': self.source, 'entries': self.entries, 'generated': self.generated}, fh)
+        os.replace(tmp_path, self.path)
+
+
+def download_part(s3_client, bucket, key, path, start, end):
+    """Fetch bytes [start, end] of key with a ranged GET and write them at the same offset of path."""
+    response = s3_client.get_object(Bucket=bucket, Key=key, Range='bytes={}-{}'.format(start, end))
+    body = response['Body']
+    with open(path, 'r+b') as fh:
+        fh.seek(start)
+        for chunk in iter(lambda: body.read(1024 * 1024), b''):
+            fh.write(chunk)
+    return end - start + 1
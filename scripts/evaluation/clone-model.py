@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import checkpoints
+from drfc import s3 as drs3
+from drfc import transfer
+
+THREADS = 16
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Clone a model into another prefix of the same bucket with '
+                                                 'server-side copies, keeping only the best and last checkpoints.')
+    parser.add_argument('--bucket', required=True)
+    parser.add_argument('--source-prefix', required=True)
+    parser.add_argument('--target-prefix', required=True)
+    parser.add_argument('--all', action='store_true', help='Copy every checkpoint, not just best and last.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.time()
+    bucket = args.bucket
+    src_prefix = args.source_prefix.strip('/')
+    tgt_prefix = args.target_prefix.strip('/')
+
+    client = drs3.local_client(max_pool_connections=THREADS)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        f_model = executor.submit(transfer.list_objects, client, bucket, src_prefix + '/model/')
+        f_ip = executor.submit(transfer.list_objects, client, bucket, src_prefix + '/ip/')
+        f_index = executor.submit(transfer.read_object, client, bucket,
+                                  '{}/model/{}'.format(src_prefix, checkpoints.CHECKPOINT_INDEX))
+    objects = f_model.result()
+    if not objects:
+        print("No model found in s3://{}/{}/model. Exiting.".format(bucket, src_prefix))
+        sys.exit(1)
+
+    if not args.all and f_index.result() is not None:
+        keep = checkpoints.referenced_numbers(checkpoints.parse_index(f_index.result()))
+        objects = {k: v for k, v in objects.items() if checkpoints.checkpoint_number(k) in keep | {None}}
+    objects.update(f_ip.result())
+
+    def copy(key):
+        target_key = tgt_prefix + key[len(src_prefix):]
+        transfer.server_copy(client, bucket, key, bucket, target_key, objects[key]['Size'])
+        return objects[key]['Size']
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        copied = sum(executor.map(copy, objects))
+
+    print("Cloned {} objects ({:.1f} MB) to s3://{}/{} in {:.1f}s.".format(
+        len(objects), copied / 1024 / 1024, bucket, tgt_prefix, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ source $DR_DIR/bin/scripts_wrapper.sh
 usage() {
   echo "Usage: $0 [-q] [-c]"
   echo "       -q        Quiet - does not start log tracing."
-  echo "       -c        Clone - copies model into new prefix before evaluating."
+  echo "       -c        Clone - copies model (best and last checkpoint) into new prefix before evaluating."
   exit 1
 }
 
@@ -56,8 +56,8 @@ echo ""
 # clone if required
 if [ -n "$OPT_CLONE" ]; then
   echo "Cloning model into s3://$DR_LOCAL_S3_BUCKET/${DR_LOCAL_S3_MODEL_PREFIX}-E"
-  aws $DR_LOCAL_PROFILE_ENDPOINT_URL s3 sync s3://$DR_LOCAL_S3_BUCKET/$DR_LOCAL_S3_MODEL_PREFIX/model s3://$DR_LOCAL_S3_BUCKET/${DR_LOCAL_S3_MODEL_PREFIX}-E/model
-  aws $DR_LOCAL_PROFILE_ENDPOINT_URL s3 sync s3://$DR_LOCAL_S3_BUCKET/$DR_LOCAL_S3_MODEL_PREFIX/ip s3://$DR_LOCAL_S3_BUCKET/${DR_LOCAL_S3_MODEL_PREFIX}-E/ip
+  python3 $DR_DIR/scripts/evaluation/clone-model.py --bucket $DR_LOCAL_S3_BUCKET \
+    --source-prefix $DR_LOCAL_S3_MODEL_PREFIX --target-prefix ${DR_LOCAL_S3_MODEL_PREFIX}-E || exit 1
   export DR_LOCAL_S3_MODEL_PREFIX=${DR_LOCAL_S3_MODEL_PREFIX}-E
 fi
 
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import columnar
+from drfc import s3 as drs3
+from drfc import simtrace
+from drfc import transfer
+
+STATE_FILE = '_compact_state.json'
+# Objects modified this long before the watermark are listed again, in case an
+# upload that started earlier finished after the last run.
+GRACE = datetime.timedelta(minutes=10)
+
+
+def parse_args():
+    prefix = os.environ.get('DR_LOCAL_S3_MODEL_PREFIX')
+    parser = argparse.ArgumentParser(description='Merge the simtrace CSVs and metrics JSON files of a model into '
+                                                 'a Parquet dataset with an episode index.')
+    parser.add_argument('-p', '--prefix', default=prefix, help='Model prefix (default: DR_LOCAL_S3_MODEL_PREFIX).')
+    parser.add_argument('-b', '--bucket', default=os.environ.get('DR_LOCAL_S3_BUCKET'))
+    parser.add_argument('-m', '--metrics-prefix', default=os.environ.get('DR_LOCAL_S3_METRICS_PREFIX'),
+                        help='Metrics prefix (default: DR_LOCAL_S3_METRICS_PREFIX).')
+    parser.add_argument('-o', '--output',
+                        help='Dataset directory (default: data/analysis/<prefix>, /workspace/analysis in log-analysis).')
+    parser.add_argument('-u', '--upload', action='store_true',
+                        help='Also upload the changed dataset files to <prefix>/compacted/.')
+    parser.add_argument('-t', '--threads', type=int, default=16)
+    parser.add_argument('--full', action='store_true', help='Ignore the watermark and rebuild the dataset.')
+    return parser.parse_args()
+
+
+class CompactState:
+    """Watermark and per-object bookkeeping of a compacted dataset.
+
+    objects: {key: {'etag', 'part'}}; metrics objects have no part.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.watermark = None
+        self.objects = {}
+        self.parts = 0
+        if os.path.isfile(path):
+            with open(path, 'r') as fh:
+                data = json.load(fh)
+            if data.get('watermark'):
+                self.watermark = datetime.datetime.fromisoformat(data['watermark'])
+            self.objects = data.get('objects', {})
+            self.parts = data.get('parts', 0)
+
+    def changed(self, listing):
+        """Keys of listing that are new or changed since they were compacted."""
+        since = self.watermark - GRACE if self.watermark is not None else None
+        keys = []
+        for key, obj in listing.items():
+            if since is not None and obj['LastModified'] is not None and obj['LastModified'] < since:
+                continue
+            if self.objects.get(key, {}).get('etag') != obj['ETag']:
+                keys.append(key)
+        return sorted(keys, key=lambda k: (simtrace.iteration_of(k), k))
+
+    def advance(self, listing):
+        times = [obj['LastModified'] for obj in listing.values() if obj['LastModified'] is not None]
+        if times and (self.watermark is None or max(times) > self.watermark):
+            self.watermark = max(times)
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({'watermark': self.watermark.isoformat() if self.watermark else None,
+                       'objects': self.objects, 'parts': self.parts}, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def part_path(output, number):
+    return os.path.join(output, 'simtrace', 'part-{:05d}.parquet'.format(number))
+
+
+def fetch_simtrace(s3_client, bucket, prefix, key):
+    import pyarrow as pa
+
+    try:
+        table = columnar.table_from_csv(transfer.read_object(s3_client, bucket, key) or b'')
+    except pa.ArrowInvalid as e:
+        # Kept as an empty table, so its ETag is still recorded and a later version is picked up.
+        print("Skipping unparseable s3://{}/{}: {}".format(bucket, key, e), file=sys.stderr)
+        table = columnar.schema().empty_table()
+    relative = os.path.dirname(key[len(prefix):].strip('/'))
+    n = table.num_rows
+    return (table.append_column('source', pa.array([relative] * n, pa.string()))
+            .append_column('iteration', pa.array([simtrace.iteration_of(key)] * n, pa.int64()))
+            .append_column('object', pa.array([key] * n, pa.string())))
+
+
+def fetch_metrics(s3_client, bucket, key):
+    data = transfer.read_object(s3_client, bucket, key)
+    try:
+        rows = json.loads(data).get('metrics', [])
+    except (ValueError, AttributeError, TypeError):
+        return []
+    return [dict(row, object=key) for row in rows if isinstance(row, dict)]
+
+
+def drop_objects(table, keys):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    keep = pc.invert(pc.is_in(table.column('object'), value_set=pa.array(sorted(keys), pa.string())))
+    return table.filter(keep)
+
+
+def compact_simtrace(s3_client, args, state, listing, executor):
+    """Write changed simtrace CSVs as a new part; parts holding older versions of them are rewritten."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    keys = state.changed(listing)
+    if not keys:
+        return []
+    tables = list(executor.map(lambda k: fetch_simtrace(s3_client, args.bucket, args.prefix, k), keys))
+
+    written = []
+    stale = {}
+    for key in keys:
+        part = state.objects.get(key, {}).get('part')
+        if part is not None:
+            stale.setdefault(part, set()).add(key)
+    for part, part_keys in stale.items():
+        path = part_path(args.output, part)
+        if os.path.isfile(path):
+            columnar.write(drop_objects(pq.read_table(path), part_keys), path)
+            written.append(path)
+
+    part = state.parts
+    table = pa.concat_tables([t.cast(tables[0].schema) for t in tables])
+    path = part_path(args.output, part)
+    columnar.write(table, path, row_group_size=1024 * 1024)
+    written.append(path)
+    state.parts += 1
+    for key in keys:
+        state.objects[key] = {'etag': listing[key]['ETag'], 'part': part}
+    return written
+
+
+def rebuild_index(output):
+    """Episode index over all parts, as index.parquet next to the simtrace folder."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    folder = os.path.join(output, 'simtrace')
+    indexes = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.parquet'):
+            continue
+        table = pq.read_table(os.path.join(folder, name))
+        if table.num_rows == 0:
+            continue
+        index = columnar.episode_index(table, ['source', 'object', 'iteration'])
+        indexes.append(index.append_column('part', pa.array([name] * index.num_rows, pa.string())))
+    if indexes:
+        path = os.path.join(output, 'index.parquet')
+        columnar.write(pa.concat_tables(indexes), path)
+        return path
+    return None
+
+
+def compact_metrics(s3_client, args, state, listing, executor):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    keys = state.changed(listing)
+    if not keys:
+        return []
+    path = os.path.join(args.output, 'metrics.parquet')
+    rows = []
+    if os.path.isfile(path):
+        rows = drop_objects(pq.read_table(path), keys).to_pylist()
+    for fetched in executor.map(lambda k: fetch_metrics(s3_client, args.bucket, k), keys):
+        rows.extend(fetched)
+    for key in keys:
+        state.objects[key] = {'etag': listing[key]['ETag']}
+    columnar.write(pa.Table.from_pylist(rows), path)
+    return [path]
+
+
+def upload(s3_client, args, paths):
+    target = '{}/compacted/'.format(args.prefix.strip('/'))
+    for path in paths:
+        key = target + os.path.relpath(path, args.output).replace(os.sep, '/')
+        s3_client.upload_file(path, args.bucket, key)
+    print("Uploaded {} files to s3://{}/{}".format(len(paths), args.bucket, target))
+
+
+def main():
+    args = parse_args()
+    columnar.require_pyarrow()
+    if not args.bucket or not args.prefix:
+        print("Bucket and prefix must be given or set in the environment. Exiting.")
+        sys.exit(1)
+    args.prefix = args.prefix.strip('/') + '/'
+    if args.output is None:
+        args.output = os.path.join(os.environ.get('DR_DIR', '.'), 'data', 'analysis', args.prefix.strip('/'))
+    os.makedirs(args.output, exist_ok=True)
+
+    state_path = os.path.join(args.output, STATE_FILE)
+    if args.full:
+        shutil.rmtree(os.path.join(args.output, 'simtrace'), ignore_errors=True)
+        for name in (STATE_FILE, 'index.parquet', 'metrics.parquet'):
+            if os.path.isfile(os.path.join(args.output, name)):
+                os.remove(os.path.join(args.output, name))
+    state = CompactState(state_path)
+
+    start = time.time()
+    s3_client = drs3.local_client(max_pool_connections=args.threads)
+    objects = transfer.list_objects(s3_client, args.bucket, args.prefix)
+    simtraces = {k: v for k, v in objects.items() if simtrace.ITERATION_RE.search(k)}
+    metrics = {}
+    if args.metrics_prefix:
+        # Usually <prefix>/metrics, already covered by the listing above.
+        metrics_prefix = args.metrics_prefix.strip('/') + '/'
+        if not metrics_prefix.startswith(args.prefix):
+            objects = transfer.list_objects(s3_client, args.bucket, metrics_prefix)
+        metrics = {k: v for k, v in objects.items() if k.startswith(metrics_prefix) and k.endswith('.json')}
+
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        changed_simtraces = len(state.changed(simtraces))
+        changed_metrics = len(state.changed(metrics))
+        written = compact_simtrace(s3_client, args, state, simtraces, executor)
+        if written:
+            written.append(rebuild_index(args.output))
+        written += compact_metrics(s3_client, args, state, metrics, executor)
+
+    state.advance(dict(simtraces, **metrics))
+    state.save()
+    print("Compacted {} simtrace and {} metrics objects into {} in {:.1f}s.".format(
+        changed_simtraces, changed_metrics, args.output, time.time() - start))
+
+    if args.upload and written:
+        upload(s3_client, args, [p for p in written if p] + [state_path])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import columnar
+
+MARKER = b'SIM_TRACE_LOG:'
+READ_SIZE = 16 * 1024 * 1024
+STATE_FILE = '_tail_state.json'
+
+
+def parse_args():
+    prefix = os.environ.get('DR_LOCAL_S3_MODEL_PREFIX', '')
+    logs = os.path.join(os.environ.get('DR_DIR', '.'), 'data', 'logs')
+    parser = argparse.ArgumentParser(description='Follow mounted robomaker logs and store their SIM_TRACE_LOG '
+                                                 'steps as Parquet, partitioned by worker and episode range.')
+    parser.add_argument('-s', '--source', default=os.path.join(logs, 'robomaker', prefix),
+                        help='Mounted log directory (default: data/logs/robomaker/<model prefix>).')
+    parser.add_argument('-t', '--target', default=os.path.join(logs, 'simtrace', prefix),
+                        help='Output directory (default: data/logs/simtrace/<model prefix>).')
+    parser.add_argument('-b', '--batch', type=int, default=50000, help='Steps per Parquet file / row group.')
+    parser.add_argument('-f', '--follow', type=float, default=0, metavar='SECONDS',
+                        help='Keep following, polling every SECONDS.')
+    parser.add_argument('--flush', type=float, default=120,
+                        help='In follow mode, write a partial batch once it is this many seconds old.')
+    return parser.parse_args()
+
+
+def worker_id(relative_path):
+    name = os.path.splitext(relative_path)[0]
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+
+class Follower:
+    """Reads new complete lines from each log file, remembering byte offsets.
+
+    Reading stops once a batch of steps is pending, which is written before
+    reading on. Offsets in the state file only advance when the rows read up
+    to them have been written, so memory stays at one batch per file and a
+    crash re-reads at most that batch.
+    """
+
+    def __init__(self, source, target, batch):
+        self.source = source
+        self.target = target
+        self.batch = batch
+        self.state_path = os.path.join(target, STATE_FILE)
+        self.state = {}
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, 'r') as fh:
+                self.state = json.load(fh)
+        # In memory per file: rows not yet written, read position and when the oldest row was read.
+        self.pending = {}
+
+    def save_state(self):
+        os.makedirs(self.target, exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(self.state, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def files(self):
+        for root, _, names in os.walk(self.source):
+            for name in names:
+                if not name.startswith('.'):
+                    yield os.path.relpath(os.path.join(root, name), self.source)
+
+    def poll(self):
+        """Read what was appended to every file since the last poll. Returns the number of steps found."""
+        found = 0
+        for relative in self.files():
+            path = os.path.join(self.source, relative)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = self.state.setdefault(relative, {'inode': stat.st_ino, 'offset': 0, 'part': 0})
+            pending = self.pending.setdefault(relative, {'rows': [], 'offset': entry['offset'], 'since': None})
+            if entry['inode'] != stat.st_ino or stat.st_size < pending['offset']:
+                # Rotated or truncated: start over on the new file.
+                entry.update(inode=stat.st_ino, offset=0)
+                pending.update(rows=[], offset=0, since=None)
+            while pending['offset'] < stat.st_size:
+                found += self.read(path, pending, stat.st_size)
+                if len(pending['rows']) < self.batch:
+                    break
+                self.flush(relative)
+        return found
+
+    def read(self, path, pending, size):
+        """Read complete lines from the pending offset until EOF or until a batch of steps is pending."""
+        found = 0
+        with open(path, 'rb') as fh:
+            fh.seek(pending['offset'])
+            while pending['offset'] < size and len(pending['rows']) < self.batch:
+                data = fh.read(min(READ_SIZE, size - pending['offset']))
+                if not data:
+                    break
+                end = data.rfind(b'\n')
+                if end < 0:
+                    # Incomplete line; wait for the rest of it.
+                    break
+                position = pending['offset']
+                for line in data[:end].split(b'\n'):
+                    position += len(line) + 1
+                    start = line.find(MARKER)
+                    if start >= 0:
+                        pending['rows'].append(line[start + len(MARKER):].decode('utf-8', 'replace').strip().split(','))
+                        found += 1
+                        if len(pending['rows']) >= self.batch:
+                            break
+                pending['offset'] = position
+                fh.seek(position)
+        if found and pending['since'] is None:
+            pending['since'] = time.time()
+        return found
+
+    def flush(self, relative):
+        pending = self.pending[relative]
+        entry = self.state[relative]
+        rows = pending['rows']
+        for i in range(0, len(rows), self.batch):
+            batch = rows[i:i + self.batch]
+            table = columnar.table_from_rows(batch)
+            if table.num_rows < len(batch):
+                entry['dropped'] = entry.get('dropped', 0) + len(batch) - table.num_rows
+                print("{}: skipped {} malformed SIM_TRACE_LOG lines ({} so far).".format(
+                    relative, len(batch) - table.num_rows, entry['dropped']), file=sys.stderr, flush=True)
+            if not table.num_rows:
+                continue
+            episodes = table.column('episode')
+            first, last = episodes[0].as_py(), episodes[len(episodes) - 1].as_py()
+            name = 'episodes-{:06d}-{:06d}-{:05d}.parquet'.format(first, last, entry['part'])
+            columnar.write(table, os.path.join(self.target, 'worker={}'.format(worker_id(relative)), name))
+            entry['part'] += 1
+        entry['offset'] = pending['offset']
+        pending.update(rows=[], since=None)
+        self.save_state()
+        return len(rows)
+
+    def flush_old(self, max_age):
+        written = 0
+        for relative, pending in self.pending.items():
+            if pending['rows'] and (max_age is None or time.time() - pending['since'] >= max_age):
+                written += self.flush(relative)
+            elif not pending['rows'] and pending['offset'] != self.state[relative]['offset']:
+                # Only non-simtrace lines were read; just move the offset on.
+                self.state[relative]['offset'] = pending['offset']
+                self.save_state()
+        return written
+
+
+def main():
+    args = parse_args()
+    columnar.require_pyarrow()
+    if not os.path.isdir(args.source):
+        print("Log directory {} does not exist. Is DR_ROBOMAKER_MOUNT_LOGS enabled?".format(args.source))
+        sys.exit(1)
+
+    follower = Follower(args.source, args.target, args.batch)
+    start = time.time()
+    found = follower.poll()
+    follower.flush_old(None if args.follow <= 0 else args.flush)
+    print("Read {} steps from {} in {:.1f}s.".format(found, args.source, time.time() - start))
+
+    try:
+        while args.follow > 0:
+            time.sleep(args.follow)
+            follower.poll()
+            follower.flush_old(args.flush)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        written = follower.flush_old(None)
+        if written:
+            print("Wrote remaining {} steps.".format(written))
+
+
+if __name__ == '__main__':
+    main()
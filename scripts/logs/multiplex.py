@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import gzip
+import os
+import re
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import dockerapi
+from drfc import robomaker
+
+# Containers that appear later (Sagemaker, restarted workers) are picked up this often.
+DISCOVER_INTERVAL = 5
+
+COACH_RE = re.compile(r'^deepracer(-eval)?-(\d+)(?:_rl_coach\.|-rl_coach-)')
+LEVEL_RE = re.compile(r'\b(DEBUG|INFO|WARN(?:ING)?|ERROR|CRITICAL|FATAL)\b')
+LEVELS = {'debug': 10, 'info': 20, 'warn': 30, 'warning': 30, 'error': 40, 'critical': 50, 'fatal': 50}
+COLOURS = [36, 32, 33, 35, 34, 96, 92, 93, 95, 94]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Follow the logs of all containers of a run through the Docker API, '
+                                                 'prefixed by worker, filtered, to the terminal or to rotated files.')
+    parser.add_argument('-r', '--run-id', type=int, action='append',
+                        help='Run to follow; may be repeated (default: DR_RUN_ID).')
+    parser.add_argument('-a', '--all-runs', action='store_true', help='Follow the containers of every run.')
+    parser.add_argument('-c', '--containers', default='robomaker,sagemaker,rl_coach',
+                        help='Kinds of containers to follow (default: robomaker,sagemaker,rl_coach).')
+    parser.add_argument('-e', '--evaluation', action='store_true', help='Follow evaluation instead of training.')
+    parser.add_argument('-g', '--grep', help='Only show lines matching this regular expression.')
+    parser.add_argument('-x', '--exclude', help='Hide lines matching this regular expression.')
+    parser.add_argument('-l', '--level', choices=['debug', 'info', 'warning', 'error', 'critical'],
+                        help='Only show lines of at least this level; lines without one take that of the line '
+                             'before, so tracebacks stay with their error.')
+    parser.add_argument('--sim-trace', action='store_true', help='Also show SIM_TRACE_LOG lines (hidden by default).')
+    parser.add_argument('-n', '--tail', default='10', help='Lines of existing logs to show first ("all" for all).')
+    parser.add_argument('--no-follow', action='store_true', help='Show the existing logs and exit.')
+    parser.add_argument('-o', '--output', metavar='DIR',
+                        help='Write one log file per container to DIR instead of the terminal.')
+    parser.add_argument('--max-mb', type=float, default=50, help='Size at which output files are rotated.')
+    parser.add_argument('--keep', type=int, default=10, help='Rotated, gzipped files kept per container.')
+    parser.add_argument('--stats', type=float, default=0, metavar='SECONDS',
+                        help='Print line rates per container to stderr every SECONDS.')
+    parser.add_argument('--color', choices=['auto', 'always', 'never'], default='auto')
+    return parser.parse_args()
+
+
+class Source:
+    """One followed container and its line counters."""
+
+    def __init__(self, container_id, run_id, kind, label, tty):
+        self.id = container_id
+        self.run_id = run_id
+        self.kind = kind
+        self.label = label
+        self.tty = tty
+        self.level = None
+        self.lines = 0
+        self.shown = 0
+        self.reported = (time.time(), 0, 0)
+
+
+class LineFilter:
+
+    def __init__(self, args):
+        self.grep = re.compile(args.grep) if args.grep else None
+        self.exclude = re.compile(args.exclude) if args.exclude else None
+        self.level = LEVELS[args.level] if args.level else None
+        self.sim_trace = args.sim_trace
+
+    def accept(self, source, line):
+        if not self.sim_trace and line.startswith('SIM_TRACE_LOG'):
+            return False
+        match = LEVEL_RE.search(line)
+        if match:
+            source.level = LEVELS[match.group(1).lower()]
+        if self.level is not None and (source.level or LEVELS['info']) < self.level:
+            return False
+        if self.grep is not None and not self.grep.search(line):
+            return False
+        return self.exclude is None or not self.exclude.search(line)
+
+
+class TerminalSink:
+
+    def __init__(self, colour, show_run):
+        self.colour = colour
+        self.show_run = show_run
+        self.colours = {}
+        self.width = 0
+
+    def prefix(self, source):
+        name = '{}/{}'.format(source.run_id, source.label) if self.show_run else source.label
+        self.width = max(self.width, len(name))
+        return name.ljust(self.width)
+
+    def write(self, source, line, level):
+        prefix = self.prefix(source)
+        if self.colour:
+            code = self.colours.setdefault(source.id, COLOURS[len(self.colours) % len(COLOURS)])
+            prefix = '\033[{}m{}\033[0m'.format(code, prefix)
+            if level is not None and level >= LEVELS['error']:
+                line = '\033[31m{}\033[0m'.format(line)
+        sys.stdout.write('{} | {}\n'.format(prefix, line))
+
+    def close(self):
+        sys.stdout.flush()
+
+
+class RotatingFile:
+    """Appends to <name>.log; full files are renamed with a timestamp and gzipped off the event loop."""
+
+    def __init__(self, directory, name, max_bytes, keep):
+        self.directory = directory
+        self.name = name
+        self.path = os.path.join(directory, name + '.log')
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.fh = open(self.path, 'a')
+        self.size = self.fh.tell()
+
+    def write(self, text):
+        self.fh.write(text)
+        self.size += len(text)
+        if self.size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.fh.close()
+        now = time.time()
+        rotated = os.path.join(self.directory, '{}-{}{:03d}.log'.format(
+            self.name, time.strftime('%Y%m%d-%H%M%S', time.localtime(now)), int(now * 1000) % 1000))
+        os.replace(self.path, rotated)
+        self.fh = open(self.path, 'a')
+        self.size = 0
+        asyncio.get_event_loop().run_in_executor(None, self.compress, rotated)
+
+    def compress(self, rotated):
+        with open(rotated, 'rb') as src, gzip.open(rotated + '.gz.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(rotated + '.gz.tmp', rotated + '.gz')
+        os.remove(rotated)
+        old = sorted(f for f in os.listdir(self.directory)
+                     if f.startswith(self.name + '-') and f.endswith('.log.gz'))
+        for name in old[:max(0, len(old) - self.keep)]:
+            os.remove(os.path.join(self.directory, name))
+
+    def close(self):
+        self.fh.close()
+
+
+class FileSink:
+
+    def __init__(self, directory, max_bytes, keep):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.files = {}
+
+    def write(self, source, line, level):
+        name = 'run{}-{}'.format(source.run_id, source.label)
+        if name not in self.files:
+            self.files[name] = RotatingFile(self.directory, name, self.max_bytes, self.keep)
+        self.files[name].write(line + '\n')
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def classify(name, details):
+    """(run_id, stack, kind, label) of a DeepRacer container, or None for others."""
+    container = robomaker.parse_container(None, name)
+    if container is not None:
+        return container.run_id, container.stack, 'robomaker', 'robomaker-{}'.format(container.replica)
+    match = COACH_RE.match(name)
+    if match:
+        return int(match.group(2)), 'evaluation' if match.group(1) else 'training', 'rl_coach', 'rl_coach'
+    run_id = dockerapi.env_value(details, 'RUN_ID') if '-algo-' in name else None
+    if run_id is not None and run_id.isdigit():
+        return int(run_id), 'training', 'sagemaker', 'sagemaker'
+    return None
+
+
+async def discover(socket, args, known, ignored):
+    """Sources for running containers of the selected runs that are not followed yet.
+
+    Containers found not to be wanted are added to `ignored`, so they are
+    only inspected once.
+    """
+    found = []
+    for entry in await dockerapi.containers(socket):
+        if entry['Id'] in known or entry['Id'] in ignored:
+            continue
+        ignored.add(entry['Id'])
+        name = entry.get('Names', ['/'])[0].lstrip('/')
+        if not (robomaker.NAME_RE.match(name) or COACH_RE.match(name) or '-algo-' in name):
+            continue
+        details = await dockerapi.inspect(socket, entry['Id'])
+        kind = classify(name, details)
+        if kind is None:
+            continue
+        run_id, stack, role, label = kind
+        if not args.all_runs and run_id not in args.run_id:
+            continue
+        if role not in args.containers or stack != ('evaluation' if args.evaluation else 'training'):
+            continue
+        ignored.discard(entry['Id'])
+        found.append(Source(entry['Id'], run_id, role, label, bool(details.get('Config', {}).get('Tty'))))
+    return found
+
+
+async def follow(socket, source, line_filter, sink, args):
+    try:
+        async for _, line in dockerapi.log_lines(socket, source.id, tty=source.tty, follow=not args.no_follow,
+                                                 tail=args.tail):
+            source.lines += 1
+            if line_filter.accept(source, line):
+                source.shown += 1
+                sink.write(source, line, source.level)
+    except (OSError, dockerapi.DockerAPIError, asyncio.IncompleteReadError) as e:
+        print("{}: log stream ended: {}".format(source.label, e), file=sys.stderr)
+
+
+def report_rates(sources, final=False):
+    now = time.time()
+    parts = []
+    for source in sorted(sources, key=lambda s: (s.run_id, s.label)):
+        since, lines, shown = source.reported
+        elapsed = max(now - since, 1e-6)
+        if final:
+            parts.append('{}/{} {} lines ({} shown)'.format(source.run_id, source.label, source.lines, source.shown))
+        else:
+            parts.append('{}/{} {:.1f}/s ({:.1f}/s shown)'.format(
+                source.run_id, source.label, (source.lines - lines) / elapsed, (source.shown - shown) / elapsed))
+        source.reported = (now, source.lines, source.shown)
+    if parts:
+        print('[{}] {}'.format(time.strftime('%H:%M:%S'), ', '.join(parts)), file=sys.stderr, flush=True)
+
+
+async def run(args, sink):
+    socket = dockerapi.socket_path()
+    line_filter = LineFilter(args)
+    sources = {}
+    ignored = set()
+    tasks = {}
+    last_report = time.time()
+    try:
+        while True:
+            for source in await discover(socket, args, sources, ignored):
+                sources[source.id] = source
+                tasks[source.id] = asyncio.ensure_future(follow(socket, source, line_filter, sink, args))
+            if args.no_follow:
+                await asyncio.gather(*tasks.values())
+                break
+            for container_id in [i for i, t in tasks.items() if t.done()]:
+                # A stopped container is dropped; if it comes back it is followed again.
+                del tasks[container_id]
+                del sources[container_id]
+            if args.stats and time.time() - last_report >= args.stats:
+                report_rates(sources.values())
+                last_report = time.time()
+            await asyncio.sleep(min(DISCOVER_INTERVAL, args.stats) if args.stats else DISCOVER_INTERVAL)
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        if args.stats:
+            report_rates(sources.values(), final=True)
+
+
+def main():
+    args = parse_args()
+    args.containers = [c.strip() for c in args.containers.split(',')]
+    if not args.run_id:
+        args.run_id = [int(os.environ.get('DR_RUN_ID', '0'))]
+    try:
+        re.compile(args.grep or '')
+        re.compile(args.exclude or '')
+    except re.error as e:
+        print("Invalid regular expression: {}".format(e))
+        sys.exit(1)
+    if not os.path.exists(dockerapi.socket_path()):
+        print("Docker socket {} not found. Set DOCKER_HOST=unix://<path> to use another.".format(
+            dockerapi.socket_path()))
+        sys.exit(1)
+
+    if args.output:
+        sink = FileSink(args.output, int(args.max_mb * 2 ** 20), args.keep)
+    else:
+        colour = args.color == 'always' or (args.color == 'auto' and sys.stdout.isatty())
+        sink = TerminalSink(colour, show_run=args.all_runs or len(args.run_id) > 1)
+    try:
+        asyncio.run(run(args, sink))
+    except KeyboardInterrupt:
+        pass
+    except dockerapi.DockerAPIError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        sink.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import robomaker
+from drfc import telegraf
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Sample gz stats of all running Robomaker containers concurrently, '
+                                                 'printing rolling real-time factor per worker and sending it to telegraf.')
+    parser.add_argument('-r', '--run-id', type=int, action='append',
+                        help='Only containers of this DR_RUN_ID; may be repeated (default: all runs).')
+    parser.add_argument('-s', '--stack', choices=['training', 'evaluation'], help='Only training or evaluation.')
+    parser.add_argument('-i', '--interval', type=float, default=5, help='Seconds between table updates and sends.')
+    parser.add_argument('-w', '--window', type=float, default=60, help='Seconds of samples in the rolling statistics.')
+    parser.add_argument('-d', '--duration', type=float, help='Stop after this many seconds and print the final table.')
+    parser.add_argument('--no-telegraf', action='store_true', help='Do not send metrics to telegraf.')
+    parser.add_argument('--fake', metavar='WORKERS[,WORKERS...]',
+                        help='Use simulated containers instead of docker: the number of workers for run 0, 1, ...')
+    return parser.parse_args()
+
+
+class FakeStream:
+    """gz stats lines at 5 Hz with a per-worker factor that drifts and occasionally dips."""
+
+    def __init__(self, container):
+        self.closed = threading.Event()
+        self.base = 0.6 + 0.4 * random.random()
+        self.phase = random.random() * 2 * math.pi
+
+    def lines(self):
+        sim = real = 0.0
+        while not self.closed.wait(0.2):
+            factor = self.base * (1 + 0.05 * math.sin(real / 10 + self.phase)) * random.uniform(0.95, 1.02)
+            if random.random() < 0.01:
+                factor *= 0.5
+            real += 0.2
+            sim += 0.2 * factor
+            yield 'Factor[{:.2f}] SimTime[{:.2f}] RealTime[{:.2f}] Paused[F]\n'.format(factor, sim, real)
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeBackend:
+
+    def __init__(self, spec):
+        self.fake = []
+        for run_id, workers in enumerate(int(n) for n in spec.split(',')):
+            for replica in range(1, workers + 1):
+                name = 'deepracer-{}_robomaker.{}.fake{}{}'.format(run_id, replica, run_id, replica)
+                self.fake.append(robomaker.parse_container('fake-{}-{}'.format(run_id, replica), name))
+
+    def containers(self):
+        return list(self.fake)
+
+    def stream(self, container):
+        return FakeStream(container)
+
+
+def wanted(container, args):
+    if args.run_id and container.run_id not in args.run_id:
+        return False
+    return args.stack is None or container.stack == args.stack
+
+
+def fmt(value, pattern):
+    return pattern.format(value) if value is not None else '-'
+
+
+def table(rows, now):
+    lines = ['{:>3} {:<10} {:>6} {:>6} {:>6} {:>6} {:>6} {:>9} {:>10} {:>7}'.format(
+        'run', 'stack', 'worker', 'rtf', 'mean', 'min', 'p10', 'sim/real', 'sim time', 'samples')]
+    by_run = {}
+    for container, fields in rows:
+        if fields is None:
+            lines.append('{:>3} {:<10} {:>6}  (no stats yet)'.format(container.run_id, container.stack,
+                                                                     container.replica))
+            continue
+        lines.append('{:>3} {:<10} {:>6} {:>6} {:>6} {:>6} {:>6} {:>9} {:>10} {:>7}'.format(
+            container.run_id, container.stack, container.replica, fmt(fields['rtf'], '{:.2f}'),
+            fmt(fields['rtf_mean'], '{:.2f}'), fmt(fields['rtf_min'], '{:.2f}'), fmt(fields['rtf_p10'], '{:.2f}'),
+            fmt(fields['sim_real_ratio'], '{:.3f}'), fmt(fields['sim_time'], '{:.1f}'), fields['samples']))
+        by_run.setdefault((container.run_id, container.stack), []).append((container, fields))
+    for (run_id, stack), workers in sorted(by_run.items()):
+        slowest = min(workers, key=lambda w: w[1]['rtf_mean'])
+        mean = sum(w[1]['rtf_mean'] for w in workers) / len(workers)
+        lines.append('run {} {}: {} workers, mean rtf {:.2f}, slowest worker {} ({:.2f})'.format(
+            run_id, stack, len(workers), mean, slowest[0].replica, slowest[1]['rtf_mean']))
+    if not rows:
+        lines.append('No Robomaker containers running.')
+    lines.append(time.strftime('%H:%M:%S', time.localtime(now)))
+    return '\n'.join(lines)
+
+
+def main():
+    args = parse_args()
+    if not args.fake and shutil.which('docker') is None:
+        print("docker not found. Use --fake to try out the sampler without Docker.")
+        sys.exit(1)
+    backend = FakeBackend(args.fake) if args.fake else robomaker.DockerBackend()
+    sender = None if args.no_telegraf else telegraf.Sender()
+    clear = '\033[H\033[J' if sys.stdout.isatty() and args.duration is None else ''
+    sampler = robomaker.Sampler(backend, args.window)
+    end = time.time() + args.duration if args.duration is not None else None
+
+    try:
+        while True:
+            sampler.update([c for c in backend.containers() if wanted(c, args)])
+
+            time.sleep(args.interval if end is None else max(0, min(args.interval, end - time.time())))
+            now = time.time()
+            rows = sampler.rows(now)
+
+            if sender is not None:
+                sender.send(telegraf.line('deepracer_robomaker',
+                                          {'run_id': c.run_id, 'stack': c.stack, 'worker': c.replica},
+                                          fields, now)
+                            for c, fields in rows if fields is not None)
+            if end is None or now >= end:
+                print(clear + table(rows, now), flush=True)
+            if end is not None and now >= end:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import coachlog
+from drfc import dockerapi
+from drfc import telegraf
+
+# Seconds between looks for the Sagemaker container while it is not running.
+FIND_INTERVAL = 5
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Follow the Sagemaker log of a run and send the policy update '
+                                                 'timings, losses, entropy and KL divergence of every training '
+                                                 'iteration to telegraf.')
+    parser.add_argument('-r', '--run-id', type=int, default=int(os.environ.get('DR_RUN_ID', '0')))
+    parser.add_argument('-c', '--container', help='Sagemaker container to follow (default: found by its RUN_ID).')
+    parser.add_argument('-n', '--tail', default='all',
+                        help='Lines of the existing log to parse first (default: all, so earlier iterations are '
+                             'sent again; they overwrite the same points).')
+    parser.add_argument('--no-follow', action='store_true', help='Parse the existing log, print a summary and exit.')
+    parser.add_argument('-f', '--flush', type=float, default=1, metavar='SECONDS',
+                        help='Seconds between batches sent to telegraf.')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not print every iteration.')
+    parser.add_argument('--no-telegraf', action='store_true', help='Do not send metrics to telegraf.')
+    return parser.parse_args()
+
+
+async def find_sagemaker(socket, run_id):
+    """(id, tty) of the running Sagemaker container of run_id, found like dr-find-sagemaker by the RUN_ID it gets."""
+    for entry in await dockerapi.containers(socket):
+        if '-algo-' not in entry.get('Names', ['/'])[0]:
+            continue
+        details = await dockerapi.inspect(socket, entry['Id'])
+        if dockerapi.env_value(details, 'RUN_ID') == str(run_id):
+            return entry['Id'], bool(details.get('Config', {}).get('Tty'))
+    return None
+
+
+class Batch:
+    """Telegraf lines collected between flushes, so a burst of log lines costs a few datagrams."""
+
+    def __init__(self, sender):
+        self.sender = sender
+        self.lines = []
+
+    def add(self, text):
+        if self.sender is not None:
+            self.lines.append(text)
+
+    def flush(self):
+        if self.lines:
+            self.sender.send(self.lines)
+            self.lines = []
+
+    async def flush_every(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+
+def report(fields):
+    def seconds(key):
+        return '{:6.1f}s'.format(fields[key]) if fields.get(key) is not None else '     - '
+
+    busy = '{:4.0%}'.format(fields['update_fraction']) if 'update_fraction' in fields else '   -'
+    loss, kl, entropy = (fields.get(k, float('nan')) for k in coachlog.LOSSES)
+    print("iteration {:>4}: {:>2} epochs, update {}, waiting {}, trainer busy {}, loss {:9.5f}, KL {:8.5f}, "
+          "entropy {:7.4f}".format(fields['iteration'], fields['epochs'], seconds('update_s'), seconds('wait_s'), busy,
+                                   loss, kl, entropy), flush=True)
+
+
+def print_summary(summary):
+    if not summary.count:
+        print("No policy updates found in the Sagemaker log.")
+        return
+    update, wait = summary.mean('update_s'), summary.mean('wait_s')
+    print("{} iterations: update {}, waiting for episodes {} on average.".format(
+        summary.count, '{:.1f}s'.format(update) if update is not None else '-',
+        '{:.1f}s'.format(wait) if wait is not None else '-'))
+    busy = summary.update_fraction
+    if busy is not None:
+        print("Policy updates took {:.0%} of the time and collecting episodes {:.0%}, so {} dominate.".format(
+            busy, 1 - busy, 'the updates' if busy >= 0.5 else 'the Robomaker workers'))
+
+
+async def follow(socket, container, args, tags, batch, summary):
+    container_id, tty = container
+    log = coachlog.TrainerLog()
+
+    def handle(records):
+        for record in records:
+            if record.kind == 'epoch':
+                batch.add(telegraf.line('deepracer_trainer_epoch', dict(tags, epoch=record.fields['epoch']),
+                                        record.fields, record.time))
+            else:
+                summary.add(record.fields)
+                batch.add(telegraf.line('deepracer_trainer', tags, record.fields, record.time))
+                if not args.quiet and not args.no_follow:
+                    report(record.fields)
+
+    async for _, line in dockerapi.log_lines(socket, container_id, tty=tty, follow=not args.no_follow,
+                                             tail=args.tail, timestamps=True):
+        timestamp, text = dockerapi.split_timestamp(line)
+        handle(log.feed(time.time() if timestamp is None else timestamp, text))
+    # The last update is complete once its container has stopped.
+    handle(log.flush())
+
+
+async def run(args, sender):
+    socket = dockerapi.socket_path()
+    tags = {'model': os.environ.get('DR_LOCAL_S3_MODEL_PREFIX'), 'run_id': args.run_id}
+    batch = Batch(sender)
+    summary = coachlog.Summary()
+    flusher = asyncio.ensure_future(batch.flush_every(args.flush))
+    waiting = False
+    followed = False
+    try:
+        while True:
+            container = (args.container, False) if args.container else await find_sagemaker(socket, args.run_id)
+            if container is None:
+                if args.no_follow:
+                    print("Sagemaker of run {} is not running.".format(args.run_id))
+                    return 1
+                if not waiting:
+                    print("Waiting for Sagemaker of run {} to start...".format(args.run_id), flush=True)
+                    waiting = True
+                await asyncio.sleep(FIND_INTERVAL)
+                continue
+            waiting = False
+            followed = True
+            try:
+                await follow(socket, container, args, tags, batch, summary)
+            except (OSError, dockerapi.DockerAPIError, asyncio.IncompleteReadError) as e:
+                print("Sagemaker log stream ended: {}".format(e), file=sys.stderr)
+            batch.flush()
+            if args.no_follow or args.container:
+                return 0
+            # The next training run of this DR_RUN_ID gets a new Sagemaker container.
+            await asyncio.sleep(FIND_INTERVAL)
+    finally:
+        flusher.cancel()
+        batch.flush()
+        if followed and (args.no_follow or not args.quiet):
+            print_summary(summary)
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(dockerapi.socket_path()):
+        print("Docker socket {} not found. Set DOCKER_HOST=unix://<path> to use another.".format(
+            dockerapi.socket_path()))
+        sys.exit(1)
+    sender = None if args.no_telegraf else telegraf.Sender()
+    try:
+        sys.exit(asyncio.run(run(args, sender)))
+    except KeyboardInterrupt:
+        pass
+    except dockerapi.DockerAPIError as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
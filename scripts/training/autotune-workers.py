@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import autotune
+from drfc import robomaker
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Find the DR_WORKERS with the highest simulation throughput by '
+                                                 'running short training bursts at increasing worker counts.')
+    parser.add_argument('-m', '--max-workers', type=int,
+                        help='Largest count to try (default: CPU count, capped at num_episodes_between_training).')
+    parser.add_argument('--min-workers', type=int, default=1)
+    parser.add_argument('--step', type=int, default=1, help='Increase of the worker count between bursts.')
+    parser.add_argument('--warmup', type=float, default=60,
+                        help='Seconds to let all workers run before measuring.')
+    parser.add_argument('--burst', type=float, default=120, help='Seconds of measurement per worker count.')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='Seconds to wait for all workers to report stats before giving up on a count.')
+    parser.add_argument('--tolerance', type=float, default=0.03,
+                        help='Relative throughput difference treated as noise (default 0.03).')
+    parser.add_argument('-p', '--prefix', help='Model prefix used for the bursts; it is wiped '
+                                                   '(default: <DR_LOCAL_S3_MODEL_PREFIX>-autotune).')
+    parser.add_argument('-a', '--apply', action='store_true', help='Write the recommended DR_WORKERS to system.env.')
+    parser.add_argument('-f', '--force', action='store_true', help='Measure again even if a result is stored.')
+    parser.add_argument('--simulate', metavar='CAPACITY[,CONTENTION]',
+                        help='Run the search against a simulated throughput curve instead of starting training.')
+    return parser.parse_args()
+
+
+def episodes_between_training(dr_dir):
+    try:
+        with open(os.path.join(dr_dir, 'custom_files', 'hyperparameters.json'), 'r') as fh:
+            return int(json.load(fh)['num_episodes_between_training'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def load_results(path):
+    try:
+        with open(path, 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_results(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}'.format(path, os.getpid())
+    with open(tmp_path, 'w') as fh:
+        json.dump(results, fh, indent=2)
+    os.replace(tmp_path, path)
+
+
+def apply_workers(system_env, workers):
+    with open(system_env, 'r') as fh:
+        text = fh.read()
+    updated, count = re.subn(r'^DR_WORKERS=.*$', 'DR_WORKERS={}'.format(workers), text, flags=re.MULTILINE)
+    if not count:
+        updated = text.rstrip('\n') + '\nDR_WORKERS={}\n'.format(workers)
+    shutil.copyfile(system_env, system_env + '.bak')
+    with open(system_env, 'w') as fh:
+        fh.write(updated)
+
+
+class Calibration:
+    """Starts training with a given worker count on a scratch prefix and measures it through gz stats."""
+
+    def __init__(self, args, dr_dir, prefix):
+        self.args = args
+        self.dr_dir = dr_dir
+        self.run_id = int(os.environ.get('DR_RUN_ID', '0'))
+        # run.env derives these from the model prefix and they arrive expanded, still naming
+        # the real model; left alone the scratch runs would overwrite its TrainingMetrics.json.
+        self.env = dict(os.environ, DR_LOCAL_S3_MODEL_PREFIX=prefix, DR_LOCAL_S3_PRETRAINED='False',
+                        DR_LOCAL_S3_METRICS_PREFIX='{}/metrics'.format(prefix),
+                        DR_UPLOAD_S3_PREFIX='{}-1'.format(prefix))
+        self.backend = robomaker.DockerBackend()
+
+    def containers(self):
+        return [c for c in self.backend.containers() if c.run_id == self.run_id and c.stack == 'training']
+
+    def stop(self, workers):
+        env = dict(self.env, DR_WORKERS=str(workers))
+        subprocess.run([os.path.join(self.dr_dir, 'scripts', 'training', 'stop.sh')], env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + 120
+        while self.containers() and time.time() < deadline:
+            time.sleep(2)
+
+    def measure(self, workers):
+        args = self.args
+        memory_before = autotune.memory_available_mb()
+        env = dict(self.env, DR_WORKERS=str(workers))
+        print("Starting {} workers...".format(workers), flush=True)
+        start = subprocess.run([os.path.join(self.dr_dir, 'scripts', 'training', 'start.sh'), '-q', '-w'], env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        if start.returncode != 0:
+            print(start.stdout)
+            raise RuntimeError('start.sh failed for {} workers'.format(workers))
+
+        sampler = robomaker.Sampler(self.backend, args.burst + args.warmup)
+        try:
+            deadline = time.time() + args.timeout
+            while True:
+                containers = self.containers()
+                sampler.update(containers)
+                reporting = [f for _, f in sampler.rows() if f is not None and f['sim_time'] > 0]
+                if len(containers) >= workers and len(reporting) >= workers:
+                    break
+                if time.time() > deadline:
+                    raise RuntimeError('only {} of {} workers reported stats within {:.0f}s'.format(
+                        len(reporting), workers, args.timeout))
+                time.sleep(5)
+
+            time.sleep(args.warmup)
+            sampler.clear()
+            cpu_start = autotune.cpu_times()
+            end = time.time() + args.burst
+            while time.time() < end:
+                time.sleep(min(5, max(0, end - time.time())))
+                sampler.update(self.containers())
+            cpu = autotune.cpu_busy(cpu_start, autotune.cpu_times())
+            rows = [f for _, f in sampler.rows() if f is not None]
+        finally:
+            sampler.close()
+            memory_after = autotune.memory_available_mb()
+            self.stop(workers)
+
+        throughput = sum(f['sim_real_ratio'] or 0.0 for f in rows)
+        memory_per_worker = None
+        if memory_before is not None and memory_after is not None:
+            memory_per_worker = max(0.0, memory_before - memory_after) / workers
+        return {'throughput': throughput, 'cpu': cpu, 'memory_available_mb': memory_after,
+                'memory_per_worker_mb': memory_per_worker}
+
+    def cleanup(self):
+        from drfc import s3 as drs3
+        from drfc import transfer
+
+        s3_client = drs3.local_client()
+        bucket = os.environ.get('DR_LOCAL_S3_BUCKET')
+        prefix = self.env['DR_LOCAL_S3_MODEL_PREFIX'].strip('/') + '/'
+        transfer.delete_keys(s3_client, bucket, transfer.list_objects(s3_client, bucket, prefix))
+
+
+def report(search):
+    print("{:>7} {:>10} {:>9} {:>13} {:>6} {:>10}".format('workers', 'sim s/s', 'steps/s', 'rtf per worker',
+                                                        'cpu', 'mem free'))
+    for workers, result in sorted(search.results.items()):
+        cpu = '{:.0%}'.format(result['cpu']) if result['cpu'] is not None else '-'
+        memory = '{:.0f} MB'.format(result['memory_available_mb']) if result['memory_available_mb'] is not None \
+            else '-'
+        print("{:>7} {:>10.3f} {:>9.1f} {:>13.3f} {:>6} {:>10}".format(
+            workers, result['throughput'], result['throughput'] * autotune.STEPS_PER_SIM_SECOND,
+            result['throughput'] / workers, cpu, memory))
+    if search.reason:
+        print("Stopped: {}.".format(search.reason))
+
+
+def main():
+    args = parse_args()
+    dr_dir = os.environ.get('DR_DIR')
+    if not dr_dir and not args.simulate:
+        print("DR_DIR is not set. Run 'source bin/activate.sh' first.")
+        sys.exit(1)
+
+    max_workers = args.max_workers or os.cpu_count() or 1
+    episodes = episodes_between_training(dr_dir) if dr_dir else None
+    if episodes is not None and not args.max_workers and episodes < max_workers:
+        # More workers than episodes per iteration leaves workers idle.
+        max_workers = episodes
+    search = autotune.WorkerSearch(max_workers, min_workers=args.min_workers, step=args.step,
+                                   tolerance=args.tolerance)
+
+    if args.simulate:
+        values = [float(v) for v in args.simulate.split(',')]
+        autotune.run_search(search, lambda n: {'throughput': autotune.simulated_throughput(n, *values)})
+        report(search)
+        print("Recommended DR_WORKERS={}".format(search.recommendation()))
+        return
+
+    key, parts = autotune.config_key(os.path.join(dr_dir, 'custom_files', 'model_metadata.json'), os.environ)
+    results_path = os.path.join(dr_dir, 'tmp', 'autotune', 'workers.json')
+    stored = load_results(results_path)
+    if key in stored and not args.force:
+        workers = stored[key]['recommendation']
+        print("Stored result for {} ({}): DR_WORKERS={}. Use -f to measure again.".format(
+            parts['world'], ', '.join(parts['sensor']) or 'no sensors', workers))
+    else:
+        if shutil.which('docker') is None:
+            print("docker not found.")
+            sys.exit(1)
+        prefix = args.prefix or '{}-autotune'.format(os.environ.get('DR_LOCAL_S3_MODEL_PREFIX', 'rl-deepracer'))
+        calibration = Calibration(args, dr_dir, prefix)
+        if calibration.containers():
+            print("Training with DR_RUN_ID={} is running. Stop it, or use another DR_RUN_ID.".format(
+                calibration.run_id))
+            sys.exit(1)
+        print("Calibrating on s3://{}/{} with {:.0f}s bursts, up to {} workers.".format(
+            os.environ.get('DR_LOCAL_S3_BUCKET'), prefix, args.warmup + args.burst, max_workers))
+        try:
+            autotune.run_search(search, calibration.measure)
+        except RuntimeError as e:
+            print("Calibration stopped: {}".format(e))
+        except KeyboardInterrupt:
+            print("Interrupted.")
+        finally:
+            calibration.cleanup()
+        report(search)
+        workers = search.recommendation()
+        if workers is None:
+            print("No worker count could be measured.")
+            sys.exit(1)
+        stored[key] = {'config': parts, 'recommendation': workers, 'reason': search.reason,
+                       'results': {str(n): r for n, r in sorted(search.results.items())},
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        save_results(results_path, stored)
+
+    print("Recommended DR_WORKERS={}".format(workers))
+    if args.apply:
+        apply_workers(os.path.join(dr_dir, 'system.env'), workers)
+        print("Updated system.env. Run dr-update-env to load it.")
+
+
+if __name__ == '__main__':
+    main()
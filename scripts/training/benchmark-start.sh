@@ -0,0 +1,172 @@
+#!/usr/bin/env bash
+#
+# Benchmark of the control plane of dr-start-training: runs start.sh with
+# DR_TIMING=True against a throwaway S3 endpoint (moto_server, or a local
+# MinIO given with -e) and a fake docker CLI, and reports the median time
+# and process count of every phase. Nothing is started in docker, and
+# start.sh runs from a scratch DR_DIR so the checkout's tmp/ is left alone.
+
+usage() {
+  echo "Usage: $0 [-n runs] [-e endpoint] [-s swarm|compose] [-w workers] [-o file] [-c previous]"
+  echo "       -n runs      Number of runs (default 5)."
+  echo "       -e endpoint  S3 endpoint to use instead of starting moto_server; its bucket is overwritten."
+  echo "       -s style     Docker style to simulate (default swarm)."
+  echo "       -w workers   DR_WORKERS to simulate (default 1)."
+  echo "       -o file      Write the summary as JSON to this file."
+  echo "       -c previous  Compare with the JSON summary of an earlier run."
+  exit 1
+}
+
+RUNS=5
+STYLE=swarm
+WORKERS=1
+ENDPOINT=""
+OUTPUT=""
+PREVIOUS=""
+
+while getopts ":n:e:s:w:o:c:h" opt; do
+  case $opt in
+  n) RUNS=$OPTARG ;;
+  e) ENDPOINT=$OPTARG ;;
+  s) STYLE=$OPTARG ;;
+  w) WORKERS=$OPTARG ;;
+  o) OUTPUT=$OPTARG ;;
+  c) PREVIOUS=$OPTARG ;;
+  *) usage ;;
+  esac
+done
+
+SOURCE_DIR=${DR_DIR:-$(cd "$(dirname "${BASH_SOURCE[0]}")/../.." && pwd)}
+BENCH_DIR=$(mktemp -d)
+MOTO_PID=""
+
+cleanup() {
+  [[ -n "$MOTO_PID" ]] && kill $MOTO_PID 2>/dev/null
+  rm -rf $BENCH_DIR
+}
+trap cleanup EXIT
+
+if [[ -z "$ENDPOINT" ]]; then
+  if ! command -v moto_server >/dev/null; then
+    echo "moto_server not found. Install it with 'pip install moto[server]' or give a MinIO endpoint with -e."
+    exit 1
+  fi
+  PORT=$((20000 + RANDOM % 10000))
+  moto_server -p $PORT >$BENCH_DIR/moto.log 2>&1 &
+  MOTO_PID=$!
+  ENDPOINT="http://127.0.0.1:$PORT"
+  for i in $(seq 50); do
+    curl -s -o /dev/null $ENDPOINT && break
+    sleep 0.1
+  done
+fi
+
+# Scratch DR_DIR sharing the code of the checkout, with its own tmp/ and data/.
+export DR_DIR=$BENCH_DIR/dr
+mkdir -p $DR_DIR/tmp $DR_DIR/data
+for d in bin defaults docker lib scripts utils; do
+  ln -s $SOURCE_DIR/$d $DR_DIR/$d
+done
+
+# Fake docker: no stack running, one node labelled for both roles, everything else succeeds.
+mkdir -p $BENCH_DIR/bin
+cat >$BENCH_DIR/bin/docker <<'EOF'
+#!/usr/bin/env bash
+case "$1 $2" in
+"stack ps") exit 1 ;;
+"node ls") echo bench-node ;;
+"node inspect") echo '[{"ID": "bench-node"}]' ;;
+"inspect bench-node") echo '[{"ID": "bench-node", "Spec": {"Labels": {"Robomaker": "true", "Sagemaker": "true"}}}]' ;;
+esac
+exit 0
+EOF
+chmod +x $BENCH_DIR/bin/docker
+
+# Default configuration, as a fresh install would have it.
+python3 $DR_DIR/bin/compile-env.py $BENCH_DIR/env.sh $DR_DIR/defaults/template-system.env $DR_DIR/defaults/template-run.env 2>/dev/null
+source $BENCH_DIR/env.sh
+export PATH=$BENCH_DIR/bin:$PATH
+export DR_CLOUD=local DR_DOCKER_STYLE=$STYLE DR_WORKERS=$WORKERS DR_RUN_ID=0
+export DR_LOCAL_S3_BUCKET=bench DR_LOCAL_S3_AUTH_MODE=role DR_AWS_APP_REGION=us-east-1
+export AWS_ACCESS_KEY_ID=bench AWS_SECRET_ACCESS_KEY=bench AWS_DEFAULT_REGION=us-east-1
+export DR_LOCAL_S3_ENDPOINT_URL=$ENDPOINT DR_LOCAL_PROFILE_ENDPOINT_URL="--endpoint-url $ENDPOINT"
+[[ "${STYLE,,}" == "swarm" ]] && export DR_DOCKER_FILE_SEP="-c" || export DR_DOCKER_FILE_SEP="-f"
+export DR_TRAIN_COMPOSE_FILE="$DR_DOCKER_FILE_SEP $DR_DIR/docker/docker-compose-training.yml"
+export DR_SIMAPP_SOURCE=${DR_SIMAPP_SOURCE:-awsdeepracercommunity/deepracer-simapp} DR_SIMAPP_VERSION=${DR_SIMAPP_VERSION:-bench}
+unset DR_TIMING_TRACE
+
+mkdir -p /tmp/sagemaker 2>/dev/null
+aws $DR_LOCAL_PROFILE_ENDPOINT_URL s3 mb s3://$DR_LOCAL_S3_BUCKET >/dev/null 2>&1
+for f in reward_function.py model_metadata.json hyperparameters.json; do
+  aws $DR_LOCAL_PROFILE_ENDPOINT_URL s3 cp $DR_DIR/defaults/$f s3://$DR_LOCAL_S3_BUCKET/$DR_LOCAL_S3_CUSTOM_FILES_PREFIX/$f --no-progress >/dev/null
+done
+
+echo "Benchmarking $RUNS runs of start.sh ($STYLE, $WORKERS workers) against $ENDPOINT"
+for i in $(seq 1 $RUNS); do
+  # An existing model prefix, so that every run goes through the same wipe.
+  aws $DR_LOCAL_PROFILE_ENDPOINT_URL s3 cp $DR_DIR/defaults/hyperparameters.json \
+    s3://$DR_LOCAL_S3_BUCKET/$DR_LOCAL_S3_MODEL_PREFIX/ip/hyperparameters.json --no-progress >/dev/null
+  if ! DR_TIMING=True DR_TIMING_TRACE=$BENCH_DIR/run-$i.jsonl $DR_DIR/scripts/training/start.sh -q -w \
+    >$BENCH_DIR/run-$i.log 2>&1; then
+    echo "Run $i failed:"
+    cat $BENCH_DIR/run-$i.log
+    exit 1
+  fi
+done
+
+SOURCE_DIR=$SOURCE_DIR python3 - "$BENCH_DIR" "$RUNS" "$OUTPUT" "$PREVIOUS" <<'EOF'
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+bench_dir, runs, output, previous = sys.argv[1], int(sys.argv[2]), sys.argv[3], sys.argv[4]
+samples = {}
+order = []
+for path in sorted(glob.glob(os.path.join(bench_dir, 'run-*.jsonl'))):
+    with open(path) as fh:
+        for line in fh:
+            record = json.loads(line)
+            key = '{}: {}'.format(record['script'], record['phase'])
+            if key not in samples:
+                samples[key] = {'ms': [], 'processes': []}
+                order.append(key)
+            samples[key]['ms'].append(record['ms'])
+            if record.get('processes') is not None:
+                samples[key]['processes'].append(record['processes'])
+
+summary = {}
+for key in order:
+    ms = samples[key]['ms']
+    processes = samples[key]['processes']
+    summary[key] = {'median_ms': round(statistics.median(ms), 1), 'min_ms': round(min(ms), 1),
+                    'max_ms': round(max(ms), 1),
+                    'processes': int(statistics.median(processes)) if processes else None}
+
+before = {}
+if previous:
+    with open(previous) as fh:
+        before = json.load(fh).get('phases', {})
+
+print('{:<44} {:>10} {:>10} {:>10} {:>9}{}'.format('phase', 'median ms', 'min ms', 'max ms', 'processes',
+                                                 '   change' if before else ''))
+for key, row in summary.items():
+    change = ''
+    if key in before and before[key]['median_ms']:
+        change = '   {:+.0f}%'.format((row['median_ms'] / before[key]['median_ms'] - 1) * 100)
+    print('{:<44} {:>10} {:>10} {:>10} {:>9}{}'.format(key, row['median_ms'], row['min_ms'], row['max_ms'],
+                                                      '-' if row['processes'] is None else row['processes'], change))
+
+if output:
+    try:
+        revision = subprocess.run(['git', '-C', os.environ['SOURCE_DIR'], 'rev-parse', '--short', 'HEAD'],
+                                  capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = None
+    with open(output, 'w') as fh:
+        json.dump({'runs': runs, 'revision': revision, 'style': os.environ.get('DR_DOCKER_STYLE'),
+                   'workers': os.environ.get('DR_WORKERS'), 'phases': summary}, fh, indent=2)
+    print('Summary written to {}'.format(output))
+EOF
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import checkpoints
+from drfc import s3 as drs3
+from drfc import transfer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Delete old checkpoints from a model prefix. The best and last '
+                                                 'checkpoints in deepracer_checkpoints.json are always kept.')
+    parser.add_argument('-p', '--prefix', default=os.environ.get('DR_LOCAL_S3_MODEL_PREFIX'),
+                        help='Model prefix (default: DR_LOCAL_S3_MODEL_PREFIX).')
+    parser.add_argument('-b', '--bucket', default=os.environ.get('DR_LOCAL_S3_BUCKET'),
+                        help='Bucket (default: DR_LOCAL_S3_BUCKET).')
+    parser.add_argument('-l', '--keep-last', type=int, default=0, metavar='N', help='Also keep the N newest checkpoints.')
+    parser.add_argument('-k', '--keep-every', type=int, default=0, metavar='K',
+                        help='Also keep every checkpoint whose number is a multiple of K.')
+    parser.add_argument('-d', '--dryrun', action='store_true', help='Only report what would be deleted.')
+    parser.add_argument('-w', '--watch', type=int, default=0, metavar='SECONDS',
+                        help='Keep running and prune every SECONDS, e.g. while training.')
+    return parser.parse_args()
+
+
+def prune(client, args):
+    prefix = '{}/model/'.format(args.prefix.strip('/'))
+    objects = transfer.list_objects(client, args.bucket, prefix)
+    index_data = transfer.read_object(client, args.bucket, prefix + checkpoints.CHECKPOINT_INDEX)
+    if index_data is None:
+        print("No {} in s3://{}/{}, nothing is pruned.".format(checkpoints.CHECKPOINT_INDEX, args.bucket, prefix))
+        return
+
+    groups = checkpoints.group_by_number(objects)
+    keep = checkpoints.retained(groups.keys(), checkpoints.parse_index(index_data), args.keep_last, args.keep_every)
+    doomed = sorted(n for n in groups if n not in keep)
+    keys = [key for n in doomed for key in groups[n]]
+    size = sum(obj['Size'] for n in doomed for obj in groups[n].values())
+
+    if not keys:
+        print("Keeping all {} checkpoints in s3://{}/{}.".format(len(groups), args.bucket, prefix))
+        return
+
+    if args.dryrun:
+        for n in doomed:
+            print("(dryrun) delete checkpoint {} ({} files)".format(n, len(groups[n])))
+        print("(dryrun) Would delete {} of {} checkpoints, {} objects, reclaiming {:.1f} MB.".format(
+            len(doomed), len(groups), len(keys), size / 1024 / 1024))
+        return
+
+    errors = transfer.delete_keys(client, args.bucket, keys)
+    for error in errors:
+        print("Failed to delete s3://{}/{}: {}".format(args.bucket, error['Key'], error.get('Message')))
+    print("Deleted {} of {} checkpoints, {} objects, reclaiming {:.1f} MB. Kept: {}".format(
+        len(doomed), len(groups), len(keys) - len(errors), size / 1024 / 1024, ' '.join(str(n) for n in sorted(keep))))
+
+
+def main():
+    args = parse_args()
+    if not args.bucket or not args.prefix:
+        print("Bucket and prefix must be given or set in the environment. Exiting.")
+        sys.exit(1)
+
+    client = drs3.local_client()
+    prune(client, args)
+    while args.watch > 0:
+        try:
+            time.sleep(args.watch)
+            prune(client, args)
+        except KeyboardInterrupt:
+            break
+        except (BotoCoreError, ClientError, ValueError) as e:
+            # A failed pass, e.g. S3 briefly unreachable, is retried at the next interval.
+            print("Pruning failed, retrying in {}s: {}".format(args.watch, e), file=sys.stderr, flush=True)
+
+
+if __name__ == '__main__':
+    main()
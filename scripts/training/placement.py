@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import placement
+from drfc import robomaker
+
+# A plan whose run has no running containers yet is kept this long, so
+# runs started in quick succession do not get the same cores.
+STARTING_GRACE = 900
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Plan cpusets and memory limits for the Robomaker and Sagemaker '
+                                                 'containers of all runs on this host.')
+    parser.add_argument('command', choices=['plan', 'prepare', 'apply', 'release'],
+                        help='plan: print the plan; prepare: store the plan of this run and print its compose '
+                             'override; apply: pin the running containers of this run; release: forget its plan.')
+    parser.add_argument('-r', '--run-id', type=int, default=int(os.environ.get('DR_RUN_ID', '0')))
+    parser.add_argument('-w', '--workers', type=int, default=int(os.environ.get('DR_WORKERS', '1')))
+    parser.add_argument('--robomaker-cpus', type=int,
+                        default=int(os.environ.get('DR_PLACEMENT_ROBOMAKER_CPUS') or 2))
+    parser.add_argument('--sagemaker-cpus', type=int,
+                        default=int(os.environ.get('DR_PLACEMENT_SAGEMAKER_CPUS') or 4))
+    parser.add_argument('--memory', choices=placement.MEMORY_MODES,
+                        default=(os.environ.get('DR_PLACEMENT_MEMORY') or 'soft').lower(),
+                        help='Apply the memory share as a soft reservation, a hard limit (OOM kill beyond it) '
+                             'or not at all (default: DR_PLACEMENT_MEMORY or soft).')
+    parser.add_argument('--reserved-cores', type=int, default=1, help='Cores of node 0 left to the host.')
+    parser.add_argument('--topology', metavar='NODESxCORESxTHREADS[:GB]',
+                        help='Plan for a synthetic topology, e.g. 2x16x2:256, instead of this host.')
+    parser.add_argument('--runs', metavar='RUN:WORKERS[,RUN:WORKERS...]',
+                        help='With plan: plan these runs from scratch instead of this run next to the active ones.')
+    parser.add_argument('--wait', type=float, default=0,
+                        help='With apply: seconds to wait for the Robomaker and Sagemaker containers to appear.')
+    return parser.parse_args()
+
+
+def state_dir():
+    return os.path.join(os.environ.get('DR_DIR', '.'), 'tmp', 'placement')
+
+
+def state_path(run_id):
+    return os.path.join(state_dir(), 'run-{}.json'.format(run_id))
+
+
+def load_state(run_id):
+    try:
+        with open(state_path(run_id), 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(run_id, state):
+    os.makedirs(state_dir(), exist_ok=True)
+    tmp_path = '{}.{}'.format(state_path(run_id), os.getpid())
+    with open(tmp_path, 'w') as fh:
+        json.dump(state, fh, indent=2)
+    os.replace(tmp_path, state_path(run_id))
+
+
+def active_states(own_run_id):
+    """Stored plans of the other runs that still have containers or were made recently."""
+    try:
+        running = set(c.run_id for c in robomaker.DockerBackend().containers())
+    except OSError:
+        running = set()
+    states = []
+    for name in sorted(os.listdir(state_dir())) if os.path.isdir(state_dir()) else []:
+        if not name.startswith('run-') or not name.endswith('.json'):
+            continue
+        run_id = int(name[len('run-'):-len('.json')])
+        if run_id == own_run_id:
+            continue
+        state = load_state(run_id)
+        if state is None:
+            continue
+        if run_id in running or time.time() - os.path.getmtime(state_path(run_id)) < STARTING_GRACE:
+            states.append(state)
+        else:
+            os.remove(state_path(run_id))
+    return states
+
+
+def print_plan(topology, assignments):
+    print(topology.describe())
+    print("{:>3} {:<10} {:>7} {:<16} {:>5} {:>9}".format('run', 'container', 'replica', 'cpus', 'node', 'memory'))
+    for a in assignments:
+        print("{:>3} {:<10} {:>7} {:<16} {:>5} {:>7} M".format(
+            a.run_id, a.role, '-' if a.replica is None else a.replica, placement.format_cpulist(a.cpus),
+            placement.format_cpulist(a.mems), a.memory_mb))
+
+
+def docker_json(args):
+    result = subprocess.run(['docker'] + args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            universal_newlines=True)
+    try:
+        return json.loads(result.stdout or '[]')
+    except ValueError:
+        return []
+
+
+def swarm_nodes():
+    """[(hostname, cpus, memory MB)] of the nodes labelled Robomaker=true."""
+    node_ids = subprocess.run(['docker', 'node', 'ls', '--format', '{{.ID}}'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True).stdout.split()
+    nodes = []
+    for node in docker_json(['inspect'] + node_ids) if node_ids else []:
+        if node.get('Spec', {}).get('Labels', {}).get('Robomaker') != 'true':
+            continue
+        description = node.get('Description', {})
+        resources = description.get('Resources', {})
+        nodes.append((description.get('Hostname', node['ID']), resources.get('NanoCPUs', 0) / 1e9,
+                      resources.get('MemoryBytes', 0) / 2 ** 20))
+    return nodes
+
+
+def prepare_swarm(args, others):
+    nodes = swarm_nodes()
+    # Memory in proportion to the CPUs of the smallest node, so a replica fits anywhere.
+    memory_mb = int(min((0.9 * memory / cpus for _, cpus, memory in nodes if cpus), default=0) * args.robomaker_cpus)
+    capacities = {host: int(min(cpus // args.robomaker_cpus, memory // memory_mb if memory_mb else cpus))
+                  for host, cpus, memory in nodes}
+    for state in others:
+        for host, replicas in state.get('spread', {}).items():
+            if host in capacities:
+                capacities[host] -= replicas
+    spread = placement.spread_replicas(capacities, args.workers)
+    state = {'run_id': args.run_id, 'workers': args.workers, 'style': 'swarm',
+             'spread': {host: n for host, n in spread.items() if n}}
+    print("Robomaker replicas per node: {} (swarm only enforces at most {} per node)".format(
+        ', '.join('{} {}'.format(h, n) for h, n in sorted(state['spread'].items())), max(spread.values())),
+        file=sys.stderr)
+    excluded = [host for host, n in spread.items() if not n]
+    return state, placement.swarm_override(args.robomaker_cpus, memory_mb, max(spread.values()), excluded,
+                                           args.memory)
+
+
+def prepare(args, topology):
+    others = active_states(args.run_id)
+    if os.environ.get('DR_DOCKER_STYLE', 'compose').lower() == 'swarm':
+        # Sagemaker is started by rl_coach outside the swarm; only the replicas are placed.
+        state, override = prepare_swarm(args, others)
+    else:
+        existing = [placement.from_dict(a) for state in others for a in state.get('assignments', [])]
+        planner = placement.Planner(topology, existing, reserved_cores=args.reserved_cores)
+        assignments = placement.plan_run(planner, args.run_id, args.workers, args.robomaker_cpus,
+                                         args.sagemaker_cpus)
+        state = {'run_id': args.run_id, 'workers': args.workers, 'style': 'compose',
+                 'assignments': [placement.to_dict(a) for a in assignments]}
+        override = placement.compose_override(assignments, args.memory)
+    save_state(args.run_id, state)
+    path = os.path.join(state_dir(), 'compose-{}.yml'.format(args.run_id))
+    with open(path, 'w') as fh:
+        fh.write(override)
+    print(path)
+
+
+def sagemaker_container(run_id):
+    """Id of the Sagemaker algo container started for run_id, found by the RUN_ID in its environment."""
+    names = subprocess.run(['docker', 'ps', '--format', '{{.ID}}\t{{.Names}}'], stdout=subprocess.PIPE,
+                           stderr=subprocess.DEVNULL, universal_newlines=True).stdout.splitlines()
+    candidates = [line.split('\t')[0] for line in names if 'algo-' in line]
+    for container in docker_json(['inspect'] + candidates) if candidates else []:
+        if 'RUN_ID={}'.format(run_id) in container.get('Config', {}).get('Env', []):
+            return container['Id'][:12]
+    return None
+
+
+def apply(args):
+    state = load_state(args.run_id)
+    if state is None or not state.get('assignments'):
+        print("No placement stored for run {}.".format(args.run_id))
+        sys.exit(1)
+    pending = {(a['role'], a.get('replica')): placement.from_dict(a) for a in state['assignments']}
+    deadline = time.time() + args.wait
+    while pending:
+        containers = {}
+        for c in robomaker.DockerBackend().containers():
+            if c.run_id == args.run_id and c.stack == 'training':
+                containers[('robomaker', c.replica)] = c.id
+        if ('sagemaker', None) in pending:
+            containers[('sagemaker', None)] = sagemaker_container(args.run_id)
+        for key in list(pending):
+            if containers.get(key):
+                assignment = pending.pop(key)
+                result = subprocess.run(['docker', 'update'] + placement.docker_update_args(assignment, args.memory) +
+                                        [containers[key]], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                        universal_newlines=True)
+                label = key[0] if key[1] is None else '{} {}'.format(*key)
+                if result.returncode == 0:
+                    print("Pinned {} to CPUs {} (node {}).".format(label, placement.format_cpulist(assignment.cpus),
+                                                                 placement.format_cpulist(assignment.mems)))
+                else:
+                    print("Could not pin {}: {}".format(label, result.stderr.strip()))
+        if not pending or time.time() >= deadline:
+            break
+        time.sleep(5)
+    for role, replica in pending:
+        print("{} did not start; not pinned.".format(role if replica is None else '{} {}'.format(role, replica)))
+
+
+def main():
+    args = parse_args()
+    try:
+        topology = placement.synthetic_topology(args.topology) if args.topology else placement.read_topology()
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    try:
+        if args.command == 'plan':
+            if args.runs:
+                existing, runs = [], [tuple(int(v) for v in run.split(':')) for run in args.runs.split(',')]
+            else:
+                existing = [placement.from_dict(a) for state in active_states(args.run_id)
+                            for a in state.get('assignments', [])]
+                runs = [(args.run_id, args.workers)]
+            planner = placement.Planner(topology, existing, reserved_cores=args.reserved_cores)
+            planned = []
+            for run_id, workers in runs:
+                planned += placement.plan_run(planner, run_id, workers, args.robomaker_cpus, args.sagemaker_cpus)
+            print_plan(topology, existing + planned)
+        elif args.command == 'prepare':
+            prepare(args, topology)
+        elif args.command == 'apply':
+            apply(args)
+        elif args.command == 'release':
+            if os.path.isfile(state_path(args.run_id)):
+                os.remove(state_path(args.run_id))
+    except placement.PlacementError as e:
+        print("Placement not possible: {}".format(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
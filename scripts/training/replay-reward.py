@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import s3 as drs3
+from drfc import simtrace
+
+CHUNK_SIZE = 20000
+
+# Set in each pool worker by init_worker.
+_reward = None
+_waypoints = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Re-score the steps of recorded simtraces with one or more '
+                                                 'reward functions and compare per-episode totals.')
+    parser.add_argument('-r', '--reward', action='append', default=[],
+                        help='Reward function file; repeat to compare variants (default: custom_files/reward_function.py).')
+    parser.add_argument('-p', '--prefix', default=os.environ.get('DR_LOCAL_S3_MODEL_PREFIX'),
+                        help='Model prefix to read simtraces from (default: DR_LOCAL_S3_MODEL_PREFIX).')
+    parser.add_argument('-b', '--bucket', default=os.environ.get('DR_LOCAL_S3_BUCKET'))
+    parser.add_argument('-s', '--simtrace', default='training-simtrace', help='Simtrace folder below the prefix.')
+    parser.add_argument('-f', '--file', action='append', default=[], help='Local simtrace CSV instead of S3; repeatable.')
+    parser.add_argument('-t', '--track', help='Track route .npy; needed for waypoints, distance_from_center, track_width.')
+    parser.add_argument('--reversed', action='store_true', help='Simtraces were recorded in reverse direction.')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help='Processes for reward functions without reward_function_batch.')
+    parser.add_argument('-o', '--output', help='Write per-episode totals to this CSV file.')
+    return parser.parse_args()
+
+
+def init_worker(path, waypoints):
+    global _reward, _waypoints
+    _reward = simtrace.load_reward_module(path).reward_function
+    _waypoints = waypoints
+
+
+def score_chunk(params):
+    import numpy as np
+
+    n = len(params['steps'])
+    return np.array([_reward(simtrace.step_params(params, i, _waypoints)) for i in range(n)], dtype=float)
+
+
+def score(path, params, workers):
+    """Per-step rewards from one reward function file.
+
+    A module-level reward_function_batch(params) receives the params as
+    arrays and returns an array; otherwise reward_function is called per
+    step on a process pool.
+    """
+    import numpy as np
+
+    module = simtrace.load_reward_module(path)
+    if hasattr(module, 'reward_function_batch'):
+        return np.asarray(module.reward_function_batch(params), dtype=float), 'batched'
+
+    waypoints = [tuple(p) for p in params['waypoints'].tolist()] if 'waypoints' in params else None
+    # The first step is scored here, so a param the simtrace cannot provide fails before the pool starts.
+    module.reward_function(simtrace.step_params(params, 0, waypoints))
+    columns = {k: v for k, v in params.items() if k != 'waypoints'}
+    n = len(columns['steps'])
+    chunks = [{k: v[i:i + CHUNK_SIZE] for k, v in columns.items()} for i in range(0, n, CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(path, waypoints)) as executor:
+        return np.concatenate(list(executor.map(score_chunk, chunks))), 'per-step, {} processes'.format(workers)
+
+
+def distribution(values):
+    import numpy as np
+
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return 'mean {:10.3f}  p5 {:10.3f}  p50 {:10.3f}  p95 {:10.3f}  max {:10.3f}'.format(
+        float(np.mean(values)), p5, p50, p95, float(np.max(values)))
+
+
+def main():
+    import numpy as np
+
+    args = parse_args()
+    rewards = args.reward or [simtrace.default_reward_file()]
+
+    start = time.time()
+    if args.file:
+        table = simtrace.load_files(args.file)
+        source = ', '.join(args.file)
+    else:
+        if not args.bucket or not args.prefix:
+            print("Bucket and prefix must be given or set in the environment. Exiting.")
+            sys.exit(1)
+        prefix = '{}/{}/'.format(args.prefix.strip('/'), args.simtrace.strip('/'))
+        table = simtrace.load_s3(drs3.local_client(max_pool_connections=16), args.bucket, prefix)
+        source = 's3://{}/{}'.format(args.bucket, prefix)
+    if table is None:
+        print("No simtrace steps found in {}. Exiting.".format(source))
+        sys.exit(1)
+
+    track = simtrace.load_track(args.track) if args.track else None
+    params = simtrace.build_params(table, track, args.reversed)
+    episodes = {}
+    for key, rows in simtrace.episode_slices(table):
+        episodes.setdefault(key, []).append(rows)
+    print("Loaded {} steps in {} episodes from {} in {:.1f}s.".format(
+        len(table['steps']), len(episodes), source, time.time() - start))
+    if track is None:
+        print("No track given; waypoint based params are not available.")
+
+    def totals(step_rewards):
+        return np.array([sum(float(step_rewards[s].sum()) for s in slices) for slices in episodes.values()])
+
+    results = [('recorded', table['reward'])]
+    for path in rewards:
+        start = time.time()
+        try:
+            step_rewards, mode = score(path, params, args.workers)
+        except KeyError as e:
+            if track is None and e.args and e.args[0] in simtrace.TRACK_PARAMS:
+                print("{} uses params['{}'], which needs the track. Pass the route .npy of the track "
+                      "the simtrace was recorded on with -t. Exiting.".format(path, e.args[0]))
+                sys.exit(1)
+            raise
+        elapsed = time.time() - start
+        print("Scored {} with {} in {:.2f}s ({:.0f} steps/s).".format(
+            path, mode, elapsed, len(step_rewards) / max(elapsed, 1e-6)))
+        results.append((path, step_rewards))
+
+    for name, step_rewards in results:
+        print("")
+        print(name)
+        print("  per step:    {}".format(distribution(step_rewards)))
+        print("  per episode: {}".format(distribution(totals(step_rewards))))
+
+    if args.output:
+        episode_totals = [totals(r) for _, r in results]
+        progress = [float(max(table['progress'][s].max() for s in slices)) for slices in episodes.values()]
+        with open(args.output, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(['iteration', 'episode', 'steps', 'progress'] + [name for name, _ in results])
+            for i, (key, slices) in enumerate(episodes.items()):
+                steps = sum(s.stop - s.start for s in slices)
+                writer.writerow(list(key) + [steps, progress[i]] + [t[i] for t in episode_totals])
+        print("")
+        print("Episode totals written to {}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env bash
 
 source $DR_DIR/bin/scripts_wrapper.sh
+source $DR_DIR/bin/timing.sh
 
 usage() {
   echo "Usage: $0 [-w] [-q | -s | -r [n] | -a ] [-v]"
@@ -58,6 +59,9 @@ while getopts ":whqsavr:" opt; do
   esac
 done
 
+timing_init start-training
+timing_phase "check stack"
+
 ## Check if WSL2
 if grep -qi Microsoft /proc/version && grep -q "WSL2" /proc/version; then
     IS_WSL2="yes"
@@ -80,6 +84,7 @@ if [[ "${DR_DOCKER_STYLE,,}" == "swarm" ]]; then
 fi
 
 # Check if metadata-files are available
+timing_phase "fetch custom files"
 WORK_DIR=${DR_DIR}/tmp/start/
 mkdir -p ${WORK_DIR}
 rm -f ${WORK_DIR}/*
@@ -107,6 +112,7 @@ else
 fi
 
 # Check if model path exists.
+timing_phase "check model prefix"
 S3_PATH="s3://$DR_LOCAL_S3_BUCKET/$DR_LOCAL_S3_MODEL_PREFIX"
 
 S3_FILES=$(aws ${DR_LOCAL_PROFILE_ENDPOINT_URL} s3 ls ${S3_PATH} | wc -l)
@@ -116,11 +122,13 @@ if [[ "$S3_FILES" -gt 0 ]]; then
     exit 1
   else
     echo "Wiping path $S3_PATH."
+    timing_phase "wipe model prefix"
     aws ${DR_LOCAL_PROFILE_ENDPOINT_URL} s3 rm --recursive ${S3_PATH}
   fi
 fi
 
 # Base compose file
+timing_phase "prepare config"
 if [ ${DR_ROBOMAKER_MOUNT_LOGS,,} = "true" ]; then
   COMPOSE_FILES="$DR_TRAIN_COMPOSE_FILE $DR_DOCKER_FILE_SEP $DR_DIR/docker/docker-compose-mount.yml"
   export DR_MOUNT_DIR="$DR_DIR/data/logs/robomaker/$DR_LOCAL_S3_MODEL_PREFIX"
@@ -178,8 +186,19 @@ if [[ "${DR_HOST_X,,}" == "true" ]]; then
 
 fi
 
+# Pin containers to cores and NUMA nodes, next to the other runs on this host
+if [[ "${DR_PLACEMENT,,}" == "true" ]]; then
+  timing_phase "plan placement"
+  if PLACEMENT_FILE=$(python3 $DR_DIR/scripts/training/placement.py prepare); then
+    COMPOSE_FILES="$COMPOSE_FILES $DR_DOCKER_FILE_SEP $PLACEMENT_FILE"
+  else
+    echo "WARNING: Starting without CPU placement."
+  fi
+fi
+
 # Check if we will use Docker Swarm or Docker Compose
 if [[ "${DR_DOCKER_STYLE,,}" == "swarm" ]]; then
+  timing_phase "check swarm nodes"
   ROBOMAKER_NODES=$(docker node ls --format '{{.ID}}' | xargs docker inspect | jq '.[] | select (.Spec.Labels.Robomaker == "true") | .ID' | wc -l)
   if [[ "$ROBOMAKER_NODES" -eq 0 ]]; then
     echo "ERROR: No Swarm Nodes labelled for placement of Robomaker. Please add Robomaker node."
@@ -194,12 +213,20 @@ if [[ "${DR_DOCKER_STYLE,,}" == "swarm" ]]; then
     exit 1
   fi
 
+  timing_phase "stack deploy"
   DISPLAY=$ROBO_DISPLAY docker stack deploy $COMPOSE_FILES $STACK_NAME
 
 else
+  timing_phase "compose up"
   DISPLAY=$ROBO_DISPLAY docker compose $COMPOSE_FILES -p $STACK_NAME up -d --scale robomaker=$DR_WORKERS
+  if [[ -n "$PLACEMENT_FILE" ]]; then
+    # Replicas get their own cores, and Sagemaker once rl_coach has started it.
+    nohup python3 $DR_DIR/scripts/training/placement.py apply --wait 600 >$DR_DIR/tmp/placement/apply-$DR_RUN_ID.log 2>&1 &
+  fi
 fi
 
+timing_done
+
 # Viewer
 if [ -n "$OPT_VIEWER" ]; then
   (
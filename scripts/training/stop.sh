@@ -31,3 +31,5 @@ else
     export DR_CURRENT_PARAMS_FILE=""
     docker compose $COMPOSE_FILES -p $STACK_NAME down
 fi
+
+rm -f $DR_DIR/tmp/placement/run-$DR_RUN_ID.json
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import checkpoints
+from drfc import metrics
+from drfc import s3 as drs3
+from drfc import telegraf
+
+# Re-list the metrics prefix every this many polls to pick up files of workers that started later.
+RELIST_EVERY = 30
+
+
+def parse_args():
+    metrics_prefix = os.environ.get('DR_LOCAL_S3_METRICS_PREFIX')
+    parser = argparse.ArgumentParser(description='Follow TrainingMetrics.json during training, printing and sending '
+                                                 'per-iteration aggregates to telegraf, and run a hook on new best checkpoints.')
+    parser.add_argument('-p', '--prefix', default=os.environ.get('DR_LOCAL_S3_MODEL_PREFIX'),
+                        help='Model prefix (default: DR_LOCAL_S3_MODEL_PREFIX).')
+    parser.add_argument('-b', '--bucket', default=os.environ.get('DR_LOCAL_S3_BUCKET'))
+    parser.add_argument('-m', '--metrics-prefix', default=metrics_prefix,
+                        help='Prefix holding TrainingMetrics*.json (default: DR_LOCAL_S3_METRICS_PREFIX).')
+    parser.add_argument('-i', '--interval', type=float, default=10, help='Seconds between polls.')
+    parser.add_argument('-n', '--once', action='store_true', help='Poll once, print the aggregates and exit.')
+    parser.add_argument('--best-metric', default=os.environ.get('DR_TRAIN_BEST_MODEL_METRIC', 'progress'),
+                        choices=['progress', 'reward'])
+    parser.add_argument('--on-best', metavar='COMMAND',
+                        help='Shell command run when deepracer_checkpoints.json names a new best checkpoint; '
+                             'gets DR_BEST_CHECKPOINT and DR_LAST_CHECKPOINT in its environment.')
+    parser.add_argument('--no-telegraf', action='store_true', help='Do not send metrics to telegraf.')
+    return parser.parse_args()
+
+
+class CheckpointWatch:
+    """Conditional polling of deepracer_checkpoints.json; reports changes of the best checkpoint."""
+
+    def __init__(self, s3_client, bucket, prefix):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = '{}/model/{}'.format(prefix, checkpoints.CHECKPOINT_INDEX)
+        self.etag = None
+        self.best = None
+        self.index = None
+
+    def poll(self):
+        result = metrics.conditional_get(self.s3_client, self.bucket, self.key, self.etag)
+        if result == metrics.UNCHANGED or not result:
+            return None
+        body, self.etag = result
+        try:
+            self.index = checkpoints.parse_index(body)
+        except ValueError:
+            return None
+        best = self.index.get('best_checkpoint', {}).get('name')
+        if best and best != self.best:
+            previous, self.best = self.best, best
+            return previous, best
+        return None
+
+
+def metrics_keys(s3_client, bucket, prefix):
+    from drfc import transfer
+
+    return sorted(k for k in transfer.list_objects(s3_client, bucket, prefix.strip('/') + '/')
+                  if k.rsplit('/', 1)[-1].startswith('TrainingMetrics') and k.endswith('.json'))
+
+
+def worker_name(key):
+    name = key.rsplit('/', 1)[-1][len('TrainingMetrics'):-len('.json')].strip('_-')
+    return name or '0'
+
+
+def report(worker, phase, trial, fields, best):
+    lap = '{:6.2f}s'.format(fields['best_lap_time']) if fields['best_lap_time'] is not None else '     - '
+    text = "worker {:>2} {:<10} trial {:>4}: {:>3} episodes, progress {:6.2f}%, completed {:5.1f}%, " \
+           "reward {:9.2f}, best lap {}".format(worker, phase, trial, fields['episodes'], fields['progress_mean'],
+                                                fields['completion_rate'] * 100, fields['reward_mean'], lap)
+    if best is not None and phase == 'evaluation' and best[0] == trial:
+        text += '  (best)'
+    print(text)
+
+
+def run_hook(command, index):
+    env = dict(os.environ,
+               DR_BEST_CHECKPOINT=index.get('best_checkpoint', {}).get('name', ''),
+               DR_LAST_CHECKPOINT=index.get('last_checkpoint', {}).get('name', ''))
+    # Not waited for; a slow hook must not stall the watcher.
+    subprocess.Popen(command, shell=True, env=env)
+
+
+def main():
+    args = parse_args()
+    if not args.bucket or not args.prefix:
+        print("Bucket and prefix must be given or set in the environment. Exiting.")
+        sys.exit(1)
+    prefix = args.prefix.strip('/')
+    metrics_prefix = (args.metrics_prefix or '{}/metrics'.format(prefix)).strip('/')
+
+    s3_client = drs3.local_client()
+    sender = None if args.no_telegraf else telegraf.Sender()
+    tags = {'model': prefix, 'run_id': os.environ.get('DR_RUN_ID', '0')}
+    tails = {}
+    aggregates = {}
+    watch = CheckpointWatch(s3_client, args.bucket, prefix)
+
+    polls = 0
+    try:
+        while True:
+            try:
+                if polls % RELIST_EVERY == 0:
+                    for key in metrics_keys(s3_client, args.bucket, metrics_prefix):
+                        if key not in tails:
+                            tails[key] = metrics.MetricsTail(s3_client, args.bucket, key)
+                            aggregates[key] = metrics.Aggregates(args.best_metric)
+
+                lines = []
+                for key, tail in tails.items():
+                    entries, replaced = tail.poll()
+                    if replaced:
+                        aggregates[key] = metrics.Aggregates(args.best_metric)
+                    touched = aggregates[key].add(entries)
+                    worker = worker_name(key)
+                    for phase, trial in touched:
+                        fields = aggregates[key].trials[(phase, trial)].fields()
+                        if not args.once:
+                            report(worker, phase, trial, fields, aggregates[key].best)
+                        lines.append(telegraf.line('deepracer_training', dict(tags, worker=worker, phase=phase),
+                                                   dict(fields, trial=trial)))
+                    best = aggregates[key].best
+                    if touched and best is not None:
+                        lines.append(telegraf.line('deepracer_training_best', dict(tags, worker=worker),
+                                                   {'trial': best[0], args.best_metric: best[1]}))
+                if sender is not None:
+                    sender.send(lines)
+
+                change = watch.poll()
+                if change is not None:
+                    previous, best = change
+                    if previous is not None:
+                        print("New best checkpoint {} (was {}).".format(best, previous))
+                        if args.on_best:
+                            run_hook(args.on_best, watch.index)
+                polls += 1
+            except (BotoCoreError, ClientError) as e:
+                if args.once:
+                    raise
+                # S3 briefly unreachable or throttling; the tails resume from their offsets at the next poll.
+                print("Polling s3://{}/{} failed, retrying in {}s: {}".format(args.bucket, prefix, args.interval, e),
+                      file=sys.stderr, flush=True)
+                time.sleep(args.interval)
+                continue
+
+            if args.once:
+                for key, aggregate in aggregates.items():
+                    for (phase, trial), stats in sorted(aggregate.trials.items(), key=lambda i: (i[0][1], i[0][0])):
+                        report(worker_name(key), phase, trial, stats.fields(), aggregate.best)
+                if not tails:
+                    print("No TrainingMetrics files found below s3://{}/{}/".format(args.bucket, metrics_prefix))
+                if watch.best:
+                    print("Best checkpoint: {}".format(watch.best))
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import argparse
+import importlib.util
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+DEFAULT_BUDGET_MS = 5.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark a reward function before it is uploaded. '
+                                                 'Exits with 1 if the p99 latency is over budget and with 2 '
+                                                 'if the reward function cannot be loaded.')
+    parser.add_argument('reward', help='Reward function file.')
+    parser.add_argument('-n', '--calls', type=int, default=5000, help='Number of timed calls.')
+    parser.add_argument('-b', '--budget', type=float,
+                        default=float(os.environ.get('DR_REWARD_LATENCY_BUDGET_MS') or DEFAULT_BUDGET_MS),
+                        help='p99 latency budget in ms (default: DR_REWARD_LATENCY_BUDGET_MS or {}).'.format(
+                            DEFAULT_BUDGET_MS))
+    return parser.parse_args()
+
+
+def synthetic_track(count=180, a=8.0, b=4.0, width=1.07):
+    """Closed oval with count waypoints, roughly the size of the re:Invent tracks."""
+    return [(a * math.cos(2 * math.pi * i / count), b * math.sin(2 * math.pi * i / count)) for i in range(count)], width
+
+
+def synthetic_params(waypoints, width, rng):
+    """One realistic params dict: car somewhere near the track, heading roughly along it, three objects."""
+    count = len(waypoints)
+    prev_wp = rng.randrange(count)
+    next_wp = (prev_wp + 1) % count
+    (x0, y0), (x1, y1) = waypoints[prev_wp], waypoints[next_wp]
+    t = rng.random()
+    offset = rng.uniform(-0.6, 0.6) * width
+    dx, dy = x1 - x0, y1 - y0
+    length = math.hypot(dx, dy) or 1.0
+    x = x0 + dx * t - dy / length * offset
+    y = y0 + dy * t + dx / length * offset
+    objects = [waypoints[rng.randrange(count)] for _ in range(3)]
+    return {
+        'all_wheels_on_track': abs(offset) < width / 2,
+        'x': x,
+        'y': y,
+        'heading': math.degrees(math.atan2(dy, dx)) + rng.uniform(-20, 20),
+        'distance_from_center': abs(offset),
+        'is_left_of_center': offset > 0,
+        'is_crashed': False,
+        'is_offtrack': abs(offset) >= width / 2,
+        'is_reversed': False,
+        'progress': 100.0 * prev_wp / count,
+        'speed': rng.uniform(0.5, 4.0),
+        'steering_angle': rng.choice([-30.0, -15.0, 0.0, 15.0, 30.0]),
+        'steps': float(rng.randrange(1, 1000)),
+        'track_length': length * count,
+        'track_width': width,
+        'waypoints': waypoints,
+        'closest_waypoints': [prev_wp, next_wp],
+        'closest_objects': [0, 1],
+        'objects_location': objects,
+        'objects_left_of_center': [rng.random() < 0.5 for _ in objects],
+        'objects_speed': [0.0 for _ in objects],
+        'objects_heading': [0.0 for _ in objects],
+        'objects_distance': [rng.uniform(0, length * count) for _ in objects],
+    }
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100.0 * len(sorted_values)))]
+
+
+def main():
+    args = parse_args()
+    if not os.path.isfile(args.reward):
+        print("Reward function {} not found.".format(args.reward))
+        sys.exit(2)
+
+    start = time.perf_counter()
+    try:
+        spec = importlib.util.spec_from_file_location('reward_under_test', args.reward)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        sibling = os.path.join(os.path.dirname(os.path.abspath(args.reward)), '{}.py'.format(e.name))
+        if e.name and os.path.isfile(sibling):
+            print("{} imports {} from {}, but the simapp only downloads the reward function file. "
+                  "Paste the module into it instead.".format(args.reward, e.name, os.path.dirname(sibling)))
+            sys.exit(2)
+        # Modules such as rospy only exist inside the simapp.
+        print("WARNING: Cannot import {} outside robomaker ({}); latency not checked.".format(args.reward, e))
+        return
+    except Exception as e:
+        print("{} fails to load: {}: {}".format(args.reward, type(e).__name__, e))
+        sys.exit(2)
+    import_ms = (time.perf_counter() - start) * 1000
+
+    waypoints, width = synthetic_track()
+    rng = random.Random(0)
+    params = [synthetic_params(waypoints, width, rng) for _ in range(min(args.calls, 1000))]
+    reward_function = module.reward_function
+
+    try:
+        for p in params[:50]:
+            reward_function(dict(p))
+        timings = []
+        for i in range(args.calls):
+            p = dict(params[i % len(params)])
+            t0 = time.perf_counter_ns()
+            reward_function(p)
+            timings.append(time.perf_counter_ns() - t0)
+
+        # Peak memory allocated during a call, which includes temporaries freed before it returns.
+        tracemalloc.start()
+        sample = params[:200]
+        peak_bytes = 0
+        for p in sample:
+            p = dict(p)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            reward_function(p)
+            peak_bytes += tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+    except Exception as e:
+        print("WARNING: {} failed on synthetic params ({}: {}); latency not checked.".format(
+            args.reward, type(e).__name__, e))
+        return
+
+    timings.sort()
+    p50 = percentile(timings, 50) / 1e6
+    p99 = percentile(timings, 99) / 1e6
+    print("Reward function {}: import {:.1f} ms, call p50 {:.1f} us, p99 {:.1f} us, "
+          "{:.1f} KiB peak memory/call.".format(args.reward, import_ms, p50 * 1000, p99 * 1000,
+                                                peak_bytes / len(sample) / 1024))
+
+    if p99 > args.budget:
+        print("p99 latency {:.3f} ms exceeds the budget of {} ms.".format(p99, args.budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
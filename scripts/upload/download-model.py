@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import checkpoints
+from drfc import s3 as drs3
+from drfc import transfer
+
+THREADS = 16
+PART_SIZE = 8 * 1024 * 1024
+
+CONFIG_FILES = ['reward_function.py', 'model/model_metadata.json', 'ip/hyperparameters.json']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Download a model from S3 into a prefix of the local bucket.')
+    parser.add_argument('--source', required=True, help='s3://bucket/prefix')
+    parser.add_argument('--target-bucket', required=True)
+    parser.add_argument('--target-prefix', required=True)
+    parser.add_argument('--work-dir', required=True)
+    parser.add_argument('--checkpoint', choices=['best', 'last'], default=None,
+                        help='Only download this checkpoint from model/ instead of all of them.')
+    parser.add_argument('--config', action='store_true', help='Copy config files into custom_files.')
+    parser.add_argument('--dryrun', action='store_true')
+    parser.add_argument('--wipe', action='store_true', help='Delete target objects not in the source.')
+    parser.add_argument('--force', action='store_true', help='Do not ask for confirmation.')
+    return parser.parse_args()
+
+
+def split_url(url):
+    if not url.startswith('s3://'):
+        print("Source must be an S3 URL (s3://bucket/prefix). Exiting.")
+        sys.exit(1)
+    bucket, _, prefix = url[len('s3://'):].partition('/')
+    return bucket, prefix.strip('/')
+
+
+def main():
+    args = parse_args()
+    src_bucket, src_prefix = split_url(args.source)
+    tgt_bucket = args.target_bucket
+    tgt_prefix = args.target_prefix.strip('/')
+
+    source = drs3.upload_client(max_pool_connections=THREADS)
+    target = drs3.local_client(max_pool_connections=THREADS)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        f_source = executor.submit(transfer.list_objects, source, src_bucket, src_prefix + '/')
+        f_target = executor.submit(transfer.list_objects, target, tgt_bucket, tgt_prefix + '/')
+    # Keys ending in / are folder markers written by the console and some sync tools, not files.
+    objects = {k[len(src_prefix) + 1:]: v for k, v in f_source.result().items() if not k.endswith('/')}
+    target_objects = f_target.result()
+
+    if all(name in objects for name in CONFIG_FILES):
+        print("All meta-data files found. Source model {} valid.".format(args.source))
+    else:
+        print("Meta-data files are not found. Source model {} not valid. Exiting.".format(args.source))
+        sys.exit(1)
+
+    # Files written locally instead of downloaded, as upload-model.py does: name -> bytes
+    generated = {}
+    if args.checkpoint is not None:
+        index_key = 'model/' + checkpoints.CHECKPOINT_INDEX
+        if index_key not in objects:
+            print("No {} in source model. Exiting.".format(checkpoints.CHECKPOINT_INDEX))
+            sys.exit(1)
+        index = checkpoints.parse_index(transfer.read_object(source, src_bucket, '{}/{}'.format(src_prefix, index_key)))
+        name, index = checkpoints.select(index, args.checkpoint)
+        if name is None:
+            print("No {} checkpoint in {}. Exiting.".format(args.checkpoint, checkpoints.CHECKPOINT_INDEX))
+            sys.exit(1)
+        keep = checkpoints.number_of(name)
+        print("Downloading {} checkpoint {} only.".format(args.checkpoint, keep))
+        # The index and .coach_checkpoint must point at the one checkpoint downloaded.
+        generated = {
+            index_key: (json.dumps(index) + '\n').encode('utf-8'),
+            'model/.coach_checkpoint': (name + '\n').encode('utf-8'),
+        }
+        objects = {k: v for k, v in objects.items() if k not in generated and
+                   (checkpoints.checkpoint_number(k) in (None, keep) or not k.startswith('model/'))}
+
+    if not args.force:
+        print("Ready to download model {} to local {}".format(args.source, tgt_prefix))
+        response = input("Are you sure? [y/N] ")
+        if response.lower() not in ('y', 'yes'):
+            print("Aborting.")
+            sys.exit(1)
+
+    full_dir = os.path.join(args.work_dir, 'full')
+    os.makedirs(full_dir, exist_ok=True)
+    journal = transfer.DownloadJournal(os.path.join(args.work_dir, 'journal.json'), args.source)
+    if not journal.entries and not args.dryrun:
+        # Different or no previous source; nothing on disk can be resumed.
+        shutil.rmtree(full_dir)
+        os.makedirs(full_dir)
+
+    start = time.time()
+    stats = {'downloaded': 0, 'skipped': 0, 'unverified': 0, 'failed': 0}
+
+    # Plan ranged parts for everything not already verified on disk.
+    parts = []
+    pending = []
+    for name, obj in sorted(objects.items()):
+        path = os.path.join(full_dir, name)
+        entry = journal.entry(name, obj['ETag'], obj['Size'])
+        if entry['verified'] and os.path.isfile(path):
+            stats['skipped'] += obj['Size']
+            continue
+        part_path = path + '.part'
+        if args.dryrun:
+            print("(dryrun) download: s3://{}/{}/{}".format(src_bucket, src_prefix, name))
+            continue
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        if not os.path.isfile(part_path) or os.path.getsize(part_path) != obj['Size']:
+            entry['parts'] = []
+            with open(part_path, 'wb') as fh:
+                fh.truncate(obj['Size'])
+        pending.append(name)
+        for number, offset in enumerate(range(0, obj['Size'], PART_SIZE)):
+            if number in entry['parts']:
+                stats['skipped'] += min(PART_SIZE, obj['Size'] - offset)
+            else:
+                parts.append((name, number, offset, min(offset + PART_SIZE, obj['Size']) - 1))
+
+    def fetch(part):
+        name, number, first, last = part
+        size = transfer.download_part(source, src_bucket, '{}/{}'.format(src_prefix, name),
+                                      os.path.join(full_dir, name) + '.part', first, last)
+        journal.part_done(name, number)
+        return size
+
+    def verify(name):
+        path = os.path.join(full_dir, name)
+        result = transfer.verify_etag(path + '.part', objects[name]['ETag'], objects[name]['Size'])
+        if result is False:
+            os.remove(path + '.part')
+        else:
+            os.replace(path + '.part', path)
+        journal.set_verified(name, result is not False)
+        return result
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        stats['downloaded'] = sum(executor.map(fetch, parts))
+        for result in executor.map(verify, pending):
+            if result is None:
+                stats['unverified'] += 1
+            elif result is False:
+                stats['failed'] += 1
+    elapsed = time.time() - start
+
+    if stats['failed'] > 0:
+        print("{} files failed checksum verification and were discarded. Run again to retry.".format(stats['failed']))
+        sys.exit(1)
+
+    etags = {name: obj['ETag'] for name, obj in objects.items()}
+    for name, data in generated.items():
+        etags[name] = hashlib.md5(data).hexdigest()
+        if not args.dryrun:
+            os.makedirs(os.path.dirname(os.path.join(full_dir, name)), exist_ok=True)
+            with open(os.path.join(full_dir, name), 'wb') as fh:
+                fh.write(data)
+
+    # Push into the local bucket; objects whose ETag already matches are left alone.
+    uploads = [name for name in etags if target_objects.get('{}/{}'.format(tgt_prefix, name), {}).get('ETag')
+               != etags[name]]
+    stale = []
+    if args.wipe:
+        wanted = set('{}/{}'.format(tgt_prefix, name) for name in etags)
+        stale = [k for k in target_objects if k not in wanted and not k.endswith('/')]
+    # Files generated by an earlier --checkpoint run that this run neither generates nor downloads, such as a
+    # .coach_checkpoint pointing at the one checkpoint kept then; the target copy only goes if it is still ours.
+    for name, etag in journal.generated.items():
+        if name in etags:
+            continue
+        key = '{}/{}'.format(tgt_prefix, name)
+        if target_objects.get(key, {}).get('ETag') == etag and key not in stale:
+            stale.append(key)
+        if not args.dryrun and os.path.isfile(os.path.join(full_dir, name)):
+            os.remove(os.path.join(full_dir, name))
+
+    if args.dryrun:
+        for name in sorted(uploads):
+            print("(dryrun) upload: {} to s3://{}/{}/{}".format(name, tgt_bucket, tgt_prefix, name))
+        for key in sorted(stale):
+            print("(dryrun) delete: s3://{}/{}".format(tgt_bucket, key))
+    else:
+        def upload(name):
+            target.upload_file(os.path.join(full_dir, name), tgt_bucket, '{}/{}'.format(tgt_prefix, name))
+
+        with ThreadPoolExecutor(max_workers=THREADS) as executor:
+            list(executor.map(upload, uploads))
+        if stale:
+            transfer.delete_keys(target, tgt_bucket, stale)
+        journal.set_generated({name: etags[name] for name in generated})
+
+        if args.config:
+            print("Copy configuration to custom_files")
+            for name in CONFIG_FILES:
+                shutil.copy(os.path.join(full_dir, name), os.path.join(os.environ.get('DR_DIR'), 'custom_files'))
+
+    mb = 1024 * 1024
+    print("Downloaded {:.1f} MB in {:.1f}s ({:.1f} MB/s), {:.1f} MB resumed or already present.".format(
+        stats['downloaded'] / mb, elapsed, stats['downloaded'] / mb / max(elapsed, 0.001), stats['skipped'] / mb))
+    if stats['unverified'] > 0:
+        print("{} multipart objects could only be checked by size.".format(stats['unverified']))
+    print("Uploaded {} objects to s3://{}/{}/, {} unchanged, {} deleted.".format(
+        len(uploads), tgt_bucket, tgt_prefix, len(etags) - len(uploads), len(stale)))
+
+
+if __name__ == '__main__':
+    main()
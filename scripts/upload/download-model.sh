@@ -1,11 +1,12 @@
 #!/bin/bash
 
 usage() {
-  echo "Usage: $0 [-f] [-w] [-d] -s <source-prefix> -t <target-prefix>"
+  echo "Usage: $0 [-f] [-w] [-d] [-c] [-k <best|last>] -s <source-prefix> -t <target-prefix>"
   echo "       -f                Force download. No confirmation question."
   echo "       -w                Wipes the target AWS DeepRacer model structure before upload."
   echo "       -d                Dry-Run mode. Does not perform any write or delete operatios on target."
   echo "       -c                Copy config files into custom_files."
+  echo "       -k best|last      Only download the best or last checkpoint of the model."
   echo "       -s source-url     Downloads model from specified S3 URL (s3://bucket/prefix)."
   echo "       -t target-prefix  Downloads model into specified prefix in local storage."
   exit 1
@@ -18,7 +19,7 @@ function ctrl_c() {
   exit 1
 }
 
-while getopts "s:t:fwcdh" opt; do
+while getopts "s:t:k:fwcdh" opt; do
   case $opt in
   f)
     OPT_FORCE="True"
@@ -35,6 +36,13 @@ while getopts "s:t:fwcdh" opt; do
   t)
     OPT_TARGET="$OPTARG"
     ;;
+  k)
+    if [[ "$OPTARG" != "best" && "$OPTARG" != "last" ]]; then
+      echo "Option -k must be 'best' or 'last'." >&2
+      usage
+    fi
+    OPT_CHECKPOINT="$OPTARG"
+    ;;
   s)
     OPT_SOURCE="$OPTARG"
     ;;
@@ -66,42 +74,19 @@ if [[ -z "${TARGET_S3_PREFIX}" ]]; then
   exit 1
 fi
 
-SOURCE_REWARD_FILE_S3_KEY="${SOURCE_S3_URL}/reward_function.py"
-SOURCE_HYPERPARAM_FILE_S3_KEY="${SOURCE_S3_URL}/ip/hyperparameters.json"
-SOURCE_METADATA_S3_KEY="${SOURCE_S3_URL}/model/model_metadata.json"
-
 WORK_DIR=${DR_DIR}/tmp/download
-mkdir -p ${WORK_DIR} && rm -rf ${WORK_DIR} && mkdir -p ${WORK_DIR}/config ${WORK_DIR}/full
-
-# Check if metadata-files are available
-REWARD_FILE=$(aws ${DR_UPLOAD_PROFILE} s3 cp "${SOURCE_REWARD_FILE_S3_KEY}" ${WORK_DIR}/config/ --no-progress | awk '/reward/ {print $4}' | xargs readlink -f 2>/dev/null)
-METADATA_FILE=$(aws ${DR_UPLOAD_PROFILE} s3 cp "${SOURCE_METADATA_S3_KEY}" ${WORK_DIR}/config/ --no-progress | awk '/model_metadata.json$/ {print $4}' | xargs readlink -f 2>/dev/null)
-HYPERPARAM_FILE=$(aws ${DR_UPLOAD_PROFILE} s3 cp "${SOURCE_HYPERPARAM_FILE_S3_KEY}" ${WORK_DIR}/config/ --no-progress | awk '/hyperparameters.json$/ {print $4}' | xargs readlink -f 2>/dev/null)
-
-if [ -n "$METADATA_FILE" ] && [ -n "$REWARD_FILE" ] && [ -n "$HYPERPARAM_FILE" ]; then
-  echo "All meta-data files found. Source model ${SOURCE_S3_URL} valid."
-else
-  echo "Meta-data files are not found. Source model ${SOURCE_S3_URL} not valid. Exiting."
-  exit 1
-fi
-
-# Upload files
-if [[ -z "${OPT_FORCE}" ]]; then
-  echo "Ready to download model ${SOURCE_S3_URL} to local ${TARGET_S3_PREFIX}"
-  read -r -p "Are you sure? [y/N] " response
-  if [[ ! "$response" =~ ^([yY][eE][sS]|[yY])$ ]]; then
-    echo "Aborting."
-    exit 1
-  fi
-fi
-
-cd ${WORK_DIR}
-aws ${DR_UPLOAD_PROFILE} s3 sync "${SOURCE_S3_URL}" ${WORK_DIR}/full/ ${OPT_DRYRUN}
-aws ${DR_LOCAL_PROFILE_ENDPOINT_URL} s3 sync ${WORK_DIR}/full/ s3://${TARGET_S3_BUCKET}/${TARGET_S3_PREFIX}/ ${OPT_DRYRUN} ${OPT_WIPE}
-
-if [[ -n "${OPT_CONFIG}" ]]; then
-  echo "Copy configuration to custom_files"
-  cp ${WORK_DIR}/config/* ${DR_DIR}/custom_files/
-fi
+mkdir -p ${WORK_DIR}
+
+# Lists the source once, downloads in parallel ranged parts with a resume
+# journal in $WORK_DIR, verifies checksums and then pushes into the local bucket.
+DOWNLOAD_ARGS=(--source "${SOURCE_S3_URL}" --target-bucket "${TARGET_S3_BUCKET}" --target-prefix "${TARGET_S3_PREFIX}"
+  --work-dir "${WORK_DIR}")
+[[ -n "${OPT_CHECKPOINT}" ]] && DOWNLOAD_ARGS+=(--checkpoint "${OPT_CHECKPOINT}")
+[[ -n "${OPT_CONFIG}" ]] && DOWNLOAD_ARGS+=(--config)
+[[ -n "${OPT_DRYRUN}" ]] && DOWNLOAD_ARGS+=(--dryrun)
+[[ -n "${OPT_WIPE}" ]] && DOWNLOAD_ARGS+=(--wipe)
+[[ -n "${OPT_FORCE}" ]] && DOWNLOAD_ARGS+=(--force)
+
+python3 $DR_DIR/scripts/upload/download-model.py "${DOWNLOAD_ARGS[@]}" || exit 1
 
 echo "Done."
@@ -10,13 +10,15 @@ import yaml
 from botocore.loaders import UnknownServiceError
 
 try:
-    import pandas as pd
     import deepracer
     from deepracer import boto3_enhancer
 except ImportError:
-    print("You need to install pandas and deepracer-utils to use the import function.")
+    print("You need to install deepracer-utils to use the import function.")
     exit(1)
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import arns
+
 # Read in command 
 aws_profile = sys.argv[1]
 aws_s3_role = sys.argv[2]
@@ -41,18 +43,11 @@ except UnknownServiceError:
     print ("Install with 'pip install deepracer-utils' and 'python -m deepracer install-cli --force'")
     exit(1)
 
-# Load model to check if it already exists
-a = dr.list_models(ModelType='REINFORCEMENT_LEARNING', MaxResults=25)
-model_dict = a['Models']
-while "NextToken" in a:
-    a = dr.list_models(ModelType='REINFORCEMENT_LEARNING', MaxResults=25, NextToken=a["NextToken"])
-    model_dict.extend(a['Models'])
-
-models = pd.DataFrame.from_dict(model_dict)
-
-if models.size > 0:
-    if models[models['ModelName']==dr_model_name].size > 0:
-        sys.exit('Model {} already exists.'.format(dr_model_name))
+# Check if the model already exists; a cached ARN is checked with get_model, since a model
+# deleted in the console would otherwise block its re-import until the entry expires.
+arn_cache = arns.ArnCache(arns.cache_path(aws_profile if len(aws_profile) > 1 else None))
+if arns.find_model(dr, dr_model_name, arn_cache, verify=True) is not None:
+    sys.exit('Model {} already exists.'.format(dr_model_name))
 
 # Import from S3
 print('Importing from s3://{}/{}'.format(aws_s3_bucket,aws_s3_prefix))
@@ -60,5 +55,7 @@ response = dr.import_model(Name=dr_model_name, ModelArtifactsS3Path='s3://{}/{}'
 
 if response['ResponseMetadata']['HTTPStatusCode'] == 200:
     print('Model importing as {}'.format(response['ModelArn']))
+    arn_cache.put(arns.MODELS, dr_model_name, response['ModelArn'])
+    arn_cache.save()
 else:
     sys.exit('Error occcured when uploading')
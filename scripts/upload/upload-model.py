@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+from drfc import checkpoints
+from drfc import config as drconfig
+from drfc import s3 as drs3
+from drfc import transfer
+
+THREADS = 16
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Stage a model from the local bucket and upload it to a target prefix.')
+    parser.add_argument('--source-bucket', required=True)
+    parser.add_argument('--source-prefix', required=True)
+    parser.add_argument('--source-reward', required=True, help='Reward function key used if none is in the model prefix.')
+    parser.add_argument('--source-metrics', required=True)
+    parser.add_argument('--target-bucket', required=True)
+    parser.add_argument('--target-prefix', required=True)
+    parser.add_argument('--local', action='store_true', help='Target is the local bucket; use server-side copies.')
+    parser.add_argument('--best', action='store_true', help='Upload best checkpoint instead of last.')
+    parser.add_argument('--checkpoint', type=int, default=None, help='Upload a specific checkpoint number.')
+    parser.add_argument('--dryrun', action='store_true')
+    parser.add_argument('--wipe', action='store_true', help='Delete target model/ objects not part of this upload.')
+    parser.add_argument('--force', action='store_true', help='Do not ask for confirmation.')
+    return parser.parse_args()
+
+
+def s3_url(bucket, key):
+    return 's3://{}/{}'.format(bucket, key)
+
+
+def main():
+    args = parse_args()
+    start = time.time()
+
+    src_bucket = args.source_bucket
+    src_prefix = args.source_prefix.strip('/')
+    tgt_bucket = args.target_bucket
+    tgt_prefix = args.target_prefix.strip('/')
+
+    source = drs3.local_client(max_pool_connections=THREADS)
+    target = source if args.local else drs3.upload_client(max_pool_connections=THREADS)
+
+    def src(key):
+        return '{}/{}'.format(src_prefix, key)
+
+    def tgt(key):
+        return '{}/{}'.format(tgt_prefix, key)
+
+    metrics_prefix = args.source_metrics.strip('/') + '/'
+
+    # Fetch the small metadata objects and the listings in one concurrent round.
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        f_reward_root = executor.submit(transfer.read_object, source, src_bucket, src('reward_function.py'))
+        f_reward = executor.submit(transfer.read_object, source, src_bucket, args.source_reward)
+        f_metadata = executor.submit(transfer.read_object, source, src_bucket, src('model/model_metadata.json'))
+        f_hyper = executor.submit(transfer.read_object, source, src_bucket, src('ip/hyperparameters.json'))
+        f_index = executor.submit(transfer.read_object, source, src_bucket, src('model/' + checkpoints.CHECKPOINT_INDEX))
+        f_model = executor.submit(transfer.list_objects, source, src_bucket, src('model/'))
+        f_metrics = executor.submit(transfer.list_objects, source, src_bucket, metrics_prefix)
+        f_target = executor.submit(transfer.list_objects, target, tgt_bucket, tgt_prefix + '/')
+
+    reward = f_reward_root.result()
+    if reward is None:
+        print("Looking for Reward Function in {}".format(s3_url(src_bucket, args.source_reward)))
+        reward = f_reward.result()
+    metadata = f_metadata.result()
+    hyperparameters = f_hyper.result()
+    metrics = f_metrics.result()
+
+    if metadata is not None and reward is not None and hyperparameters is not None and metrics:
+        print("All meta-data files found. Looking for checkpoint.")
+    else:
+        print("Meta-data files are not found. Exiting.")
+        sys.exit(1)
+
+    print("Looking for model to upload from {}/".format(s3_url(src_bucket, src_prefix)))
+    index_data = f_index.result()
+    if index_data is None:
+        print("No checkpoint file available at {}. Exiting.".format(s3_url(src_bucket, src('model'))))
+        sys.exit(1)
+
+    model_objects = f_model.result()
+    if args.checkpoint is not None:
+        print("Checking for checkpoint {}".format(args.checkpoint))
+        checkpoint_file, index = checkpoints.select(None, names=model_objects.keys(), number=args.checkpoint)
+    elif args.best:
+        print("Checking for best checkpoint")
+        checkpoint_file, index = checkpoints.select(checkpoints.parse_index(index_data), 'best')
+    else:
+        print("Checking for latest tested checkpoint")
+        checkpoint_file, index = checkpoints.select(checkpoints.parse_index(index_data), 'last')
+
+    if checkpoint_file is None:
+        print("Checkpoint not found. Exiting.")
+        sys.exit(1)
+    checkpoint = checkpoints.number_of(checkpoint_file)
+    print("Using checkpoint {}".format(checkpoint))
+
+    checkpoint_keys = [k for k in model_objects if checkpoints.checkpoint_number(k) == checkpoint]
+    if len(checkpoint_keys) == 0:
+        print("No model files found. Files possibly deleted. Try again.")
+        sys.exit(1)
+
+    # Target plan: key -> (source hash, generated bytes or source key, size)
+    env = dict(os.environ)
+    env['TARGET_S3_BUCKET'] = tgt_bucket
+    env['TARGET_S3_PREFIX'] = tgt_prefix
+    _, params_yaml = drconfig.load_template('upload', env)
+
+    generated = {
+        tgt('model/model_metadata.json'): metadata,
+        tgt('model/.coach_checkpoint'): (checkpoint_file + '\n').encode('utf-8'),
+        tgt('model/' + checkpoints.CHECKPOINT_INDEX): (json.dumps(index) + '\n').encode('utf-8'),
+        tgt('reward_function.py'): reward,
+        tgt('training_params.yaml'): params_yaml.encode('utf-8'),
+        tgt('ip/hyperparameters.json'): hyperparameters,
+        tgt('model_metadata.json'): metadata,
+    }
+    copied = {tgt('model/' + checkpoints.basename(k)): k for k in checkpoint_keys}
+    for key in metrics:
+        copied[tgt('metrics/' + key[len(metrics_prefix):])] = key
+    source_objects = dict(model_objects)
+    source_objects.update(metrics)
+
+    plan = {}
+    for key, data in generated.items():
+        plan[key] = drs3.content_hash(data)
+    for key, source_key in copied.items():
+        plan[key] = '{}:{}'.format(source_objects[source_key]['ETag'], source_objects[source_key]['Size'])
+
+    target_objects = f_target.result()
+    manifest = transfer.Manifest(transfer.manifest_path(os.environ.get('DR_DIR', '.'), tgt_bucket, tgt_prefix))
+    changed = [k for k in plan if not manifest.unchanged(k, plan[k], target_objects)]
+    stale = []
+    if args.wipe:
+        stale = [k for k in target_objects if k.startswith(tgt('model/')) and k not in plan]
+
+    if not args.force:
+        print("Ready to upload model {} to {}/".format(src_prefix, s3_url(tgt_bucket, tgt_prefix)))
+        response = input("Are you sure? [y/N] ")
+        if response.lower() not in ('y', 'yes'):
+            print("Aborting.")
+            sys.exit(1)
+
+    if args.dryrun:
+        for key in sorted(changed):
+            origin = s3_url(src_bucket, copied[key]) if key in copied else 'generated'
+            print("(dryrun) upload: {} to {}".format(origin, s3_url(tgt_bucket, key)))
+        for key in sorted(stale):
+            print("(dryrun) delete: {}".format(s3_url(tgt_bucket, key)))
+        print("{} objects to upload, {} unchanged, {} to delete.".format(len(changed), len(plan) - len(changed), len(stale)))
+        return
+
+    def upload(key):
+        if key in generated:
+            transfer.put_bytes(target, tgt_bucket, key, generated[key])
+            return len(generated[key])
+        source_key = copied[key]
+        size = source_objects[source_key]['Size']
+        if args.local:
+            transfer.server_copy(source, src_bucket, source_key, tgt_bucket, key, size)
+        else:
+            transfer.stream_copy(source, src_bucket, source_key, target, tgt_bucket, key)
+        return size
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        uploaded_bytes = sum(executor.map(upload, changed))
+
+    if stale:
+        errors = transfer.delete_keys(target, tgt_bucket, stale)
+        for error in errors:
+            print("Failed to delete {}: {}".format(s3_url(tgt_bucket, error['Key']), error.get('Message')))
+        for key in stale:
+            manifest.forget(key)
+
+    # Record the ETags the target assigned, for the next run's comparison.
+    target_objects = transfer.list_objects(target, tgt_bucket, tgt_prefix + '/')
+    for key in plan:
+        if key in target_objects:
+            manifest.record(key, plan[key], target_objects[key]['ETag'])
+    manifest.save()
+
+    print("Uploaded {} objects ({:.1f} MB), {} unchanged, {} deleted in {:.1f}s.".format(
+        len(changed), uploaded_bytes / 1024 / 1024, len(plan) - len(changed), len(stale), time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
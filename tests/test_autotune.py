@@ -0,0 +1,58 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+from drfc import autotune
+
+
+def search(capacity, contention, cpu_per_worker=None, **kwargs):
+    """WorkerSearch run over the simulated curve of a host with `capacity` real-time workers."""
+    def measure(workers):
+        result = {'throughput': autotune.simulated_throughput(workers, capacity, contention)}
+        if cpu_per_worker is not None:
+            result['cpu'] = min(1.0, workers * cpu_per_worker)
+        return result
+
+    return autotune.run_search(autotune.WorkerSearch(kwargs.pop('max_workers', 12), **kwargs), measure)
+
+
+class WorkerSearchTest(unittest.TestCase):
+
+    def test_stops_past_the_peak(self):
+        result = search(4, 0.02)
+        self.assertEqual(result.recommendation(), 4)
+        self.assertTrue(result.reason.startswith('throughput fell below'))
+        # 5 workers are within tolerance of the peak; 6 fall short and end the search.
+        self.assertEqual(sorted(result.results), [1, 2, 3, 4, 5, 6])
+
+    def test_patience_measures_more_counts_past_the_peak(self):
+        result = search(3, 0.05, patience=2)
+        self.assertEqual(result.recommendation(), 3)
+        self.assertEqual(max(result.results), 5)
+
+    def test_stops_on_a_plateau(self):
+        result = search(6, 0.0)
+        self.assertEqual(result.recommendation(), 6)
+        self.assertEqual(result.reason, 'throughput stopped rising at 6 workers')
+        self.assertEqual(max(result.results), 8)
+
+    def test_stops_when_the_cpu_saturates(self):
+        result = search(8, 0.0, cpu_per_worker=1 / 6.0)
+        self.assertEqual(result.recommendation(), 6)
+        self.assertTrue(result.reason.startswith('host CPU saturated'))
+        self.assertEqual(max(result.results), 6)
+
+    def test_stops_at_max_workers(self):
+        result = search(8, 0.0, max_workers=5)
+        self.assertEqual(result.recommendation(), 5)
+        self.assertEqual(result.reason, 'reached the maximum of 5 workers')
+
+    def test_steps(self):
+        result = search(4, 0.02, step=2)
+        self.assertEqual(sorted(result.results), [1, 3, 5, 7])
+        self.assertEqual(result.recommendation(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import unittest
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+from drfc import arns
+
+spec = importlib.util.spec_from_file_location('submit_monitor', os.path.join(ROOT, 'utils', 'submit-monitor.py'))
+submit_monitor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(submit_monitor)
+
+MODEL_ARN = 'arn:aws:deepracer:us-east-1:123456789012:model/reinforcement_learning/my-model'
+LEADERBOARD_ARN = 'arn:aws:deepracer:::leaderboard/guid-1'
+
+
+class Done(Exception):
+    """Raised by the fake client once its script is used up, to end watch()."""
+
+
+def submission(time, status):
+    return {'ActivityArn': 'arn:aws:deepracer:::leaderboard_evaluation_job/job-{}'.format(time),
+            'SubmissionTime': time, 'LeaderboardSubmissionStatusType': status}
+
+
+class FakeDeepRacer:
+    """Stands in for the deepracer client; get_latest_user_submission replays `script`.
+
+    Entries of the script are returned, or raised if they are exceptions.
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.submitted = []
+
+    def list_models(self, **kwargs):
+        return {'Models': [{'ModelName': 'my-model', 'ModelArn': MODEL_ARN}]}
+
+    def list_leaderboards(self, **kwargs):
+        return {'Leaderboards': [{'Arn': LEADERBOARD_ARN}]}
+
+    def get_latest_user_submission(self, LeaderboardArn):
+        if not self.script:
+            raise Done()
+        result = self.script.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return {'LeaderboardSubmission': result}
+
+    def create_leaderboard_submission(self, ModelArn, LeaderboardArn):
+        self.submitted.append((ModelArn, LeaderboardArn))
+        return {}
+
+
+class WatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {name: getattr(submit_monitor, name) for name in ('dr', 'POLL_ACTIVE', 'POLL_IDLE')}
+        submit_monitor.POLL_ACTIVE = 0
+        submit_monitor.POLL_IDLE = 0
+        self.options = {'logs_path': None, 'download_logs': False, 'download_videos': False, 'verbose': False,
+                        'create_summary': False}
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(submit_monitor, name, value)
+
+    def watch(self, script):
+        submit_monitor.dr = FakeDeepRacer(script)
+        with self.assertRaises(Done):
+            asyncio.run(submit_monitor.watch(('my-model', 'guid-1'), self.options, arns.ArnCache(None), None))
+        return submit_monitor.dr
+
+    def test_resubmits_once_per_finished_submission(self):
+        dr = self.watch([submission(1, 'RUNNING'), submission(1, 'SUCCESS'), submission(1, 'SUCCESS'),
+                         submission(2, 'QUEUED')])
+        self.assertEqual(dr.submitted, [(MODEL_ARN, LEADERBOARD_ARN)])
+
+    def test_survives_transient_errors(self):
+        throttled = ClientError({'Error': {'Code': 'ThrottlingException'}}, 'GetLatestUserSubmission')
+        unreachable = EndpointConnectionError(endpoint_url='https://deepracer.us-east-1.amazonaws.com')
+        dr = self.watch([unreachable, throttled, unreachable, submission(1, 'FAILED')])
+        self.assertEqual(dr.submitted, [(MODEL_ARN, LEADERBOARD_ARN)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#
+# Serves the parts of the Docker Engine API that the log tools use on a unix
+# socket, with made-up Robomaker, rl_coach and Sagemaker containers writing
+# log lines, so the log multiplexer and the Sagemaker metrics exporter can be
+# tried without Docker:
+#
+#   python3 utils/fake-docker-api.py -s /tmp/fake-docker.sock -w 4,2 &
+#   DOCKER_HOST=unix:///tmp/fake-docker.sock dr-logs-all -a
+#   DOCKER_HOST=unix:///tmp/fake-docker.sock dr-watch-sagemaker-metrics -r 1
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import struct
+import time
+from urllib.parse import parse_qs, urlparse
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Fake Docker Engine API with DeepRacer containers writing logs.')
+    parser.add_argument('-s', '--socket', default='/tmp/fake-docker.sock')
+    parser.add_argument('-w', '--workers', default='2', metavar='WORKERS[,WORKERS...]',
+                        help='Robomaker workers of run 0, 1, ...')
+    parser.add_argument('--rate', type=float, default=20, help='Log lines per second per container.')
+    parser.add_argument('--speed', type=float, default=1, help='Speed-up of the log lines followed.')
+    return parser.parse_args()
+
+
+def container(name, env=()):
+    container_id = hashlib.sha256(name.encode('utf-8')).hexdigest()
+    return {'Id': container_id, 'Names': ['/' + name], 'State': 'running', 'Config': {'Tty': False, 'Env': list(env)}}
+
+
+def fake_containers(spec):
+    found = []
+    for run_id, workers in enumerate(int(n) for n in spec.split(',')):
+        found.append(container('deepracer-{}-rl_coach-1'.format(run_id), ['RUN_ID={}'.format(run_id)]))
+        found.append(container('tmp{}xyz-algo-1-abcde'.format(run_id), ['RUN_ID={}'.format(run_id)]))
+        for replica in range(1, workers + 1):
+            found.append(container('deepracer-{}-robomaker-{}'.format(run_id, replica), ['RUN_ID={}'.format(run_id)]))
+    return found
+
+
+def log_line(name, step):
+    if random.random() < 0.8:
+        return 1, 'SIM_TRACE_LOG:{},{},1.0,2.0,0.5,-10.0,0.1,3,1.0,False,True,{:.2f},3,17.6,{:.3f},' \
+                  'in_progress,'.format(step // 100, step, step % 100 / 10, time.time())
+    if random.random() < 0.05:
+        return 2, '[ERROR] [{:.3f}]: Failed to fetch model checkpoint, retrying'.format(time.time())
+    if random.random() < 0.1:
+        return 1, '[WARN] [{:.3f}]: Real time factor below 0.8'.format(time.time())
+    return 1, '[INFO] [{:.3f}]: Episode step {}'.format(time.time(), step)
+
+
+def trainer_lines():
+    """(seconds before, stream, text) of a Sagemaker log: coach waiting for episodes, then a policy update."""
+    iteration, episode, steps = 0, 0, 0
+    while True:
+        episode += 20
+        steps += random.randint(2000, 4000)
+        yield random.uniform(20, 40), 1, 'Training> Name=main_level/agent, Worker=0, Episode={}, ' \
+                                         'Total reward={:.2f}, Steps={}, Training iteration={}'.format(
+                                             episode, random.uniform(5, 60), steps, iteration)
+        for epoch in range(10):
+            yield random.uniform(1.2, 1.6), 1, 'Policy training> Surrogate loss={:.6f}, KL divergence={:.6f}, ' \
+                                               'Entropy={:.6f}, training epoch={}, learning_rate=0.0003'.format(
+                                                   -random.random() / 10, random.random() / 50,
+                                                   2.0 - iteration * 0.01 + random.random() / 10, epoch)
+        yield 0.5, 1, "Checkpoint> Saving in path=['./checkpoint/agent/{}_Step-{}.ckpt']".format(iteration, steps)
+        if random.random() < 0.1:
+            yield 0.1, 2, 'ERROR:tensorflow:Training step failed\n' \
+                          'Traceback (most recent call last):\n  File "train.py"'
+        iteration += 1
+
+
+def log_entries(name, rate):
+    """(seconds before, stream, text) of every line of a container's log."""
+    if '-algo-' in name:
+        yield from trainer_lines()
+    step = 0
+    while True:
+        step += 1
+        if 'robomaker' in name:
+            yield (random.expovariate(rate),) + log_line(name, step)
+        else:
+            yield random.expovariate(rate), 1, 'INFO:root:Iteration {} checkpoint uploaded'.format(step)
+
+
+def stamp(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)) + '.{:09d}Z'.format(int(seconds % 1 * 1e9))
+
+
+def frame(stream, text, seconds=None):
+    if seconds is not None:
+        text = '\n'.join('{} {}'.format(stamp(seconds), line) for line in text.split('\n'))
+    data = (text + '\n').encode('utf-8')
+    return struct.pack('>BxxxL', stream, len(data)) + data
+
+
+class FakeDocker:
+
+    def __init__(self, args):
+        self.args = args
+        self.containers = fake_containers(args.workers)
+        self.by_id = {c['Id']: c for c in self.containers}
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            url = urlparse(request.split()[1].decode('ascii'))
+            parts = url.path.strip('/').split('/')[1:]
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if parts == ['containers', 'json']:
+                await self.send_json(writer, [{k: c[k] for k in ('Id', 'Names', 'State')} for c in self.containers])
+            elif len(parts) == 3 and parts[0] == 'containers' and parts[1] in self.by_id:
+                if parts[2] == 'json':
+                    await self.send_json(writer, dict(self.by_id[parts[1]], Name=self.by_id[parts[1]]['Names'][0]))
+                elif parts[2] == 'logs':
+                    await self.send_logs(writer, self.by_id[parts[1]], query)
+            else:
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send_json(self, writer, data):
+        body = json.dumps(data).encode('utf-8')
+        writer.write('HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(
+            len(body)).encode('ascii') + body)
+
+    async def send_logs(self, writer, container, query):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.multiplexed-stream\r\n'
+                     b'Transfer-Encoding: chunked\r\n\r\n')
+        name = container['Names'][0]
+        tail = query.get('tail', 'all')
+        timestamps = query.get('timestamps') == '1'
+        entries = log_entries(name, self.args.rate)
+        history = [next(entries) for _ in range(50)]
+        # The history was written over the time leading up to now.
+        seconds = time.time() - sum(delay for delay, _, _ in history)
+        for index, (delay, stream, text) in enumerate(history):
+            seconds += delay
+            if tail == 'all' or index >= len(history) - int(tail):
+                self.write_chunk(writer, frame(stream, text, seconds if timestamps else None))
+        while query.get('follow') == '1':
+            await writer.drain()
+            delay, stream, text = next(entries)
+            await asyncio.sleep(delay / self.args.speed)
+            self.write_chunk(writer, frame(stream, text, time.time() if timestamps else None))
+        writer.write(b'0\r\n\r\n')
+
+    @staticmethod
+    def write_chunk(writer, data):
+        writer.write('{:x}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+
+
+async def serve(args):
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+    server = await asyncio.start_unix_server(FakeDocker(args).handle, path=args.socket)
+    print("Fake Docker API on {}".format(args.socket), flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,50 @@
 #!/usr/bin/env python3
 
 import sys
+import asyncio
+import datetime
 import getopt
 import os
-import traceback
-import pickle
-import urllib.request
+import random
+from functools import partial
 
 import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 
-try:
-    import pandas as pd
-    from deepracer import boto3_enhancer
-except ImportError:
-    print("You need to install pandas and deepracer-utils to use this utility.")
-    sys.exit(1)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+from drfc import arns
+from drfc.downloads import AssetDownloader
+from drfc.history import SubmissionHistory, averages
 
 dr = None
 
+# Daemon mode poll intervals in seconds: while a submission is queued or
+# running, when there is nothing to watch, and the cap for throttling backoff.
+POLL_ACTIVE = 60
+POLL_IDLE = 900
+POLL_MAX_BACKOFF = 1800
+DOWNLOAD_THREADS = 4
+
+ACTIVE_STATES = ("QUEUED", "RUNNING")
+RESUBMIT_STATES = ("SUCCESS", "ERROR", "FAILED")
+THROTTLING_CODES = ("ThrottlingException", "TooManyRequestsException", "Throttling", "RequestLimitExceeded")
+
 
 def main():
 
+    # Imported here so that watch() can be driven by a fake client without deepracer-utils.
+    try:
+        from deepracer import boto3_enhancer
+    except ImportError:
+        print("You need to install deepracer-utils to use this utility.")
+        sys.exit(1)
+
     # Parse Arguments
     try:
         opts, _ = getopt.getopt(
             sys.argv[1:],
-            "lvsghm:b:",
-            ["logs", "verbose", "summary", "graphics", "help", "model=", "board="],
+            "lvsgdchm:b:p:",
+            ["logs", "verbose", "summary", "graphics", "daemon", "catch-up", "help", "model=", "board=", "pair="],
         )
     except getopt.GetoptError as err:
         # print help information and exit:
@@ -41,9 +58,11 @@ def main():
     download_videos = False
     verbose = False
     create_summary = False
+    daemon = False
+    catch_up = False
     model_name = None
     leaderboard_guid = None
-    leaderboard_arn = None
+    pairs = []
 
     for opt, arg in opts:
         if opt in ("-l", "--logs"):
@@ -58,10 +77,32 @@ def main():
             model_name = arg.strip()
         elif opt in ("-b", "--board"):
             leaderboard_guid = arg.strip()
+        elif opt in ("-d", "--daemon"):
+            daemon = True
+        elif opt in ("-c", "--catch-up"):
+            catch_up = True
+        elif opt in ("-p", "--pair"):
+            pair = arg.split(",", 1)
+            if len(pair) != 2:
+                usage()
+            pairs.append((pair[0].strip(), pair[1].strip()))
         elif opt in ("-h", "--help"):
             usage()
             sys.exit()
 
+    if model_name and leaderboard_guid:
+        pairs.insert(0, (model_name, leaderboard_guid))
+    if len(pairs) == 0 or (len(pairs) > 1 and not daemon):
+        usage()
+
+    options = {
+        "logs_path": logs_path,
+        "download_logs": download_logs,
+        "download_videos": download_videos,
+        "verbose": verbose,
+        "create_summary": create_summary,
+    }
+
     # Prepare Boto3
     profile_name=os.environ.get("DR_UPLOAD_S3_PROFILE", None)
 
@@ -77,200 +118,253 @@ def main():
 
     global dr
     dr = boto3_enhancer.deepracer_client(session=session)
+    arn_cache = arns.ArnCache(arns.cache_path(profile_name))
+    downloads = AssetDownloader(DOWNLOAD_THREADS)
+
+    if catch_up:
+        futures = []
+        for _, guid in pairs:
+            futures.extend(backfill_downloads(guid, options, downloads))
+        print("Catching up on {} missing downloads.".format(len(futures)))
+        for future in futures:
+            future.exception()
+
+    if daemon:
+        try:
+            asyncio.run(run_daemon(pairs, options, arn_cache, downloads))
+        except KeyboardInterrupt:
+            print("Requested to stop.")
+            downloads.shutdown(wait=False)
+        return
+
+    model_name, leaderboard_guid = pairs[0]
+    resolved = resolve(model_name, leaderboard_guid, arn_cache, verbose)
+    if resolved is None:
+        sys.exit(1)
+    my_model_arn, leaderboard_arn = resolved
+
+    latest_submission = latest_user_submission(leaderboard_guid, leaderboard_arn, arn_cache)
+    handle_submission(latest_submission, model_name, my_model_arn, leaderboard_guid, leaderboard_arn,
+                      options, arn_cache, downloads)
+
+    # Maintain our summary
+    if create_summary:
+        update_summary(latest_submission, leaderboard_guid, options)
+
+    downloads.shutdown(wait=True)
+
+
+def resolve(model_name, leaderboard_guid, arn_cache, verbose):
+    """(model ARN, leaderboard ARN) for a pair, or None if either cannot be found."""
 
     # Find the ARN for my model
-    my_model = find_model(model_name)
+    my_model_arn = arns.find_model(dr, model_name, arn_cache)
 
-    if my_model is not None:
-        my_model_arn = my_model["ModelArn"].values[0]
+    if my_model_arn is not None:
         if verbose:
             print("Found ModelARN for model {}: {}".format(model_name, my_model_arn))
     else:
         print("Did not find model with name {}".format(model_name))
-        sys.exit(1)
+        return None
 
+    leaderboard_arn = None
     if leaderboard_guid.startswith('arn'):
         leaderboard_arn = leaderboard_guid
 
     # Find the leaderboard
     if not leaderboard_arn:
-        leaderboard_arn = find_leaderboard(leaderboard_guid)
+        leaderboard_arn = arns.find_leaderboard(dr, leaderboard_guid, arn_cache)
 
     if leaderboard_arn is not None:
         if verbose:
             print("Found Leaderboard with ARN {}".format(leaderboard_arn))
     else:
         print("Did not find Leaderboard with ARN {}".format(leaderboard_arn))
-        sys.exit(1)
-
-    # Load summary from file if we are interested in it!
-    if create_summary:
+        return None
 
-        pkl_f = "{}/{}/summary.pkl".format(logs_path, leaderboard_guid)
-        if os.path.isfile(pkl_f):
-            infile = open(pkl_f, "rb")
-            my_submissions = pickle.load(infile)
-            infile.close()
-        else:
-            my_submissions = {}
-            my_submissions["LeaderboardSubmissions"] = []
+    return my_model_arn, leaderboard_arn
 
-            dir_path = os.path.dirname(pkl_f)
-            os.makedirs(dir_path, exist_ok=True)
 
+def latest_user_submission(leaderboard_guid, leaderboard_arn, arn_cache):
     # Collect data about latest submission
-    submission_response = dr.get_latest_user_submission(LeaderboardArn=leaderboard_arn)
-    latest_submission = submission_response["LeaderboardSubmission"]
-    if latest_submission:
-        jobid = latest_submission["ActivityArn"].split("/", 1)[1]
-        print(
-            "Job {} has status {}".format(
-                jobid, latest_submission["LeaderboardSubmissionStatusType"]
-            )
-        )
-
-        if latest_submission["LeaderboardSubmissionStatusType"] == "SUCCESS":
-            if download_logs:
-                try:
-                    f_url = dr.get_asset_url(
-                        Arn=latest_submission["ActivityArn"],
-                        AssetType="LOGS",
-                    )["Url"]
-                    download_file(
-                        "{}/{}/robomaker-{}-{}.tar.gz".format(
-                            logs_path,
-                            leaderboard_guid,
-                            latest_submission["SubmissionTime"],
-                            jobid,
-                        ),
-                        f_url,
-                    )
-                except ClientError:
-                    print(("WARNING: Logfile for job {} not available.").format(jobid))
-                    traceback.print_exc()
-
-            if download_videos:
-                download_file(
-                    "{}/{}/video-{}-{}.mp4".format(
-                        logs_path,
-                        leaderboard_guid,
-                        latest_submission["SubmissionTime"],
-                        jobid,
-                    ),
-                    latest_submission["SubmissionVideoS3path"],
-                )
-
-            # Submit again
-            _ = dr.create_leaderboard_submission(
-                ModelArn=my_model_arn, LeaderboardArn=leaderboard_arn
-            )
-            print("Submitted {} to {}.".format(model_name, leaderboard_arn))
-
-        elif latest_submission["LeaderboardSubmissionStatusType"] == "ERROR" or latest_submission["LeaderboardSubmissionStatusType"] == "FAILED":
-            print("Error in previous submission")
-            if download_logs:
-                try:
-                    f_url = dr.get_asset_url(
-                        Arn=latest_submission["ActivityArn"],
-                        AssetType="LOGS",
-                    )["Url"]
-                    download_file(
-                        "{}/{}/robomaker-{}-{}.tar.gz".format(
-                            logs_path,
-                            leaderboard_guid,
-                            latest_submission["SubmissionTime"],
-                            jobid,
-                        ),
-                        f_url,
-                    )
-                except ClientError:
-                    print(("WARNING: Logfile for job {} not available.").format(jobid))
-                    traceback.print_exc()
-
-            # Submit again
-            _ = dr.create_leaderboard_submission(
-                ModelArn=my_model_arn, LeaderboardArn=leaderboard_arn
-            )
-            print("Submitted {} to {}.".format(model_name, leaderboard_arn))
-
-    # Maintain our summary
-    if create_summary:
-        for idx, i in enumerate(my_submissions["LeaderboardSubmissions"]):
-            if "SubmissionTime" in i:
-                if i["SubmissionTime"] == latest_submission["SubmissionTime"]:
-                    del my_submissions["LeaderboardSubmissions"][idx]
+    try:
+        submission_response = dr.get_latest_user_submission(LeaderboardArn=leaderboard_arn)
+    except ClientError:
+        # Leaderboard may be gone; make the next run resolve it again.
+        arn_cache.invalidate(arns.LEADERBOARDS, leaderboard_guid)
+        arn_cache.save()
+        raise
+    return submission_response["LeaderboardSubmission"]
+
+
+def handle_submission(latest_submission, model_name, model_arn, leaderboard_guid, leaderboard_arn,
+                      options, arn_cache, downloads):
+    """Queue the asset downloads of a finished submission and submit again.
+
+    Returns the submission status, or None if there is no submission.
+    """
+    if not latest_submission:
+        return None
+
+    jobid = latest_submission["ActivityArn"].split("/", 1)[1]
+    status = latest_submission["LeaderboardSubmissionStatusType"]
+    print("Job {} has status {}".format(jobid, status))
+
+    if status not in RESUBMIT_STATES:
+        return status
+    if status != "SUCCESS":
+        print("Error in previous submission")
+
+    queue_downloads(latest_submission, leaderboard_guid, options, downloads)
+
+    # Submit again
+    submit(model_name, model_arn, leaderboard_arn, arn_cache)
+    return status
+
+
+def update_summary(latest_submission, leaderboard_guid, options):
+    history = SubmissionHistory("{}/{}".format(options["logs_path"], leaderboard_guid))
+    migrated = history.migrate()
+    if migrated is not None:
+        print("Migrated {} submissions from summary.pkl to {}.".format(migrated, history.history_path))
+    history.append([latest_submission])
+
+    # Display summary
+    if options["verbose"]:
+        display_submissions(history)
+
+
+async def run_daemon(pairs, options, arn_cache, downloads):
+    """Watch all (model name, leaderboard) pairs concurrently until interrupted.
+
+    The blocking deepracer client calls go through the default executor, so
+    any object with the same methods assigned to `dr` can stand in for it,
+    as tests/test_submit_monitor.py does.
+    """
+    await asyncio.gather(*[watch(pair, options, arn_cache, downloads) for pair in pairs])
+
+
+async def watch(pair, options, arn_cache, downloads):
+    model_name, leaderboard_guid = pair
+    loop = asyncio.get_running_loop()
+    resolved = None
+    last_seen = None
+    backoff = 0
+
+    while True:
+        try:
+            if resolved is None:
+                resolved = await loop.run_in_executor(None, resolve, model_name, leaderboard_guid, arn_cache,
+                                                      options["verbose"])
+                if resolved is None:
+                    await asyncio.sleep(POLL_IDLE)
+                    continue
+            model_arn, leaderboard_arn = resolved
+
+            latest = await loop.run_in_executor(None, latest_user_submission, leaderboard_guid, leaderboard_arn,
+                                                arn_cache)
+            seen = (latest["SubmissionTime"], latest["LeaderboardSubmissionStatusType"]) if latest else None
+            if seen == last_seen:
+                # Nothing new since the last poll, so no need to print or act again.
+                status = latest["LeaderboardSubmissionStatusType"] if latest else None
             else:
-                del my_submissions["LeaderboardSubmissions"][idx]
-        my_submissions["LeaderboardSubmissions"].append(latest_submission)
-
-        # Save summary
-        outfile = open(pkl_f, "wb")
-        pickle.dump(my_submissions, outfile)
-        outfile.close()
-
-        # Display summary
-        if verbose:
-            display_submissions(my_submissions)
-
-
-def download_file(f_name, url):
-
-    dir_path = os.path.dirname(f_name)
-    os.makedirs(dir_path, exist_ok=True)
-    if not os.path.isfile(f_name):
-        print("Downloading {}".format(os.path.basename(f_name)))
-        urllib.request.urlretrieve(url, f_name)
-
-
-def find_model(model_name):
-
-    m_response = dr.list_models(ModelType="REINFORCEMENT_LEARNING", MaxResults=25)
-    model_dict = m_response["Models"]
-    models = pd.DataFrame.from_dict(model_dict)
-    my_model = models[models["ModelName"] == model_name]
-
-    if my_model.size > 0:
-        return my_model
-
-    while "NextToken" in m_response:
-        m_response = dr.list_models(
-            ModelType="REINFORCEMENT_LEARNING",
-            MaxResults=50,
-            NextToken=m_response["NextToken"],
-        )
-        model_dict = m_response["Models"]
-
-        models = pd.DataFrame.from_dict(model_dict)
-        my_model = models[models["ModelName"] == model_name]
-        if my_model.size > 0:
-            return my_model
-
-    return None
-
+                status = await loop.run_in_executor(None, handle_submission, latest, model_name, model_arn,
+                                                    leaderboard_guid, leaderboard_arn, options, arn_cache, downloads)
+                if options["create_summary"] and latest:
+                    await loop.run_in_executor(None, update_summary, latest, leaderboard_guid, options)
+                last_seen = seen
+            backoff = 0
+            delay = POLL_ACTIVE if status in ACTIVE_STATES or status in RESUBMIT_STATES else POLL_IDLE
+
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in THROTTLING_CODES:
+                backoff = min(max(backoff * 2, POLL_ACTIVE), POLL_MAX_BACKOFF)
+                print("Throttled while watching {}; backing off {}s.".format(model_name, backoff))
+                delay = backoff * random.uniform(0.8, 1.2)
+            else:
+                print("WARNING: Error while watching {} on {}: {}".format(model_name, leaderboard_guid, e))
+                resolved = None
+                delay = POLL_IDLE
+        except BotoCoreError as e:
+            # Endpoint unreachable, read timeout or failed credential refresh; retry like a throttled call.
+            backoff = min(max(backoff * 2, POLL_ACTIVE), POLL_MAX_BACKOFF)
+            print("WARNING: {} while watching {}; backing off {}s.".format(e, model_name, backoff))
+            delay = backoff * random.uniform(0.8, 1.2)
 
-def find_leaderboard(leaderboard_guid):
-    leaderboard_arn = "arn:aws:deepracer:::leaderboard/{}".format(leaderboard_guid)
+        await asyncio.sleep(delay)
 
-    l_response = dr.list_leaderboards(MaxResults=25)
-    lboards_dict = l_response["Leaderboards"]
-    leaderboards = pd.DataFrame.from_dict(l_response["Leaderboards"])
-    if leaderboards[leaderboards["Arn"] == leaderboard_arn].size > 0:
-        return leaderboard_arn
 
-    while "NextToken" in l_response:
-        l_response = dr.list_leaderboards(
-            MaxResults=50, NextToken=l_response["NextToken"]
+def submit(model_name, model_arn, leaderboard_arn, arn_cache):
+    try:
+        _ = dr.create_leaderboard_submission(
+            ModelArn=model_arn, LeaderboardArn=leaderboard_arn
         )
-        lboards_dict = l_response["Leaderboards"]
-
-        leaderboards = pd.DataFrame.from_dict(lboards_dict)
-        if leaderboards[leaderboards["Arn"] == leaderboard_arn].size > 0:
-            return leaderboard_arn
-
-    return None
-
-
-def display_submissions(submissions_dict):
+    except ClientError:
+        # A deleted and re-imported model gets a new ARN.
+        arn_cache.invalidate(arns.MODELS, model_name)
+        arn_cache.save()
+        raise
+    print("Submitted {} to {}.".format(model_name, leaderboard_arn))
+
+
+def queue_downloads(submission, leaderboard_guid, options, downloads):
+    """Queue the log and video downloads of a finished submission; returns the futures of those not on disk."""
+    jobid = submission["ActivityArn"].split("/", 1)[1]
+    f_prefix = "{}/{}".format(options["logs_path"], leaderboard_guid)
+    futures = []
+
+    if options["download_logs"]:
+        futures.append(downloads.submit(
+            partial(logs_url, submission["ActivityArn"]),
+            "{}/robomaker-{}-{}.tar.gz".format(f_prefix, submission["SubmissionTime"], jobid),
+        ))
+
+    if options["download_videos"] and submission["LeaderboardSubmissionStatusType"] == "SUCCESS" \
+            and submission.get("SubmissionVideoS3path"):
+        futures.append(downloads.submit(
+            submission["SubmissionVideoS3path"],
+            "{}/video-{}-{}.mp4".format(f_prefix, submission["SubmissionTime"], jobid),
+        ))
+
+    futures = [f for f in futures if f is not None]
+    for future in futures:
+        future.add_done_callback(partial(report_download, jobid))
+    return futures
+
+
+def backfill_downloads(leaderboard_guid, options, downloads):
+    """Queue missing assets for every finished submission in the leaderboard's history."""
+    history = SubmissionHistory("{}/{}".format(options["logs_path"], leaderboard_guid))
+    history.migrate()
+    futures = []
+    for submission in history.latest():
+        if submission.get("LeaderboardSubmissionStatusType") in RESUBMIT_STATES:
+            futures.extend(queue_downloads(submission, leaderboard_guid, options, downloads))
+    return futures
+
+
+def logs_url(activity_arn):
+    return dr.get_asset_url(
+        Arn=activity_arn,
+        AssetType="LOGS",
+    )["Url"]
+
+
+def report_download(jobid, future):
+    error = future.exception()
+    if isinstance(error, ClientError):
+        print(("WARNING: Logfile for job {} not available.").format(jobid))
+    elif error is not None:
+        print("WARNING: Download for job {} failed: {}".format(jobid, error))
+
+
+def format_lap_time(ms):
+    if ms is None:
+        return ""
+    return "{:02d}:{:05.2f}".format(int(ms // 60000), (ms % 60000) / 1000)
+
+
+def display_submissions(history):
     # Display status
     my_columns = [
         "SubmissionTime",
@@ -283,40 +377,43 @@ def display_submissions(submissions_dict):
         "JobId",
         "Status",
     ]
-    my_submissions_df = pd.DataFrame.from_dict(
-        submissions_dict["LeaderboardSubmissions"]
-    )
-    my_submissions_df["SubmissionTime"] = (
-        my_submissions_df["SubmissionTime"]
-        .values.astype(dtype="datetime64[ms]")
-        .astype(dtype="datetime64[s]")
-    )
-    my_submissions_df["TotalLapTime"] = my_submissions_df["TotalLapTime"].values.astype(
-        dtype="datetime64[ms]"
-    )
-    my_submissions_df["TotalLapTime"] = (
-        my_submissions_df["TotalLapTime"].dt.strftime("%M:%S.%f").str[:-4]
-    )
-    my_submissions_df["BestLapTime"] = my_submissions_df["BestLapTime"].values.astype(
-        dtype="datetime64[ms]"
-    )
-    my_submissions_df["BestLapTime"] = (
-        my_submissions_df["BestLapTime"].dt.strftime("%M:%S.%f").str[:-4]
-    )
-    my_submissions_df["JobId"] = my_submissions_df["ActivityArn"].str.split("/").str[1]
-    my_submissions_df["Status"] = my_submissions_df["LeaderboardSubmissionStatusType"]
-    my_submissions_df[[None, None, "Model"]] = my_submissions_df.ModelArn.str.split(
-        "/", expand=True,
-    )
+    rows = []
+    for submission in history.latest():
+        rows.append([
+            datetime.datetime.fromtimestamp(int(submission["SubmissionTime"]) / 1000, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            format_lap_time(submission.get("TotalLapTime")),
+            format_lap_time(submission.get("BestLapTime")),
+            str(submission.get("ResetCount", "")),
+            str(submission.get("CollisionCount", "")),
+            str(submission.get("OffTrackCount", "")),
+            submission.get("ModelArn", "").split("/")[-1],
+            submission["ActivityArn"].split("/", 1)[1],
+            submission.get("LeaderboardSubmissionStatusType", ""),
+        ])
 
     # Display
+    widths = [max([len(c)] + [len(r[i]) for r in rows]) for i, c in enumerate(my_columns)]
     print("")
-    print(my_submissions_df[my_columns])
+    print("  ".join(c.rjust(w) for c, w in zip(my_columns, widths)))
+    for row in rows:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+
+    summary = history.summary()
+    if summary["count"] > 0:
+        avg = averages(summary)
+        print("")
+        print("{} successful submissions. Best lap {}, average total {}, average resets {:.1f}, "
+              "collisions {:.1f}, off-track {:.1f}.".format(
+                  summary["count"], format_lap_time(summary["best_lap"]), format_lap_time(avg["TotalLapTime"]),
+                  avg["ResetCount"], avg["CollisionCount"], avg["OffTrackCount"]))
 
 
 def usage():
     print(
-        "Usage: submit-monitor.py [-v] [-s] [-l] [-g] -m <model-name> -b <leaderboard guid>"
+        "Usage: submit-monitor.py [-c] [-v] [-s] [-l] [-g] -m <model-name> -b <leaderboard guid>"
+    )
+    print(
+        "       submit-monitor.py -d [-c] [-v] [-s] [-l] [-g] -p <model-name>,<leaderboard guid> [-p ...]"
     )
     print("        -v                Verbose output.")
     print("        -s                Store a summary of all submissions.")
@@ -324,6 +421,9 @@ def usage():
     print("        -g                Download video recordings.")
     print("        -m                Display name of the model to submit.")
     print("        -b                GUID or ARN of the leaderboard to submit to.")
+    print("        -c                Catch up. Download missing logs/videos of all submissions in the history.")
+    print("        -d                Daemon. Keep running and watch all given pairs concurrently.")
+    print("        -p                Model and leaderboard pair to watch; can be repeated with -d.")
     sys.exit(1)
 
 